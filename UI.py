@@ -13,10 +13,16 @@ import datetime
 from pathlib import Path
 from config_manager import config_manager
 import re
+import time
 from logging.handlers import RotatingFileHandler
+from stream_capture import stream_multiplexer
 
 logger = setup_logging('ui_log.txt')
 
+# Предпросмотр: не чаще ~10 кадров в секунду; без кадров дольше таймаута — переподключение
+PREVIEW_FRAME_INTERVAL = 0.1
+PREVIEW_STALE_TIMEOUT = 20.0
+
 # Загрузка каналов из channels.json через config_manager
 CHANNELS_FILE = Path('channels.json')
 def load_channels():
@@ -210,20 +216,9 @@ class MonitoringUI:
         """
         # Принудительно обновить кадр для корректного ресайза
         if hasattr(self, 'captures') and self.captures[idx] is not None:
-            cap = self.captures[idx]
-            if cap.isOpened():
-                try:
-                    ret, frame = cap.read()
-                except cv2.error as e:
-                    logger.error(f"OpenCV ошибка при чтении кадра из потока {idx} ({self.selected_channels[idx]}): {e}")
-                    self._handle_disconnect(idx)
-                    return
-                    
-                if not ret or frame is None:
-                    logger.warning(f"Не удалось прочитать кадр из потока {idx} ({self.selected_channels[idx]}).")
-                    self._handle_disconnect(idx)
-                    return
-
+            subscription = self.captures[idx]
+            frame = subscription.last_frame
+            if subscription.is_active() and frame is not None:
                 label = self.video_labels[idx]
                 w = label.winfo_width()
                 h = label.winfo_height()
@@ -385,31 +380,33 @@ class MonitoringUI:
             self.play_pause_buttons[idx].config(text="❚❚")
 
         def _start_capture_and_loop():
-            # Захват видео в этом же потоке, но с логикой переподключения
-            cap = cv2.VideoCapture(url)
-            self.captures[idx] = cap
+            # Подписка на общий поток канала: декодирование разделяется
+            # с мониторингом строк и записью crop-видео
+            subscription = stream_multiplexer.subscribe(
+                url, f"preview_{idx}_{channel}", min_interval=PREVIEW_FRAME_INTERVAL
+            )
+            self.captures[idx] = subscription
+            started_at = time.time()
 
             def update_frame():
                 # Проверяем, не остановлен ли поток вручную
-                if not self.video_stream_active[idx]:
+                if not self.video_stream_active[idx] or self.captures[idx] is not subscription:
                     return
                 
-                # Проверяем, жив ли сам cap
-                if cap is None or not cap.isOpened():
+                # Проверяем, жива ли сессия потока
+                if not subscription.is_active():
                     logger.warning(f"Поток {idx} ({self.selected_channels[idx]}) не открыт.")
                     self._handle_disconnect(idx)
                     return
 
-                try:
-                    ret, frame = cap.read()
-                except cv2.error as e:
-                    logger.error(f"OpenCV ошибка при чтении кадра из потока {idx} ({self.selected_channels[idx]}): {e}")
-                    self._handle_disconnect(idx)
-                    return
-                    
-                if not ret or frame is None:
-                    logger.warning(f"Не удалось прочитать кадр из потока {idx} ({self.selected_channels[idx]}).")
-                    self._handle_disconnect(idx)
+                frame = subscription.get(timeout=0)
+                if frame is None:
+                    last_time = subscription.last_frame_time or started_at
+                    if time.time() - last_time > PREVIEW_STALE_TIMEOUT:
+                        logger.warning(f"Нет кадров из потока {idx} ({self.selected_channels[idx]}).")
+                        self._handle_disconnect(idx)
+                        return
+                    self.after_ids[idx] = self.video_labels[idx].after(100, update_frame)
                     return
 
                 label = self.video_labels[idx]
@@ -1041,6 +1038,12 @@ class MonitoringUI:
                 'interval': interval_var.get().strip(),
                 'lines': parse_time_list(lines_text)
             }
+
+            # Особая длительность применяется только к слоту lines
+            unknown_slots = [k for k in specials if k not in channel_data['lines']]
+            if unknown_slots:
+                show_error(f"Время особых длительностей отсутствует в lines: {', '.join(unknown_slots)}")
+                return
             
             # Добавляем длительность по умолчанию, если она указана
             if default_duration_raw := default_duration_var.get().strip():
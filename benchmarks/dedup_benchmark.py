@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска почти-дубликатов текстов строк: полный перебор SequenceMatcher
+(как в TextDuplicateChecker) против индекса MinHash/LSH (text_index.NearDuplicateIndex)
+на 10k, 50k и 100k сохраненных текстах.
+
+Тексты собираются из слов новостных строк с частотами по закону Ципфа
+(служебные и частые слова, ключевые слова из keywords.json), как в реальной
+бегущей строке: у не связанных между собой строк много общих частых слов,
+поэтому доля кандидатов LSH здесь заметно выше, чем на случайных словах.
+
+Запуск из корня проекта:
+    python benchmarks/dedup_benchmark.py [--sizes 10000 50000 100000] [--queries 200] [--brute 20] [--pairs 2000]
+Полный перебор выполняется только для первых --brute запросов (он медленный);
+по ним же считается совпадение ответов индекса с перебором.
+
+Отдельно считается полнота индекса у порога: --pairs искаженных копий сохраненных
+текстов с SequenceMatcher.ratio() > 0.8 (то есть настоящих дубликатов) разбиваются
+по схожести на полосы 0.80–0.85, 0.85–0.90, 0.90–0.95, 0.95–1.00, и для каждой
+полосы печатается доля найденных индексом. Рядом печатается доля сохраненных
+текстов, попадающих в кандидаты LSH и доходящих до SequenceMatcher.ratio().
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from difflib import SequenceMatcher
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config_manager import config_manager
+from text_index import NearDuplicateIndex, normalize_text
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+# Частые слова новостных строк по убыванию частоты (после первых 40 вставляются ключевые слова)
+NEWS_WORDS = """
+в на и по с не о за из к до для от что как это при у а также года году более
+около после тысяч человек области россии москве региона района города мая июня
+время сегодня завтра ночью днем часов минут рублей процентов млн млрд
+заявил сообщил сообщили рассказал отметил президент правительство министр глава
+губернатор мэр власти ведомство министерство суд дело против задержан задержали
+полиция сотрудники следователи прокуратура возбуждено уголовное статья
+москва петербург подмосковье край республика федерации страны мира сша китай украины
+новости погода температура градусов осадки дождь снег гроза жара мороз
+дороги трассе движение транспорт поезд самолет рейс аэропорт метро автобус
+школы больницы врачи пациентов здоровья лечения вакцина
+экономика цены рынок курс доллара евро нефти газа банк центробанк ставка инфляция
+выборы депутаты госдума закон законопроект совет федерации решение указ
+спорт матч команда победа чемпионат сборная игры турнир счет
+жители дома квартиры улицы центр площадь здание объект склад завод предприятие
+произошло произошел случилось началось продолжается завершилась ожидается планируется
+погибли ранены пострадавших госпитализированы помощь медики спасателей бригады
+ведутся работы восстановление электроснабжения водоснабжения отключение света
+площади гектаров километров метров тонн единиц техники личного состава
+""".split()
+
+
+def make_vocabulary():
+    """
+    Слова и их веса по закону Ципфа (вес слова ранга r — 1 / r).
+    """
+    keywords = [keyword.lower() for keyword in config_manager.get_keywords_list()]
+    words = NEWS_WORDS[:40] + keywords + NEWS_WORDS[40:]
+    return words, [1.0 / rank for rank in range(1, len(words) + 1)]
+
+
+def make_text(rng, vocabulary):
+    words, weights = vocabulary
+    return " ".join(rng.choices(words, weights, k=rng.randint(8, 20)))
+
+
+def garble(rng, text, errors):
+    """
+    Искажает текст как OCR: замена, пропуск и вставка символов.
+    """
+    chars = list(text)
+    for _ in range(errors):
+        position = rng.randrange(len(chars))
+        operation = rng.random()
+        if operation < 0.5:
+            chars[position] = rng.choice(ALPHABET)
+        elif operation < 0.75 and len(chars) > 1:
+            del chars[position]
+        else:
+            chars.insert(position, rng.choice(ALPHABET))
+    return "".join(chars)
+
+
+def brute_force(text, stored, threshold):
+    text = normalize_text(text)
+    for prev in stored:
+        if SequenceMatcher(None, text, prev).ratio() > threshold:
+            return True
+    return False
+
+
+RECALL_BANDS = [(0.80, 0.85), (0.85, 0.90), (0.90, 0.95), (0.95, 1.00)]
+
+
+def near_threshold_pairs(rng, texts, count, threshold):
+    """
+    Искаженные копии сохраненных текстов, которые перебор считает дубликатами:
+    ошибок до len/4, чтобы пары заполняли все полосы схожести выше порога.
+    """
+    pairs = []
+    while len(pairs) < count:
+        source = rng.choice(texts)
+        query = normalize_text(garble(rng, source, rng.randint(1, max(1, len(source) // 4))))
+        ratio = SequenceMatcher(None, query, source).ratio()
+        if ratio > threshold:
+            pairs.append((ratio, query))
+    return pairs
+
+
+def recall_report(index, pairs):
+    before = index.get_stats()
+    found = [(ratio, index.is_duplicate(query)) for ratio, query in pairs]
+    parts = []
+    for low, high in RECALL_BANDS:
+        band = [hit for ratio, hit in found if low < ratio <= high]
+        if band:
+            parts.append(f"{low:.2f}–{high:.2f}: {sum(band) / len(band):6.1%} ({len(band)})")
+    total = sum(hit for _, hit in found)
+    return f"полнота {total / len(found):6.1%} ({candidate_share(index, before)}) | " + " | ".join(parts)
+
+
+def candidate_share(index, before):
+    """
+    Доля сохраненных текстов на запрос: кандидаты LSH и проверенные SequenceMatcher.ratio().
+    """
+    stats = index.get_stats()
+    queries = max(1, stats['queries'] - before['queries'])
+    found = (stats['candidates_found'] - before['candidates_found']) / queries
+    checked = (stats['candidates_checked'] - before['candidates_checked']) / queries
+    return f"кандидатов {found / len(index):.2%}, проверено ratio() {checked / len(index):.2%}"
+
+
+def run(size, query_count, brute_count, pair_count, rng, vocabulary):
+    texts = [normalize_text(make_text(rng, vocabulary)) for _ in range(size)]
+    index = NearDuplicateIndex()
+    started = time.perf_counter()
+    index.add_many(texts)
+    build = time.perf_counter() - started
+
+    queries = []
+    for i in range(query_count):
+        if i % 2 == 0:
+            source = rng.choice(texts)
+            queries.append(garble(rng, source, rng.randint(1, max(1, len(source) // 12))))
+        else:
+            queries.append(make_text(rng, vocabulary))
+
+    before = index.get_stats()
+    started = time.perf_counter()
+    index_answers = [index.is_duplicate(query) for query in queries]
+    index_time = (time.perf_counter() - started) / len(queries)
+    share = candidate_share(index, before)
+
+    brute_queries = queries[:brute_count]
+    started = time.perf_counter()
+    brute_answers = [brute_force(query, texts, index.threshold) for query in brute_queries]
+    brute_time = (time.perf_counter() - started) / max(1, len(brute_queries))
+    agree = sum(1 for a, b in zip(index_answers, brute_answers) if a == b)
+    missed = sum(1 for a, b in zip(index_answers, brute_answers) if b and not a)
+
+    print(f"{size:>7} текстов: построение {build:6.1f} с | индекс {index_time * 1000:7.2f} мс/запрос "
+          f"({share}) | перебор {brute_time * 1000:9.1f} мс/запрос | "
+          f"x{brute_time / index_time:,.0f} | совпадение {agree}/{len(brute_queries)}, пропущено дубликатов {missed}")
+    if pair_count:
+        pairs = near_threshold_pairs(rng, texts, pair_count, index.threshold)
+        print(f"{'':>7}         дубликаты у порога: {recall_report(index, pairs)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000], help="Размеры индекса")
+    parser.add_argument("--queries", type=int, default=200, help="Количество запросов")
+    parser.add_argument("--brute", type=int, default=20, help="Запросов для полного перебора")
+    parser.add_argument("--pairs", type=int, default=2000, help="Пар у порога для оценки полноты")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = make_vocabulary()
+    for size in args.sizes:
+        run(size, args.queries, args.brute, args.pairs, rng, vocabulary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк и регрессионная проверка поиска ключевых слов: прежний перебор
+SequenceMatcher (ключевое слово x слово) против KeywordMatcher с нечетким индексом.
+Совпадение результатов проверяется без поиска по основам (use_stems=False);
+отдельно показывается, сколько текстов доходит до fuzzy с основами и без них.
+
+Запуск из корня проекта:
+    python benchmarks/keyword_benchmark.py [файл_или_папка_с_текстами] [--lines N]
+Корпус — строки из recognized_text/*.txt, sent_texts_*.txt или указанного пути;
+без них генерируются строки с искаженными ключевыми словами (как после OCR).
+Если результаты хотя бы одной строки расходятся, скрипт завершается с кодом 1.
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from difflib import SequenceMatcher
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config_manager import config_manager
+from keyword_matcher import KeywordMatcher
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+
+def reference_fuzzy_match(text, keywords, threshold=0.8):
+    """
+    Прежняя реализация MonitoringApp.fuzzy_keyword_match.
+    """
+    text = text.lower()
+    for kw in keywords:
+        if kw in text:
+            return True
+        for word in text.split():
+            if SequenceMatcher(None, kw, word).ratio() >= threshold:
+                return True
+    return False
+
+
+def reference_find_local(text, keywords):
+    """
+    Прежняя реализация MonitoringApp._find_keywords_local.
+    """
+    found = []
+    text_clean = re.sub(r'\s+', ' ', text.lower()).strip()
+    words = text_clean.split()
+    for kw in keywords:
+        if kw in text_clean:
+            found.append(kw)
+            continue
+        kw_found = False
+        for word in words:
+            word_clean = re.sub(r'[^\wа-яё]', '', word)
+            if len(word_clean) < 3:
+                continue
+            if word_clean == kw or kw in word_clean or word_clean in kw:
+                found.append(kw)
+                kw_found = True
+                break
+        if kw_found:
+            continue
+        for word in words:
+            word_clean = re.sub(r'[^\wа-яё]', '', word)
+            if len(word_clean) < 3:
+                continue
+            if SequenceMatcher(None, kw, word_clean).ratio() >= 0.8:
+                found.append(kw)
+                break
+    return found
+
+
+def garble(word, rng):
+    """
+    Искажает слово как OCR: замена, пропуск или вставка символов.
+    """
+    chars = list(word)
+    for _ in range(rng.randint(0, 2)):
+        if not chars:
+            break
+        position = rng.randrange(len(chars))
+        operation = rng.random()
+        if operation < 0.4:
+            chars[position] = rng.choice(ALPHABET)
+        elif operation < 0.7:
+            del chars[position]
+        else:
+            chars.insert(position, rng.choice(ALPHABET))
+    return "".join(chars)
+
+
+def load_corpus(source, keywords, count):
+    """
+    Загружает строки из файлов с текстами или генерирует синтетический корпус.
+    """
+    paths = []
+    if source:
+        source = Path(source)
+        paths = sorted(source.rglob("*.txt")) if source.is_dir() else [source]
+    else:
+        paths = sorted(Path("recognized_text").glob("*.txt")) + sorted(Path(".").glob("sent_texts_*.txt"))
+    lines = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines.extend(line.rstrip("\n").split("\t")[-1] for line in f if line.strip())
+    rng = random.Random(42)
+    while len(lines) < count:
+        words = []
+        for _ in range(rng.randint(5, 30)):
+            if rng.random() < 0.2:
+                words.append(garble(rng.choice(keywords), rng) + rng.choice(["", ",", ".", "-"]))
+            else:
+                words.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 12))))
+        lines.append(" ".join(words))
+    return lines[:count]
+
+
+def timed(func, lines):
+    started = time.perf_counter()
+    results = [func(line) for line in lines]
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", help="Файл или папка с текстами строк")
+    parser.add_argument("--lines", type=int, default=2000, help="Количество строк корпуса")
+    args = parser.parse_args()
+
+    matcher = KeywordMatcher(config_manager.get_keywords_list(), use_stems=False)
+    keywords = matcher.keywords
+    lines = load_corpus(args.source, keywords, args.lines)
+    print(f"Ключевых слов: {len(keywords)}, строк: {len(lines)}")
+
+    mismatches = 0
+    for name, reference, current in (
+        ("fuzzy_keyword_match", lambda t: reference_fuzzy_match(t, keywords), matcher.match),
+        ("_find_keywords_local", lambda t: sorted(reference_find_local(t, keywords)), lambda t: sorted(matcher.find_local(t))),
+    ):
+        before, expected = timed(reference, lines)
+        after, actual = timed(current, lines)
+        bad = sum(1 for a, b in zip(expected, actual) if a != b)
+        mismatches += bad
+        print(f"{name:<22} до {before * 1000 / len(lines):7.3f} мс/строка   "
+              f"после {after * 1000 / len(lines):7.3f} мс/строка   x{before / after:.1f}   расхождений {bad}")
+    print(f"Нечеткий индекс: {matcher.fuzzy_index.get_stats()}")
+
+    for use_stems in (False, True):
+        stats_matcher = KeywordMatcher(keywords, use_stems=use_stems)
+        elapsed, _ = timed(stats_matcher.match, lines)
+        stats = stats_matcher.get_stats()
+        print(f"match, основы {'вкл' if use_stems else 'выкл'}: {elapsed * 1000 / len(lines):7.3f} мс/строка, "
+              f"до fuzzy {stats['texts_fuzzy']}/{stats['texts_checked']}, пути {stats['paths']}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетного OCR: кадров в секунду при распознавании по одной полосе
+против склейки K полос в одну страницу (ocr_engine.recognize_batch).
+
+Запуск из корня проекта:
+    python benchmarks/ocr_batch_benchmark.py [папка_со_скриншотами] [--frames N] [--batch 4 8 16]
+Без папки используются синтетические полосы 1500x45 с текстом.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ocr_engine
+from ocr_benchmark import load_frames
+
+
+def measure_fps(name, frames, batch_size):
+    """
+    Распознает все кадры пакетами batch_size и печатает кадры в секунду.
+    """
+    engine = ocr_engine.get_engine()
+    engine.recognize_batch(frames[:batch_size])  # Прогрев
+    started = time.perf_counter()
+    results = []
+    for i in range(0, len(frames), batch_size):
+        results.extend(engine.recognize_batch(frames[i:i + batch_size]))
+    elapsed = time.perf_counter() - started
+    fps = len(frames) / elapsed if elapsed else 0.0
+    print(f"{name:<28} {fps:8.2f} кадр/с   {elapsed * 1000 / len(frames):8.1f} мс/кадр")
+    return fps, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images_dir", nargs="?", help="Папка со скриншотами бегущих строк")
+    parser.add_argument("--frames", type=int, default=64, help="Количество кадров")
+    parser.add_argument("--batch", type=int, nargs="+", default=[4, 8, 16], help="Размеры пакетов")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images_dir, args.frames)
+    print(f"Кадров: {len(frames)}")
+
+    single_fps, single_results = measure_fps("по одной полосе", frames, 1)
+    for batch_size in args.batch:
+        fps, results = measure_fps(f"пакет K={batch_size}", frames, batch_size)
+        # Доля полос, текст которых совпал с распознаванием по одной
+        same = sum(1 for (a, _), (b, _) in zip(single_results, results) if " ".join(a.split()) == " ".join(b.split()))
+        print(f"{'':<28} ускорение x{fps / single_fps:.1f}, совпадение текста {same}/{len(frames)}")
+
+
+if __name__ == "__main__":
+    main()
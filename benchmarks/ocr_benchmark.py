@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки OCR на один кадр бегущей строки:
+pytesseract (процесс на каждый вызов) против постоянного движка ocr_engine.
+
+Запуск из корня проекта:
+    python benchmarks/ocr_benchmark.py [папка_со_скриншотами] [--frames N]
+Без папки используются синтетические полосы 1500x45 с текстом.
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+import pytesseract
+
+import ocr_engine
+
+
+def load_frames(images_dir, count):
+    """
+    Загружает кадры из папки или генерирует синтетические полосы бегущей строки.
+    """
+    frames = []
+    if images_dir:
+        for path in sorted(Path(images_dir).rglob("*.[jp][pn]g"))[:count]:
+            img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                frames.append(img)
+    while len(frames) < count:
+        strip = np.full((45, 1500), 255, dtype=np.uint8)
+        cv2.putText(strip, f"EMERCOM news line {len(frames)}: fire, evacuation, flood warning",
+                    (10, 32), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        frames.append(strip)
+    return frames
+
+
+def measure(name, func, frames):
+    """
+    Замеряет задержку func на каждом кадре и печатает статистику.
+    """
+    func(frames[0])  # Прогрев
+    latencies = []
+    for frame in frames:
+        started = time.perf_counter()
+        func(frame)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<28} среднее {statistics.mean(latencies):8.1f} мс   "
+          f"медиана {statistics.median(latencies):8.1f} мс   p95 {p95:8.1f} мс")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images_dir", nargs="?", help="Папка со скриншотами бегущих строк")
+    parser.add_argument("--frames", type=int, default=50, help="Количество кадров")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images_dir, args.frames)
+    print(f"Кадров: {len(frames)}")
+
+    before = measure("pytesseract (до)", lambda f: pytesseract.image_to_string(f, lang=ocr_engine.OCR_LANG), frames)
+    engine = ocr_engine.get_engine()
+    if not engine.is_persistent:
+        print("tesserocr не установлен: ocr_engine использует pytesseract, ускорения не будет")
+    after = measure("ocr_engine (после)", engine.recognize, frames)
+    print(f"Ускорение: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,9 @@ class ConfigManager:
         self._keywords_last_modified: Optional[datetime] = None
         self._cache_duration = timedelta(seconds=30)  # Кэш на 30 секунд
         self._lock = threading.Lock()
+        # Таблица длительностей записи по каналам и слотам (строится по загруженным каналам)
+        self._timetable: Optional[Dict[str, Dict[str, Any]]] = None
+        self._timetable_source: Optional[Dict[str, Any]] = None
         # Пути к файлам конфигурации
         self.channels_file = Path(get_resource_path('channels.json'))
         self.keywords_file = Path(get_resource_path('keywords.json'))
@@ -191,6 +194,60 @@ class ConfigManager:
         channels = self.load_channels()
         return channels.get(channel_name)
     
+    def build_duration_timetable(self, channels: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Строит таблицу длительностей записи из default_duration и special_durations (в минутах).
+        Особые длительности для времени, которого нет в lines канала, не применяются
+        (запись запускается только в слотах lines) и пишутся в лог.
+
+        Returns:
+            {канал: {'default': секунды или None, 'slots': {"HH:MM": секунды}}}
+        """
+        timetable = {}
+        for channel_name, info in channels.items():
+            default = info.get('default_duration')
+            default_seconds = None
+            if default:
+                try:
+                    default_seconds = int(default) * 60
+                except (TypeError, ValueError):
+                    logger.error(f"Некорректная длительность по умолчанию {channel_name}: {default}")
+            lines = info.get('lines', [])
+            slots = {}
+            if default_seconds:
+                for slot in lines:
+                    slots[slot] = default_seconds
+            for slot, minutes in (info.get('special_durations') or {}).items():
+                if slot not in lines:
+                    logger.warning(f"Особая длительность {channel_name} {slot} не совпадает ни с одним слотом lines и не применяется")
+                    continue
+                try:
+                    slots[slot] = int(minutes) * 60
+                except (TypeError, ValueError):
+                    logger.error(f"Некорректная особая длительность {channel_name} {slot}: {minutes}")
+            timetable[channel_name] = {'default': default_seconds, 'slots': slots}
+        return timetable
+
+    def get_recording_duration(self, channel_name: str, slot: Optional[str] = None, fallback: int = 240) -> int:
+        """
+        Возвращает длительность записи канала в слоте расписания, в секундах.
+
+        Args:
+            channel_name: Название канала
+            slot: Время слота "HH:MM" (по умолчанию — текущее время)
+            fallback: Длительность, если у канала не задан default_duration
+        """
+        channels = self.load_channels()
+        with self._lock:
+            if self._timetable is None or self._timetable_source is not channels:
+                self._timetable = self.build_duration_timetable(channels)
+                self._timetable_source = channels
+            entry = self._timetable.get(channel_name)
+        if entry is None:
+            return fallback
+        slot = slot or datetime.now().strftime("%H:%M")
+        return entry['slots'].get(slot) or entry['default'] or fallback
+
     def get_channel_names(self) -> list:
         """
         Получает список всех названий каналов.
@@ -0,0 +1,636 @@
+import sys
+import queue
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "events.db"
+# Пакетная запись: не более WRITE_BATCH_SIZE событий или WRITE_BATCH_INTERVAL секунд на транзакцию
+WRITE_BATCH_SIZE = 200
+WRITE_BATCH_INTERVAL = 0.5
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    capture_id INTEGER NOT NULL REFERENCES captures(id),
+    channel TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    text TEXT NOT NULL,
+    confidence REAL
+);
+CREATE TABLE IF NOT EXISTS keyword_hits (
+    id INTEGER PRIMARY KEY,
+    text_id INTEGER NOT NULL REFERENCES texts(id),
+    keyword TEXT NOT NULL,
+    path TEXT,
+    token TEXT
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    channel TEXT,
+    item TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS video_texts (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    video_file TEXT NOT NULL,
+    frame_idx INTEGER NOT NULL,
+    timestamp_sec INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS telegram_files (
+    content_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (content_hash, kind)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    channel TEXT,
+    file_path TEXT NOT NULL,
+    caption TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TEXT NOT NULL,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (kind, item)
+);
+CREATE INDEX IF NOT EXISTS idx_captures_channel_time ON captures(channel, captured_at);
+CREATE INDEX IF NOT EXISTS idx_texts_channel_time ON texts(channel, captured_at);
+CREATE INDEX IF NOT EXISTS idx_texts_time ON texts(captured_at);
+CREATE INDEX IF NOT EXISTS idx_hits_keyword ON keyword_hits(keyword);
+CREATE INDEX IF NOT EXISTS idx_hits_text ON keyword_hits(text_id);
+CREATE INDEX IF NOT EXISTS idx_deliveries_item ON deliveries(kind, item, status);
+CREATE INDEX IF NOT EXISTS idx_deliveries_channel_time ON deliveries(channel, created_at);
+CREATE INDEX IF NOT EXISTS idx_deliveries_kind_time ON deliveries(kind, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_video_texts_video ON video_texts(channel, video_file, timestamp_sec);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(text, content='texts', content_rowid='id', tokenize='unicode61');
+CREATE TRIGGER IF NOT EXISTS texts_fts_insert AFTER INSERT ON texts BEGIN
+    INSERT INTO texts_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS texts_fts_delete AFTER DELETE ON texts BEGIN
+    INSERT INTO texts_fts(texts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _format_time(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    return str(value) if value else datetime.now().strftime(TIME_FORMAT)
+
+
+class EventStore:
+    """
+    Хранилище событий распознавания строк в SQLite (режим WAL).
+
+    Таблицы: captures (захваченные кадры), texts (распознанные тексты,
+    полнотекстовый индекс FTS5), keyword_hits (найденные ключевые слова),
+    deliveries (отправки в Telegram), video_texts (тексты кадров crop-видео
+    по файлу и секунде), telegram_files (file_id загруженных в Telegram
+    файлов по хешу содержимого), outbox (очередь отправки с повторами). Запись идет пакетами в фоновом потоке,
+    чтение — из отдельных соединений каждого потока без блокировки записи.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        """
+        Инициализация хранилища. База открывается при первом обращении.
+
+        Args:
+            db_path: Путь к файлу базы данных
+        """
+        self.db_path = Path(db_path)
+        self.fts_enabled = False
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._open_lock = threading.Lock()
+        self._opened = False
+        self._local = threading.local()
+
+    def configure(self, db_path: str):
+        """
+        Меняет путь к базе (до первого обращения).
+        """
+        if self._opened:
+            if Path(db_path) != self.db_path:
+                logger.warning(f"База событий уже открыта ({self.db_path}), путь {db_path} не применен")
+            return
+        self.db_path = Path(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.db_path), timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def _ensure_open(self):
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                logger.warning(f"FTS5 недоступен в этой сборке SQLite, поиск будет через LIKE: {e}")
+            connection.commit()
+            connection.close()
+            self._writer = threading.Thread(target=self._write_loop, name="event_store_writer", daemon=True)
+            self._writer.start()
+            self._opened = True
+            logger.info(f"База событий открыта: {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Соединение текущего потока (для чтения и для немедленной записи очереди отправки).
+        """
+        self._ensure_open()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            connection.row_factory = sqlite3.Row
+            # Встроенный lower() SQLite не меняет регистр кириллицы
+            connection.create_function("py_lower", 1, lambda value: value.lower() if value else value, deterministic=True)
+        return connection
+
+    # --- Запись ---
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = datetime.now() + timedelta(seconds=WRITE_BATCH_INTERVAL)
+            # Запрос flush() закрывает пакет сразу, не дожидаясь интервала
+            while len(batch) < WRITE_BATCH_SIZE and not isinstance(batch[-1], threading.Event):
+                timeout = (deadline - datetime.now()).total_seconds()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            waiters = [event for event in batch if isinstance(event, threading.Event)]
+            events = [event for event in batch if not isinstance(event, threading.Event)]
+            if events:
+                self._write_batch(connection, events)
+            for waiter in waiters:
+                waiter.set()
+        connection.close()
+
+    def _write_batch(self, connection, events):
+        """
+        Записывает пакет одной транзакцией; каждое событие — в своей точке сохранения,
+        поэтому ошибочное событие откатывается без остальных событий пакета.
+        """
+        try:
+            with connection:
+                connection.execute("BEGIN")
+                for event in events:
+                    connection.execute("SAVEPOINT event")
+                    try:
+                        getattr(self, f"_write_{event[0]}")(connection, *event[1:])
+                    except Exception as e:
+                        connection.execute("ROLLBACK TO event")
+                        logger.error(f"Ошибка записи события {event[0]} в базу, событие пропущено: {e}")
+                    connection.execute("RELEASE event")
+        except Exception as e:
+            logger.error(f"Ошибка записи {len(events)} событий в базу: {e}")
+
+    def _enqueue(self, *event):
+        self._ensure_open()
+        self._queue.put(event)
+
+    def _write_text(self, connection, channel, captured_at, source, text, confidence, hits):
+        capture_id = connection.execute(
+            "INSERT INTO captures(channel, captured_at, source) VALUES (?, ?, ?)",
+            (channel, captured_at, source)
+        ).lastrowid
+        text_id = connection.execute(
+            "INSERT INTO texts(capture_id, channel, captured_at, text, confidence) VALUES (?, ?, ?, ?, ?)",
+            (capture_id, channel, captured_at, text, confidence)
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO keyword_hits(text_id, keyword, path, token) VALUES (?, ?, ?, ?)",
+            [(text_id, hit.get('keyword'), hit.get('path'), hit.get('token')) for hit in hits]
+        )
+
+    def _write_delivery(self, connection, kind, channel, item, status, text, created_at):
+        connection.execute(
+            "INSERT INTO deliveries(kind, channel, item, status, text, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, channel, item, status, text, created_at)
+        )
+
+    def _write_delivery_once(self, connection, kind, channel, item, status, text, created_at):
+        exists = connection.execute(
+            "SELECT 1 FROM deliveries WHERE kind = ? AND item = ? AND status = ? LIMIT 1", (kind, item, status)
+        ).fetchone()
+        if not exists:
+            self._write_delivery(connection, kind, channel, item, status, text, created_at)
+
+    def _write_video_texts(self, connection, channel, video_file, rows, replace=True):
+        if replace:
+            connection.execute("DELETE FROM video_texts WHERE channel = ? AND video_file = ?", (channel, video_file))
+        connection.executemany(
+            "INSERT INTO video_texts(channel, video_file, frame_idx, timestamp_sec, text) VALUES (?, ?, ?, ?, ?)",
+            [(channel, video_file, frame_idx, timestamp_sec, text) for frame_idx, timestamp_sec, text in rows]
+        )
+
+    def _write_remove_video_texts(self, connection, channel, video_file):
+        if video_file is None:
+            connection.execute("DELETE FROM video_texts")
+        else:
+            connection.execute("DELETE FROM video_texts WHERE channel = ? AND video_file = ?", (channel, video_file))
+
+    def _write_telegram_file_id(self, connection, content_hash, kind, file_id, created_at):
+        connection.execute(
+            "INSERT OR REPLACE INTO telegram_files(content_hash, kind, file_id, created_at) VALUES (?, ?, ?, ?)",
+            (content_hash, kind, file_id, created_at)
+        )
+
+    def _write_forget_telegram_file_id(self, connection, content_hash, kind):
+        connection.execute("DELETE FROM telegram_files WHERE content_hash = ? AND kind = ?", (content_hash, kind))
+
+    def record_text(self, channel: str, text: str, captured_at=None, source: Optional[str] = None,
+                    confidence: Optional[float] = None, hits: Iterable[dict] = ()):
+        """
+        Записывает распознанный текст кадра (с найденными ключевыми словами).
+
+        Args:
+            channel: Канал
+            text: Распознанный текст
+            captured_at: Время захвата (datetime или строка 'YYYY-MM-DD HH:MM:SS'; по умолчанию — сейчас)
+            source: Источник кадра (путь к файлу, 'stream', имя видео)
+            confidence: Средняя уверенность OCR
+            hits: Совпадения ключевых слов {'keyword', 'path', 'token'}
+        """
+        if not text or not text.strip():
+            return
+        self._enqueue('text', channel, _format_time(captured_at), source, text, confidence, [dict(hit) for hit in hits])
+
+    def record_delivery(self, kind: str, item: str, status: str, channel: Optional[str] = None,
+                        text: Optional[str] = None, created_at=None):
+        """
+        Записывает событие отправки.
+
+        Args:
+            kind: Тип ('screenshot', 'video', 'report')
+            item: Имя отправляемого файла
+            status: Статус ('accepted' — принят к отправке, 'sent', 'failed')
+            channel: Канал
+            text: Текст строки (для скриншотов)
+        """
+        self._enqueue('delivery', kind, channel, item, status, text, _format_time(created_at))
+
+    def record_video_texts(self, channel: str, video_file: str, rows: Iterable[tuple], replace: bool = True):
+        """
+        Сохраняет тексты кадров crop-видео.
+
+        Args:
+            channel: Канал
+            video_file: Имя видеофайла
+            rows: (номер кадра, секунда от начала, текст)
+            replace: Заменить прежние тексты этого видео (False — дописать, например во время записи)
+        """
+        self._enqueue('video_texts', channel, video_file, [tuple(row) for row in rows], replace)
+
+    def remove_video_texts(self, channel: Optional[str] = None, video_file: Optional[str] = None):
+        """
+        Удаляет тексты одного видео (без аргументов — тексты всех видео).
+        """
+        self._enqueue('remove_video_texts', channel, video_file)
+
+    def record_telegram_file_id(self, content_hash: str, kind: str, file_id: str):
+        """
+        Запоминает file_id файла, загруженного в Telegram (kind: 'document', 'video').
+        """
+        self._enqueue('telegram_file_id', content_hash, kind, file_id, _format_time(None))
+
+    def forget_telegram_file_id(self, content_hash: str, kind: str):
+        """
+        Удаляет file_id, который Telegram больше не принимает.
+        """
+        self._enqueue('forget_telegram_file_id', content_hash, kind)
+
+    def import_delivered_items(self, kind: str, status: str, items: Iterable[str]):
+        """
+        Однократно переносит список отправленных файлов прежнего формата (sent_videos.txt и т.п.).
+        """
+        for item in items:
+            self._enqueue('delivery_once', kind, None, item, status, None, _format_time(None))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Ждет, пока все поставленные в очередь события будут записаны.
+        """
+        if not self._opened:
+            return True
+        waiter = threading.Event()
+        self._queue.put(waiter)
+        return waiter.wait(timeout)
+
+    def close(self):
+        """
+        Дописывает очередь и останавливает поток записи.
+        """
+        if not self._opened:
+            return
+        self._queue.put(None)
+        if self._writer is not None:
+            self._writer.join(timeout=10)
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+        self._opened = False
+
+    # --- Очередь отправки (outbox) ---
+    # Изменения очереди записываются сразу (не через пакетную запись),
+    # чтобы поставленная в очередь отправка не терялась при сбое.
+
+    def outbox_add(self, kind: str, item: str, file_path: str, caption: str = "",
+                   channel: Optional[str] = None) -> bool:
+        """
+        Добавляет файл в очередь отправки.
+
+        Returns:
+            False, если такой элемент (kind, item) уже был в очереди
+        """
+        now = _format_time(None)
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO outbox(kind, item, channel, file_path, caption, status, attempts, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)",
+                (kind, item, channel, file_path, caption, now, now, now)
+            )
+        return cursor.rowcount > 0
+
+    def outbox_status(self, kind: str, item: str) -> Optional[str]:
+        """
+        Статус элемента очереди ('pending', 'sending', 'sent', 'failed') или None.
+        """
+        row = self._connection().execute(
+            "SELECT status FROM outbox WHERE kind = ? AND item = ?", (kind, item)
+        ).fetchone()
+        return row['status'] if row else None
+
+    def outbox_claim_next(self, group_kinds: Iterable[str] = (), group_size: int = 10) -> List[dict]:
+        """
+        Забирает следующую единицу отправки и помечает ее 'sending': самый ранний
+        элемент, время попытки которого наступило, а если его вид в group_kinds —
+        вместе с ним до group_size наступивших элементов того же вида.
+        """
+        now = _format_time(None)
+        connection = self._connection()
+        with connection:
+            first = connection.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if first is None:
+                return []
+            rows = [first]
+            if first['kind'] in group_kinds and group_size > 1:
+                rows += connection.execute(
+                    "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? AND kind = ? AND id != ? "
+                    "ORDER BY next_attempt_at, id LIMIT ?",
+                    (now, first['kind'], first['id'], group_size - 1)
+                ).fetchall()
+            connection.executemany(
+                "UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows]
+            )
+        return [dict(row) for row in rows]
+
+    def outbox_mark_sent(self, outbox_id: int):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?",
+                (_format_time(None), outbox_id)
+            )
+
+    def outbox_mark_failed(self, outbox_id: int, error: str, retry_at=None):
+        """
+        Записывает неудачную попытку: с retry_at элемент возвращается в очередь
+        к этому времени, без него — помечается окончательно неудачным.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?, "
+                "updated_at = ? WHERE id = ?",
+                ('pending' if retry_at else 'failed', _format_time(retry_at), error,
+                 _format_time(None), outbox_id)
+            )
+
+    def outbox_recover(self) -> int:
+        """
+        Возвращает в очередь элементы, отправка которых прервалась (статус 'sending' после сбоя).
+        """
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "UPDATE outbox SET status = 'pending', updated_at = ? WHERE status = 'sending'", (_format_time(None),)
+            )
+        return cursor.rowcount
+
+    def outbox_counts(self) -> dict:
+        """
+        Количество элементов очереди по статусам.
+        """
+        rows = self._connection().execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+    # --- Чтение ---
+
+    def delivery_statuses(self, kind: str, item: str) -> List[str]:
+        """
+        Статусы отправки файла (например, ['sent']).
+        """
+        self.flush()
+        rows = self._connection().execute(
+            "SELECT DISTINCT status FROM deliveries WHERE kind = ? AND item = ?", (kind, item)
+        ).fetchall()
+        return [row['status'] for row in rows]
+
+    def delivered_texts(self, day: Optional[str] = None, kind: str = 'screenshot', status: str = 'accepted') -> List[str]:
+        """
+        Тексты, принятые к отправке за день (day в формате YYYY-MM-DD, по умолчанию — сегодня).
+        """
+        self.flush()
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        rows = self._connection().execute(
+            "SELECT text FROM deliveries WHERE kind = ? AND status = ? AND created_at >= ? AND created_at < ? "
+            "AND text IS NOT NULL ORDER BY id",
+            (kind, status, f"{day} 00:00:00", f"{day} 99")
+        ).fetchall()
+        return [row['text'] for row in rows]
+
+    def telegram_file_id(self, content_hash: str, kind: str) -> Optional[str]:
+        """
+        file_id ранее загруженного файла с таким же содержимым или None.
+        """
+        self.flush()
+        row = self._connection().execute(
+            "SELECT file_id FROM telegram_files WHERE content_hash = ? AND kind = ?", (content_hash, kind)
+        ).fetchone()
+        return row['file_id'] if row else None
+
+    def video_texts(self, channel: str, video_file: str) -> List[dict]:
+        """
+        Тексты кадров одного видео в порядке времени.
+
+        Returns:
+            [{'frame_idx', 'timestamp_sec', 'text'}, ...]
+        """
+        self.flush()
+        rows = self._connection().execute(
+            "SELECT frame_idx, timestamp_sec, text FROM video_texts WHERE channel = ? AND video_file = ? "
+            "ORDER BY timestamp_sec, frame_idx",
+            (channel, video_file)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_video_texts(self) -> Iterator[tuple]:
+        """
+        Все тексты crop-видео: (канал, видеофайл, секунда, текст), сгруппированные по видео.
+        """
+        self.flush()
+        cursor = self._connection().execute(
+            "SELECT channel, video_file, timestamp_sec, text FROM video_texts "
+            "ORDER BY channel, video_file, timestamp_sec, frame_idx"
+        )
+        for row in cursor:
+            yield row['channel'], row['video_file'], row['timestamp_sec'], row['text']
+
+    def search(self, query: str, channel: Optional[str] = None, since=None, until=None,
+               limit: int = 100, prefix: bool = True) -> List[dict]:
+        """
+        Полнотекстовый поиск по распознанным текстам.
+
+        Args:
+            query: Слова для поиска (все должны встречаться в тексте)
+            channel: Канал
+            since, until: Границы времени захвата (datetime или строка)
+            limit: Максимум результатов
+            prefix: Искать слова как префиксы ('пожар' найдет 'пожара')
+        Returns:
+            [{'channel', 'captured_at', 'text', 'keywords'}, ...] от новых к старым
+        """
+        connection = self._connection()
+        self.flush()
+        words = [word for word in query.replace('"', ' ').split() if word]
+        if not words:
+            return []
+        conditions, params = [], []
+        if self.fts_enabled:
+            match = " ".join(f'"{word}"' + ("*" if prefix else "") for word in words)
+            conditions.append("t.id IN (SELECT rowid FROM texts_fts WHERE texts_fts MATCH ?)")
+            params.append(match)
+        else:
+            for word in words:
+                conditions.append("py_lower(t.text) LIKE ?")
+                params.append(f"%{word.lower()}%")
+        if channel:
+            conditions.append("t.channel = ?")
+            params.append(channel)
+        if since:
+            conditions.append("t.captured_at >= ?")
+            params.append(_format_time(since))
+        if until:
+            conditions.append("t.captured_at < ?")
+            params.append(_format_time(until))
+        params.append(limit)
+        rows = connection.execute(
+            "SELECT t.id, t.channel, t.captured_at, t.text, "
+            "(SELECT group_concat(DISTINCT keyword) FROM keyword_hits h WHERE h.text_id = t.id) AS keywords "
+            f"FROM texts t WHERE {' AND '.join(conditions)} ORDER BY t.captured_at DESC LIMIT ?",
+            params
+        ).fetchall()
+        return [
+            {'channel': row['channel'], 'captured_at': row['captured_at'], 'text': row['text'],
+             'keywords': row['keywords'].split(',') if row['keywords'] else []}
+            for row in rows
+        ]
+
+
+# Глобальный экземпляр хранилища событий
+event_store = EventStore()
+
+
+def main():
+    """
+    Поиск по базе из командной строки:
+        python event_store.py ДТП --channel MIR24 --day вчера
+    """
+    parser = argparse.ArgumentParser(description="Поиск по распознанным бегущим строкам")
+    parser.add_argument("query", help="Слова для поиска")
+    parser.add_argument("--channel", help="Канал")
+    parser.add_argument("--day", help="День: YYYY-MM-DD, 'сегодня' или 'вчера'")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Путь к базе")
+    args = parser.parse_args()
+
+    since = until = None
+    if args.day:
+        if args.day in ("сегодня", "today"):
+            day = datetime.now().date()
+        elif args.day in ("вчера", "yesterday"):
+            day = datetime.now().date() - timedelta(days=1)
+        else:
+            day = datetime.strptime(args.day, "%Y-%m-%d").date()
+        since = datetime.combine(day, datetime.min.time())
+        until = since + timedelta(days=1)
+
+    store = EventStore(args.db)
+    started = datetime.now()
+    results = store.search(args.query, channel=args.channel, since=since, until=until, limit=args.limit)
+    elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+    for result in results:
+        keywords = f" [{', '.join(result['keywords'])}]" if result['keywords'] else ""
+        print(f"{result['captured_at']}  {result['channel']}{keywords}: {result['text']}")
+    print(f"Найдено: {len(results)} ({elapsed_ms:.1f} мс)", file=sys.stderr)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ocr_engine import perceptual_hash
+from stream_capture import parse_crop
+
+logger = logging.getLogger(__name__)
+
+# Политики выборки кадров для OCR crop-видео
+SAMPLING_POLICIES = ('step', 'scene', 'keyframes')
+# Размер хеша для детектора смены сцены (ширина, высота)
+SCENE_HASH_SIZE = (64, 8)
+
+
+def get_resource_path(filename, subdir="bin"):
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, subdir, filename)
+
+
+class FrameSampler:
+    """
+    Разреженная выборка кадров из видеофайла для распознавания текста.
+
+    Политики:
+        step      — кадр каждые interval секунд. Основной путь — ffmpeg
+                    (фильтр select, crop и перевод в оттенки серого внутри
+                    ffmpeg, многопоточное декодирование): в Python передаются
+                    только выбранные кадры. Если ffmpeg недоступен, кадры
+                    читаются через OpenCV: grab() декодирует каждый кадр
+                    (межкадровое сжатие не позволяет его пропустить),
+                    а преобразование в изображение (retrieve) выполняется
+                    только для выбранных;
+        scene     — кадры проверяются каждые scene_check_interval секунд,
+                    на OCR отдаются только те, где полоса заметно изменилась
+                    (но не реже одного раза в interval секунд);
+        keyframes — только ключевые кадры: их время берется из ffprobe,
+                    к каждому выполняется переход по времени.
+
+    В decode_time накапливается время чтения и полного декодирования всех
+    кадров ролика (не только выбранных) — отдельно от времени OCR.
+    Для роликов, записанных без перекодирования, crop применяется только
+    к выбранным кадрам (параметр crop_params метода sample).
+    """
+
+    def __init__(self, policy: str = 'step', interval: float = 2.0,
+                 scene_threshold: float = 0.05, scene_check_interval: float = 0.5):
+        """
+        Инициализация выборки.
+
+        Args:
+            policy: Политика выборки ('step', 'scene', 'keyframes')
+            interval: Шаг выборки в секундах
+            scene_threshold: Доля отличающихся бит хеша, начиная с которой полоса считается изменившейся
+            scene_check_interval: Шаг проверки смены сцены в секундах
+        """
+        if policy not in SAMPLING_POLICIES:
+            logger.warning(f"Неизвестная политика выборки кадров '{policy}', используется 'step'")
+            policy = 'step'
+        self.policy = policy
+        self.interval = interval
+        self.scene_threshold = scene_threshold
+        self.scene_check_interval = scene_check_interval
+        self._crop = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Сбрасывает счетчики.
+        """
+        self.decode_time = 0.0
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.frames_sampled = 0
+
+    def get_stats(self) -> dict:
+        return {
+            'policy': self.policy,
+            'decode_time': self.decode_time,
+            'frames_grabbed': self.frames_grabbed,
+            'frames_decoded': self.frames_decoded,
+            'frames_sampled': self.frames_sampled,
+        }
+
+    def sample(self, video_path, crop_params: Optional[str] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Выдает выбранные кадры видео.
+
+        Args:
+            video_path: Путь к видео
+            crop_params: Отложенный crop (формат: crop=width:height:x:y), применяемый к выбранным кадрам
+        Yields:
+            (номер кадра, секунда от начала, полутоновый кадр)
+        """
+        self._crop = parse_crop(crop_params)
+        cap = cv2.VideoCapture(str(video_path))
+        try:
+            if not cap.isOpened():
+                logger.warning(f"Не удалось открыть видео {video_path}")
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps <= 0:
+                fps = 25.0
+            if self.policy == 'keyframes':
+                keyframe_times = self._probe_keyframes(video_path)
+                if keyframe_times is not None:
+                    yield from self._sample_keyframes(cap, fps, keyframe_times)
+                    return
+                logger.warning(f"Ключевые кадры {video_path} не определены, используется шаг {self.interval} с")
+                yield from self._sample_step(cap, fps)
+            elif self.policy == 'scene':
+                yield from self._sample_scene(cap, fps)
+            else:
+                frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                sampled_before = self.frames_sampled
+                completed = yield from self._sample_step_ffmpeg(video_path, fps, frame_size)
+                if not completed and self.frames_sampled == sampled_before:
+                    logger.warning(f"Выборка кадров {video_path} через ffmpeg не удалась, используется OpenCV")
+                    yield from self._sample_step(cap, fps)
+        finally:
+            cap.release()
+
+    def _grab(self, cap) -> bool:
+        started = time.perf_counter()
+        ok = cap.grab()
+        self.decode_time += time.perf_counter() - started
+        if ok:
+            self.frames_grabbed += 1
+        return ok
+
+    def _to_gray(self, frame: np.ndarray) -> np.ndarray:
+        if self._crop is not None:
+            width, height, x, y = self._crop
+            h, w = frame.shape[:2]
+            if x + width <= w and y + height <= h:
+                frame = frame[y:y+height, x:x+width]
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _retrieve(self, cap) -> Optional[np.ndarray]:
+        started = time.perf_counter()
+        ret, frame = cap.retrieve()
+        gray = self._to_gray(frame) if ret else None
+        self.decode_time += time.perf_counter() - started
+        if gray is not None:
+            self.frames_decoded += 1
+        return gray
+
+    def _sample_step(self, cap, fps: float) -> Iterator[Tuple[int, float, np.ndarray]]:
+        step = max(1, int(fps * self.interval))
+        frame_idx = 0
+        while self._grab(cap):
+            if frame_idx % step == 0:
+                gray = self._retrieve(cap)
+                if gray is not None:
+                    self.frames_sampled += 1
+                    yield frame_idx, frame_idx / fps, gray
+            frame_idx += 1
+
+    def _sample_step_ffmpeg(self, video_path, fps: float, frame_size: Tuple[int, int]) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Выборка политики step через ffmpeg: кадры с номерами, кратными шагу,
+        выбираются фильтром select, обрезаются и переводятся в оттенки серого
+        в ffmpeg и читаются из stdout как rawvideo.
+
+        Returns:
+            True, если ffmpeg отработал без ошибок
+        """
+        width, height = frame_size
+        if width <= 0 or height <= 0:
+            return False
+        step = max(1, int(fps * self.interval))
+        filters = [f"select='not(mod(n,{step}))'"]
+        if self._crop is not None:
+            crop_width, crop_height, x, y = self._crop
+            # Crop за границами кадра — распознается полный кадр, как в OpenCV-пути
+            if x + crop_width <= width and y + crop_height <= height:
+                filters.append(f"crop={crop_width}:{crop_height}:{x}:{y}")
+                width, height = crop_width, crop_height
+        filters.append("format=gray")
+        cmd = [
+            get_resource_path("ffmpeg.exe"), "-hide_banner", "-loglevel", "error",
+            "-i", str(Path(video_path)),
+            "-map", "0:v:0", "-vf", ",".join(filters),
+            "-fps_mode", "passthrough", "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"
+        ]
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            logger.error(f"Не удалось запустить ffmpeg для выборки кадров {video_path}: {e}")
+            return False
+        size = width * height
+        frame_idx = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                data = process.stdout.read(size)
+                self.decode_time += time.perf_counter() - started
+                if len(data) < size:
+                    break
+                self.frames_grabbed += step
+                self.frames_decoded += 1
+                self.frames_sampled += 1
+                yield frame_idx, frame_idx / fps, np.frombuffer(data, dtype=np.uint8).reshape(height, width).copy()
+                frame_idx += step
+            stderr = process.stderr.read()
+            process.wait()
+            if process.returncode != 0:
+                logger.error(f"Ошибка ffmpeg при выборке кадров {video_path}: {stderr.decode(errors='ignore').strip()}")
+                return False
+            return True
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def _sample_scene(self, cap, fps: float) -> Iterator[Tuple[int, float, np.ndarray]]:
+        check_step = max(1, int(fps * self.scene_check_interval))
+        max_gap = max(check_step, int(fps * self.interval))
+        last_hash = None
+        last_idx = None
+        frame_idx = 0
+        while self._grab(cap):
+            if frame_idx % check_step == 0:
+                gray = self._retrieve(cap)
+                if gray is not None:
+                    frame_hash = np.unpackbits(np.frombuffer(perceptual_hash(gray, SCENE_HASH_SIZE), dtype=np.uint8))
+                    changed = (
+                        last_hash is None
+                        or np.count_nonzero(frame_hash != last_hash) / frame_hash.size >= self.scene_threshold
+                        or frame_idx - last_idx >= max_gap
+                    )
+                    if changed:
+                        last_hash = frame_hash
+                        last_idx = frame_idx
+                        self.frames_sampled += 1
+                        yield frame_idx, frame_idx / fps, gray
+            frame_idx += 1
+
+    def _sample_keyframes(self, cap, fps: float, keyframe_times: List[float]) -> Iterator[Tuple[int, float, np.ndarray]]:
+        for timestamp_sec in keyframe_times:
+            started = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_MSEC, timestamp_sec * 1000)
+            ret, frame = cap.read()
+            gray = self._to_gray(frame) if ret else None
+            self.decode_time += time.perf_counter() - started
+            if gray is None:
+                continue
+            self.frames_grabbed += 1
+            self.frames_decoded += 1
+            self.frames_sampled += 1
+            yield int(round(timestamp_sec * fps)), timestamp_sec, gray
+
+    def _probe_keyframes(self, video_path) -> Optional[List[float]]:
+        """
+        Возвращает время ключевых кадров видео (в секундах) через ffprobe.
+        """
+        cmd = [
+            get_resource_path("ffprobe.exe"),
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time,best_effort_timestamp_time",
+            "-of", "json",
+            str(Path(video_path))
+        ]
+        try:
+            started = time.perf_counter()
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.decode_time += time.perf_counter() - started
+            if result.returncode != 0:
+                logger.error(f"Ошибка ffprobe для {video_path}: {result.stderr.decode(errors='ignore')}")
+                return None
+            times = []
+            for frame in json.loads(result.stdout.decode()).get("frames", []):
+                value = frame.get("pts_time") or frame.get("best_effort_timestamp_time")
+                if value is not None:
+                    times.append(float(value))
+            return sorted(times) or None
+        except Exception as e:
+            logger.error(f"Не удалось получить ключевые кадры {video_path}: {e}")
+            return None
@@ -0,0 +1,365 @@
+import re
+import logging
+import threading
+from collections import Counter, OrderedDict, deque
+from difflib import SequenceMatcher
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from config_manager import config_manager
+from russian_stemmer import stem
+
+logger = logging.getLogger(__name__)
+
+# Минимальная длина слова для пословной и нечеткой проверки (_find_keywords_local)
+MIN_WORD_LENGTH = 3
+WORD_CLEAN_RE = re.compile(r'[^\wа-яё]')
+WHITESPACE_RE = re.compile(r'\s+')
+# Размер кэша результатов нечеткого поиска по словам
+FUZZY_CACHE_SIZE = 50000
+# Минимальная длина основы ключевого слова для поиска по основам
+MIN_STEM_LENGTH = 3
+# Пути, которыми найдено ключевое слово
+MATCH_PATHS = ('exact', 'word', 'stem', 'fuzzy')
+
+
+class FuzzyKeywordIndex:
+    """
+    Индекс для нечеткого поиска ключевых слов, похожих на слово.
+
+    Результат совпадает с проверкой SequenceMatcher(None, keyword, word).ratio() >= threshold
+    по всем ключевым словам. ratio = 2*M/(len(keyword)+len(word)), где M — число совпавших
+    символов, и M не превышает размера пересечения мультимножеств символов. Это пересечение
+    считается по инвертированному индексу символ -> ключевые слова, и SequenceMatcher
+    вызывается только для кандидатов, у которых верхняя оценка ratio проходит порог.
+    Результаты по словам кэшируются (LRU), так как слова строк часто повторяются.
+    """
+
+    def __init__(self, keywords: List[str], cache_size: int = FUZZY_CACHE_SIZE):
+        """
+        Инициализация индекса.
+
+        Args:
+            keywords: Ключевые слова в нижнем регистре
+            cache_size: Размер кэша результатов по словам
+        """
+        self.keywords = list(keywords)
+        self.cache_size = cache_size
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        for index, keyword in enumerate(self.keywords):
+            for char, count in Counter(keyword).items():
+                self._postings.setdefault(char, []).append((index, count))
+        self._cache: "OrderedDict[Tuple[str, float], FrozenSet[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.cache_hits = 0
+        self.verifications = 0
+
+    def lookup(self, word: str, threshold: float = 0.8) -> FrozenSet[int]:
+        """
+        Индексы ключевых слов, для которых SequenceMatcher ratio со словом >= threshold.
+        """
+        key = (word, threshold)
+        with self._lock:
+            self.lookups += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+        result = frozenset(self._compute(word, threshold))
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _compute(self, word: str, threshold: float) -> Set[int]:
+        common: Dict[int, int] = {}
+        for char, count in Counter(word).items():
+            for index, keyword_count in self._postings.get(char, ()):
+                common[index] = common.get(index, 0) + min(count, keyword_count)
+        word_length = len(word)
+        matcher = SequenceMatcher(None)
+        matcher.set_seq2(word)
+        found = set()
+        for index, upper in common.items():
+            total = len(self.keywords[index]) + word_length
+            # Та же формула, что в SequenceMatcher.ratio(): оценка сверху для M
+            if 2.0 * upper / total < threshold:
+                continue
+            self.verifications += 1
+            matcher.set_seq1(self.keywords[index])
+            if matcher.ratio() >= threshold:
+                found.add(index)
+        if threshold <= 0:
+            # Ключевые слова без общих символов тоже проходят нулевой порог
+            found.update(range(len(self.keywords)))
+        return found
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'cache_hits': self.cache_hits,
+                'verifications': self.verifications,
+                'cache_size': len(self._cache),
+            }
+
+
+class KeywordMatcher:
+    """
+    Поиск ключевых слов автоматом Ахо–Корасик.
+
+    Автомат строится один раз по списку ключевых слов (в нижнем регистре),
+    точный поиск всех слов — один линейный проход по тексту.
+    """
+
+    def __init__(self, keywords: Iterable[str], use_stems: bool = True):
+        """
+        Инициализация и построение автомата.
+
+        Args:
+            keywords: Ключевые слова (регистр не важен, дубликаты отбрасываются)
+            use_stems: Искать словоформы по основам (стеммер Snowball) до нечеткого поиска
+        """
+        self.keywords: List[str] = []
+        seen = set()
+        for keyword in keywords:
+            keyword = str(keyword).lower().strip()
+            if keyword and keyword not in seen:
+                seen.add(keyword)
+                self.keywords.append(keyword)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._build()
+        self.fuzzy_index = FuzzyKeywordIndex(self.keywords)
+        # Подстроки ключевых слов (не короче MIN_WORD_LENGTH) -> индексы слов
+        self._substrings: Dict[str, Set[int]] = {}
+        for index, keyword in enumerate(self.keywords):
+            for start in range(len(keyword)):
+                for end in range(start + MIN_WORD_LENGTH, len(keyword) + 1):
+                    self._substrings.setdefault(keyword[start:end], set()).add(index)
+        # Основа первого слова -> [(индекс ключевого слова, основы всех его слов)]
+        self._stems: Dict[str, List[Tuple[int, Tuple[str, ...]]]] = {}
+        if use_stems:
+            for index, keyword in enumerate(self.keywords):
+                stems = tuple(stem(word) for word in self._clean_words(keyword))
+                if stems and all(len(item) >= MIN_STEM_LENGTH for item in stems):
+                    self._stems.setdefault(stems[0], []).append((index, stems))
+        self.path_counts = Counter()
+        self.texts_checked = 0
+        self.texts_fuzzy = 0
+
+    @staticmethod
+    def _clean_words(text: str) -> List[str]:
+        words = (WORD_CLEAN_RE.sub('', word) for word in text.split())
+        return [word for word in words if word]
+
+    def _build(self):
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(index)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def _iter_matches(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield index, position + 1 - len(self.keywords[index]), position + 1
+
+    def find_all(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        Все вхождения ключевых слов в текст.
+
+        Returns:
+            Список (ключевое слово, начало, конец) — смещения в тексте, приведенном к нижнему регистру
+        """
+        return [(self.keywords[index], start, end) for index, start, end in self._iter_matches(text.lower())]
+
+    def find(self, text: str) -> List[str]:
+        """
+        Ключевые слова, входящие в текст (каждое один раз, в порядке первого вхождения).
+        """
+        found = []
+        seen = set()
+        for index, _, _ in self._iter_matches(text.lower()):
+            if index not in seen:
+                seen.add(index)
+                found.append(self.keywords[index])
+        return found
+
+    def contains_any(self, text: str) -> bool:
+        """
+        True, если в тексте есть хотя бы одно ключевое слово.
+        """
+        for _ in self._iter_matches(text.lower()):
+            return True
+        return False
+
+    def fuzzy_find(self, words: Iterable[str], threshold: float = 0.8, skip: Iterable[int] = ()) -> Set[int]:
+        """
+        Индексы ключевых слов, похожих (SequenceMatcher ratio >= threshold) хотя бы на одно слово.
+        Ключевые слова из skip не проверяются.
+        """
+        found = set()
+        for word in words:
+            found.update(self.fuzzy_index.lookup(word, threshold))
+        return found.difference(skip)
+
+    def stem_find(self, words: List[str]) -> Dict[int, str]:
+        """
+        Ключевые слова, словоформы которых есть среди слов (совпадение основ).
+
+        Returns:
+            {индекс ключевого слова: слово (или фраза) текста}
+        """
+        found: Dict[int, str] = {}
+        if not self._stems:
+            return found
+        stems = [stem(word) for word in words]
+        for position, word_stem in enumerate(stems):
+            for index, keyword_stems in self._stems.get(word_stem, ()):
+                if index not in found and tuple(stems[position:position + len(keyword_stems)]) == keyword_stems:
+                    found[index] = " ".join(words[position:position + len(keyword_stems)])
+        return found
+
+    def _count(self, matches: List[dict], reached_fuzzy: bool):
+        self.texts_checked += 1
+        if reached_fuzzy:
+            self.texts_fuzzy += 1
+        self.path_counts.update(match['path'] for match in matches)
+
+    def find_first(self, text: str, threshold: float = 0.8) -> Optional[dict]:
+        """
+        Первое найденное ключевое слово: точное вхождение, затем словоформа по основе,
+        затем слово, похожее на ключевое (fuzzy).
+
+        Returns:
+            {'keyword', 'path', 'token'} или None
+        """
+        text = text.lower()
+        for index, start, end in self._iter_matches(text):
+            match = {'keyword': self.keywords[index], 'path': 'exact', 'token': text[start:end]}
+            self._count([match], False)
+            return match
+        stem_hits = self.stem_find(self._clean_words(text))
+        for index, token in stem_hits.items():
+            match = {'keyword': self.keywords[index], 'path': 'stem', 'token': token}
+            self._count([match], False)
+            return match
+        for word in text.split():
+            for index in sorted(self.fuzzy_index.lookup(word, threshold)):
+                match = {'keyword': self.keywords[index], 'path': 'fuzzy', 'token': word}
+                self._count([match], True)
+                return match
+        self._count([], True)
+        return None
+
+    def match(self, text: str, threshold: float = 0.8) -> bool:
+        """
+        Есть ли в тексте ключевое слово: точное вхождение, словоформа или слово, похожее на ключевое.
+        """
+        return self.find_first(text, threshold) is not None
+
+    def find_matches(self, text: str, threshold: float = 0.8) -> List[dict]:
+        """
+        Локальный поиск ключевых слов с указанием пути, которым найдено каждое:
+            exact — точное вхождение в текст;
+            word  — ключевое слово внутри слова или слово внутри ключевого слова;
+            stem  — совпадение основ (словоформа);
+            fuzzy — нечеткое совпадение слова (только для слов, не разобранных по основам).
+
+        Returns:
+            [{'keyword', 'path', 'token'}, ...] в порядке списка ключевых слов
+        """
+        text_clean = WHITESPACE_RE.sub(' ', text.lower()).strip()
+        found: Dict[int, dict] = {}
+        for index, start, end in self._iter_matches(text_clean):
+            found.setdefault(index, {'path': 'exact', 'token': text_clean[start:end]})
+        words = [word for word in self._clean_words(text_clean) if len(word) >= MIN_WORD_LENGTH]
+        for word in words:
+            # Ключевое слово внутри слова
+            for index, _, _ in self._iter_matches(word):
+                found.setdefault(index, {'path': 'word', 'token': word})
+            # Слово внутри ключевого слова
+            for index in self._substrings.get(word, ()):
+                found.setdefault(index, {'path': 'word', 'token': word})
+        reached_fuzzy = False
+        if len(found) < len(self.keywords):
+            stem_hits = self.stem_find(self._clean_words(text_clean))
+            for index, token in stem_hits.items():
+                found.setdefault(index, {'path': 'stem', 'token': token})
+            # Слова, уже разобранные как словоформы ключевых слов, в нечеткий поиск не идут
+            resolved = set(" ".join(stem_hits.values()).split())
+            fuzzy_words = [word for word in words if word not in resolved]
+            if fuzzy_words and len(found) < len(self.keywords):
+                reached_fuzzy = True
+                for word in fuzzy_words:
+                    for index in self.fuzzy_index.lookup(word, threshold):
+                        found.setdefault(index, {'path': 'fuzzy', 'token': word})
+        matches = [dict(keyword=self.keywords[index], **found[index]) for index in sorted(found)]
+        self._count(matches, reached_fuzzy)
+        return matches
+
+    def find_local(self, text: str, threshold: float = 0.8) -> List[str]:
+        """
+        Локальный поиск ключевых слов (см. find_matches).
+
+        Returns:
+            Найденные ключевые слова в порядке списка
+        """
+        return [match['keyword'] for match in self.find_matches(text, threshold)]
+
+    def get_stats(self) -> dict:
+        """
+        Статистика: сколько текстов проверено, сколько дошло до нечеткого поиска,
+        сколько совпадений найдено каждым путем.
+        """
+        return {
+            'texts_checked': self.texts_checked,
+            'texts_fuzzy': self.texts_fuzzy,
+            'paths': {path: self.path_counts.get(path, 0) for path in MATCH_PATHS},
+        }
+
+
+_matcher: Optional[KeywordMatcher] = None
+_matcher_source = None
+_matcher_lock = threading.Lock()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """
+    Общий KeywordMatcher по keywords.json. Перестраивается только после
+    изменения файла (config_manager перечитывает его по времени изменения).
+    """
+    global _matcher, _matcher_source
+    keywords_data = config_manager.load_keywords()
+    with _matcher_lock:
+        if _matcher is None or keywords_data is not _matcher_source:
+            _matcher = KeywordMatcher(keywords_data.get('keywords', []))
+            _matcher_source = keywords_data
+            logger.info(f"Автомат ключевых слов построен: {len(_matcher.keywords)} слов")
+        return _matcher
@@ -1,20 +1,23 @@
 import os
+import csv
 import json
 import cv2
-import pytesseract
 from PIL import Image
 import pandas as pd
 from datetime import datetime
 import re
 import time
 import requests
-from difflib import SequenceMatcher
 import logging
 from pathlib import Path
 from typing import List, Tuple, Optional
 import numpy as np
 from collections import Counter
 from config_manager import config_manager
+from ocr_engine import recognize_text as ocr_recognize_text
+from keyword_matcher import get_keyword_matcher
+from text_index import NearDuplicateIndex
+from event_store import event_store
 import threading
 from logging.handlers import RotatingFileHandler
 
@@ -32,34 +35,153 @@ if not logger.hasHandlers():
 class TextDuplicateChecker:
     """
     Класс для проверки дублирования текста по схожести.
+    Кандидаты ищутся индексом MinHash/LSH, точная проверка — SequenceMatcher.
     """
     def __init__(self, similarity_threshold: float = 0.8):
         """
         Инициализация чекера дубликатов.
         """
-        self.previous_texts: List[str] = []
         self.similarity_threshold = similarity_threshold
+        self.index = NearDuplicateIndex(threshold=similarity_threshold)
+
+    def is_duplicate(self, text: str, compare_texts: Optional[List[str]] = None) -> bool:
+        """
+        Проверяет, является ли текст дубликатом среди уже известных текстов
+        (и compare_texts, которые при этом добавляются в индекс).
+        """
+        if not text:
+            return False
+        if compare_texts:
+            self.index.add_many(compare_texts)
+        return self.index.is_duplicate(text)
+
+    def add_text(self, text: str):
+        """
+        Добавляет текст в индекс для последующей проверки.
+        """
+        self.index.add(text)
+
+class DailyTextStore:
+    """
+    Тексты строк за день в памяти с журналом на диске.
+
+    Журнал daily_lines_YYYY-MM-DD.csv читается один раз при первом обращении
+    (и при смене дня), новые строки только дописываются в его конец.
+    Excel-файл daily_lines_YYYY-MM-DD.xlsx строится по требованию (export_xlsx),
+    например для ежедневного отчета.
+    """
+    FIELDS = ['Timestamp', 'Channel', 'Text', 'ImagePath']
+
+    def __init__(self, directory: str = "."):
+        """
+        Инициализация хранилища.
+
+        Args:
+            directory: Папка для журналов и отчетов
+        """
+        self.directory = Path(directory)
+        self._day: Optional[str] = None
+        self._rows: List[dict] = []
         self._lock = threading.Lock()
 
-    def is_duplicate(self, text: str, compare_texts: List[str]) -> bool:
+    def journal_path(self, day: Optional[str] = None) -> Path:
+        return self.directory / f"daily_lines_{day or datetime.now().strftime('%Y-%m-%d')}.csv"
+
+    def xlsx_path(self, day: Optional[str] = None) -> Path:
+        return self.directory / f"daily_lines_{day or datetime.now().strftime('%Y-%m-%d')}.xlsx"
+
+    def _load_day(self, day: str):
+        """
+        Загружает журнал дня. Если журнала нет, но есть Excel-файл прежнего формата,
+        строки переносятся из него в журнал.
+        """
+        rows = []
+        journal = self.journal_path(day)
+        try:
+            if journal.exists():
+                with journal.open('r', encoding='utf-8', newline='') as f:
+                    rows = list(csv.DictReader(f))
+            elif self.xlsx_path(day).exists():
+                df = pd.read_excel(self.xlsx_path(day))
+                rows = [
+                    {field: ("" if pd.isna(row.get(field)) else str(row.get(field))) for field in self.FIELDS}
+                    for row in df.to_dict('records')
+                ]
+                self._write_rows(journal, rows)
+                logger.info(f"Строки из {self.xlsx_path(day)} перенесены в журнал {journal}")
+        except Exception as e:
+            logger.error(f"Ошибка чтения журнала строк {journal}: {e}")
+        self._rows = rows
+        self._day = day
+
+    def _write_rows(self, journal: Path, rows: List[dict]):
+        is_new = not journal.exists()
+        with journal.open('a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            if is_new:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def _ensure_day(self):
+        day = datetime.now().strftime('%Y-%m-%d')
+        if self._day != day:
+            self._load_day(day)
+
+    def texts(self) -> List[str]:
         """
-        Проверяет, является ли текст дубликатом среди compare_texts.
+        Тексты строк за сегодня.
         """
         with self._lock:
-            for prev_text in compare_texts:
-                if not prev_text or not text:
-                    continue
-                similarity = SequenceMatcher(None, text.lower(), prev_text.lower()).ratio()
-                if similarity > self.similarity_threshold:
-                    return True
-        return False
+            self._ensure_day()
+            return [row['Text'] for row in self._rows]
 
-    def add_text(self, text: str):
+    def append(self, channel: str, text: str, image_path: str):
+        """
+        Добавляет строку в память и дописывает ее в журнал.
+        """
+        row = {
+            'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'Channel': channel,
+            'Text': text,
+            'ImagePath': image_path,
+        }
+        with self._lock:
+            self._ensure_day()
+            self._write_rows(self.journal_path(self._day), [row])
+            self._rows.append(row)
+
+    def export_xlsx(self, day: Optional[str] = None) -> Optional[Path]:
         """
-        Добавляет текст в историю для последующей проверки.
+        Строит Excel-файл за день из журнала.
+
+        Returns:
+            Путь к .xlsx или None, если строк за день нет
         """
         with self._lock:
-            self.previous_texts.append(text)
+            self._ensure_day()
+            if day is None or day == self._day:
+                day = self._day
+                rows = list(self._rows)
+            else:
+                journal = self.journal_path(day)
+                rows = []
+                if journal.exists():
+                    with journal.open('r', encoding='utf-8', newline='') as f:
+                        rows = list(csv.DictReader(f))
+        if not rows:
+            return None
+        path = self.xlsx_path(day)
+        try:
+            pd.DataFrame(rows, columns=self.FIELDS).to_excel(path, index=False)
+            logger.info(f"Ежедневный файл сформирован: {path} ({len(rows)} строк)")
+            return path
+        except Exception as e:
+            logger.error(f"Ошибка формирования {path}: {e}")
+            return None
+
+
+# Глобальное хранилище строк за день
+daily_text_store = DailyTextStore()
 
 def load_keywords() -> List[str]:
     """
@@ -83,13 +205,13 @@ def preprocess_image(image_path: str) -> np.ndarray:
 
 def recognize_text(image_path: str) -> str:
     """
-    Распознавание текста на изображении с помощью pytesseract.
+    Распознавание текста на изображении общим движком OCR (ocr_engine).
     """
     try:
         img = preprocess_image(image_path)
         if img is None:
             return ""
-        text = pytesseract.image_to_string(img, lang='rus+eng')
+        text = ocr_recognize_text(img, channel=Path(image_path).parent.name)
         return text.strip()
     except Exception as e:
         logger.error(f"Ошибка распознавания текста в {image_path}: {e}")
@@ -222,9 +344,10 @@ def is_readable_text(text: str, image_path: str) -> bool:
     logger.info("Используется локальная проверка читаемости текста")
     return is_readable_text_local(text)
 
-def process_file(image_path: str, keywords: List[str], duplicate_checker: TextDuplicateChecker, daily_file_path: str) -> Tuple[Optional[str], Optional[str]]:
+def process_file(image_path: str, duplicate_checker: TextDuplicateChecker) -> Tuple[Optional[str], Optional[str]]:
     """
     Обрабатывает файл: распознаёт текст, фильтрует по ключевым словам и дубликатам.
+    Тексты за день должны быть загружены в duplicate_checker заранее (process_screenshots).
     """
     text = recognize_text(image_path)
     if not text:
@@ -233,50 +356,34 @@ def process_file(image_path: str, keywords: List[str], duplicate_checker: TextDu
     if not is_readable_text(text, image_path):
         return None, None
 
-    daily_texts = []
-    if os.path.exists(daily_file_path):
-        try:
-            df = pd.read_excel(daily_file_path)
-            daily_texts = df['Text'].tolist()
-        except Exception as e:
-            logger.error(f"Ошибка чтения {daily_file_path}: {e}")
-
-    if duplicate_checker.is_duplicate(text, daily_texts + duplicate_checker.previous_texts):
+    if duplicate_checker.is_duplicate(text):
         return None, None
 
-    if any(keyword.lower() in text.lower() for keyword in keywords):
+    if get_keyword_matcher().contains_any(text):
         duplicate_checker.add_text(text)
         return text, image_path
     return None, None
 
-def save_to_daily_file(channel: str, text: str, image_path: str, daily_file_path: str):
+def save_to_daily_file(channel: str, text: str, image_path: str):
     """
-    Сохраняет строку в ежедневный файл.
+    Сохраняет строку в хранилище строк за день (дописывается в журнал) и в базу событий.
     """
     try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        data = {'Timestamp': timestamp, 'Channel': channel, 'Text': text, 'ImagePath': image_path}
-        
-        if os.path.exists(daily_file_path):
-            df = pd.read_excel(daily_file_path)
-            df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
-        else:
-            df = pd.DataFrame([data])
-        
-        df.to_excel(daily_file_path, index=False)
-        logger.info(f"Сохранено в {daily_file_path}: {text}")
+        daily_text_store.append(channel, text, image_path)
+        event_store.record_text(channel, text, source=image_path, hits=get_keyword_matcher().find_matches(text))
+        logger.info(f"Сохранено в {daily_text_store.journal_path()}: {text}")
     except Exception as e:
-        logger.error(f"Ошибка сохранения в {daily_file_path}: {e}")
+        logger.error(f"Ошибка сохранения строки в журнал за день: {e}")
 
-def process_screenshots(screenshots_dir: str, processed_dir: str, daily_file_path: str):
+def process_screenshots(screenshots_dir: str, processed_dir: str):
     """
     Обрабатывает скриншоты: распознаёт текст, фильтрует, сохраняет и отправляет.
     """
-    keywords = load_keywords()
     duplicate_checker = TextDuplicateChecker()
+    # Тексты за день загружаются в индекс дубликатов один раз
+    duplicate_checker.index.add_many(daily_text_store.texts())
     screenshots_dir = Path(screenshots_dir)
     processed_dir = Path(processed_dir)
-    daily_file_path = Path(daily_file_path)
     
     # Проверка существования директории screenshots
     if not screenshots_dir.exists():
@@ -295,14 +402,6 @@ def process_screenshots(screenshots_dir: str, processed_dir: str, daily_file_pat
         logger.error(f"Ошибка при создании директории processed_dir: {e}")
         return
     
-    # Создание родительской директории для daily_file_path если она не существует
-    try:
-        daily_file_path.parent.mkdir(parents=True, exist_ok=True)
-        logger.info(f"Родительская директория для daily_file_path создана/проверена: {daily_file_path.parent}")
-    except Exception as e:
-        logger.error(f"Ошибка при создании родительской директории для daily_file_path: {e}")
-        return
-    
     for channel_dir in screenshots_dir.iterdir():
         if not channel_dir.is_dir():
             continue
@@ -318,12 +417,12 @@ def process_screenshots(screenshots_dir: str, processed_dir: str, daily_file_pat
         for image_file in channel_dir.iterdir():
             if not image_file.suffix.lower() in ['.png', '.jpg', '.jpeg']:
                 continue
-            text, valid_image_path = process_file(str(image_file), keywords, duplicate_checker, str(daily_file_path))
+            text, valid_image_path = process_file(str(image_file), duplicate_checker)
             if text and valid_image_path:
                 new_path = processed_channel_dir / image_file.name
                 try:
                     image_file.rename(new_path)
-                    save_to_daily_file(channel_dir.name, text, str(new_path), str(daily_file_path))
+                    save_to_daily_file(channel_dir.name, text, str(new_path))
                 except Exception as e:
                     logger.error(f"Ошибка при перемещении файла {image_file}: {e}")
             else:
@@ -333,23 +432,21 @@ def process_screenshots(screenshots_dir: str, processed_dir: str, daily_file_pat
                 except Exception as e:
                     logger.error(f"Ошибка удаления {image_file}: {e}")
 
-def get_daily_file_path():
+def get_daily_file_path() -> Path:
     """
-    Возвращает путь к ежедневному файлу.
+    Возвращает путь к ежедневному Excel-файлу.
     """
-    file_path = Path(f"daily_lines_{datetime.now().strftime('%Y-%m-%d')}.xlsx")
-    previous_texts = []
-    if file_path.exists():
-        try:
-            df = pd.read_excel(file_path)
-            if 'Text' in df.columns:
-                previous_texts = df['Text'].astype(str).tolist()
-        except Exception as e:
-            logger.error(f"Ошибка чтения {file_path}: {e}")
-    return file_path, previous_texts
+    return daily_text_store.xlsx_path()
+
+def export_daily_file() -> Optional[Path]:
+    """
+    Формирует ежедневный Excel-файл из журнала строк и возвращает путь к нему
+    (None, если строк за день нет).
+    """
+    return daily_text_store.export_xlsx()
 
 if __name__ == "__main__":
     screenshots_dir = "screenshots"
     processed_dir = "screenshots_processed"
-    daily_file_path, previous_texts = get_daily_file_path()
-    process_screenshots(screenshots_dir, processed_dir, daily_file_path)
\ No newline at end of file
+    process_screenshots(screenshots_dir, processed_dir)
+    export_daily_file()
@@ -19,17 +19,27 @@ from typing import List
 import numpy as np
 import re
 import pytesseract
-from difflib import SequenceMatcher
 import requests
 from glob import glob
 import psutil
+import queue
+import multiprocessing
 
 from UI import MonitoringUI
 from rbk_mir24_parser import VIDEO_DURATION, RBKMIR24Manager
 from utils import setup_logging
-from lines_to_csv import process_screenshots, get_daily_file_path
-from telegram_sender import send_files, send_report_files
+from lines_to_csv import process_screenshots, export_daily_file
+from telegram_sender import send_files, send_report_files, delivery_service
 from config_manager import config_manager
+from stream_capture import stream_multiplexer
+from video_recorder import video_recorder, read_deferred_crop, crop_clip, crop_sidecar_path
+from preroll_buffer import preroll_buffer
+from parser_lines import set_frame_queue
+from ocr_engine import recognize_text, OCRExecutor, ocr_cache
+from frame_sampler import FrameSampler
+from keyword_matcher import get_keyword_matcher
+from text_index import NearDuplicateIndex
+from event_store import event_store
 
 # Инициализация логирования
 logger = setup_logging()
@@ -69,7 +79,16 @@ class MonitoringApp:
             daemon=True
         )
         self.thread.start()
+        # База событий: распознанные строки, найденные ключевые слова и отправки.
+        # Путь задается до запуска отправки — она восстанавливает очередь из базы
+        event_store.configure(config_manager.load_config().get('event_store_path', 'events.db'))
+        # Отправка в Telegram: один постоянный клиент и очередь на цикле событий приложения
+        delivery_service.start(self.loop)
         self.ui = MonitoringUI(self)
+        # Окончательно неудачные отправки из очереди показываются в строке состояния, не блокируя отправку
+        delivery_service.on_outbox_failed = lambda item, attempts, error: self.ui.root.after(
+            0, self.ui.update_status, f"{item} не удалось отправить в Telegram после {attempts} попыток: {error}"
+        )
         
         # Инициализируем менеджер RBK и MIR24
         self.rbk_mir24_manager = RBKMIR24Manager(self, self.ui)
@@ -89,10 +108,100 @@ class MonitoringApp:
         self._start_hf_cache_cleaner_thread()
         self._start_temp_files_cleaner_thread()
 
+        # Потоковый режим строк: кадры идут из parser_lines в OCR через очередь в памяти
+        app_config = config_manager.load_config()
+        # Пул процессов OCR для пакетной обработки скриншотов и crop-видео
+        self.ocr_executor = OCRExecutor(
+            workers=app_config.get('ocr_workers'),
+            batch_size=app_config.get('ocr_batch_size', 1)
+        )
+        # Кэш результатов OCR по перцептивному хешу кадра
+        ocr_cache.configure(
+            max_size=app_config.get('ocr_cache_size', 2048),
+            ttl=app_config.get('ocr_cache_ttl', 600),
+            channel_ttl=app_config.get('ocr_cache_channel_ttl', {})
+        )
+        self._import_legacy_delivery_lists()
+        # Кольцевые буферы каналов: ролики вокруг найденных ключевых слов
+        if app_config.get('preroll_channels'):
+            self._start_preroll_buffers(app_config)
+        self.lines_streaming_mode = bool(app_config.get('lines_streaming_mode', False))
+        self.lines_frame_queue = None
+        # Индекс отправленных за день текстов (для поиска дубликатов)
+        self._sent_texts_index = None
+        self._sent_texts_day = None
+        self._sent_texts_lock = threading.Lock()
+        if self.lines_streaming_mode:
+            self.lines_frame_queue = queue.Queue(maxsize=int(app_config.get('lines_queue_size', 64)))
+            set_frame_queue(self.lines_frame_queue)
+            self._start_lines_stream_consumer_thread()
+        # Распознавание crop-видео во время записи: кадры выборки идут в OCR, не дожидаясь конца записи
+        self.recording_frame_queue = None
+        if app_config.get('video_live_ocr', True):
+            self.recording_frame_queue = queue.Queue(maxsize=int(app_config.get('video_live_queue_size', 32)))
+            video_recorder.set_frame_queue(self.recording_frame_queue, app_config.get('video_ocr_interval', 2.0))
+            self._start_recording_frame_consumer_thread()
+
         # В функции, где используется pytesseract:
         pytesseract.pytesseract.tesseract_cmd = get_resource_path("tesseract.exe")
         pytesseract.pytesseract.tessdata_dir_config = f'--tessdata-dir "{get_resource_path("tessdata")}"'
 
+    def _start_preroll_buffers(self, app_config):
+        """
+        Запускает кольцевые буферы сегментов для каналов из preroll_channels.
+        """
+        channels = config_manager.load_channels()
+        urls = {}
+        for channel_name in app_config.get('preroll_channels', []):
+            info = channels.get(channel_name)
+            if not info or not info.get('url'):
+                logger.warning(f"Канал {channel_name} из preroll_channels отсутствует в channels.json")
+                continue
+            urls[channel_name] = info['url']
+        preroll_buffer.configure(
+            urls,
+            root=app_config.get('preroll_dir', 'preroll'),
+            segment_seconds=app_config.get('preroll_segment_seconds', 6),
+            buffer_seconds=app_config.get('preroll_buffer_seconds', 300),
+            pre_seconds=app_config.get('preroll_seconds', 30),
+            post_seconds=app_config.get('postroll_seconds', 30)
+        )
+
+    def _export_keyword_clip(self, channel, captured_at, recognized_text):
+        """
+        Выгружает из кольцевого буфера ролик вокруг кадра с ключевым словом
+        и ставит его (с crop канала) в очередь отправки.
+        """
+        if not preroll_buffer.is_enabled(channel):
+            return
+        if isinstance(captured_at, str):
+            try:
+                captured_at = datetime.strptime(captured_at, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                logger.warning(f"Не удалось определить время кадра {channel} для выгрузки ролика")
+                return
+        future = preroll_buffer.export(channel, captured_at)
+        if future is None:
+            return
+        caption = f"Канал: {channel}\n{captured_at.strftime('%Y-%m-%d %H:%M:%S')}\n{recognized_text}".strip()
+
+        def queue_clip(done):
+            try:
+                clip_path = done.result()
+                if not clip_path:
+                    return
+                crop_params = (config_manager.get_channel_info(channel) or {}).get('crop')
+                if crop_params:
+                    cropped = crop_clip(clip_path, crop_params, Path(clip_path).with_name(f"{Path(clip_path).stem}_crop.mp4"))
+                    if cropped:
+                        Path(clip_path).unlink(missing_ok=True)
+                        clip_path = cropped
+                delivery_service.send_later('video', clip_path, caption=caption, channel=channel)
+            except Exception as e:
+                logger.error(f"Ошибка постановки ролика {channel} из буфера в очередь отправки: {e}")
+
+        future.add_done_callback(queue_clip)
+
     def start_status_server(self):
         """
         Запускает HTTP-сервер для получения статусов от дочерних процессов.
@@ -150,26 +259,26 @@ class MonitoringApp:
             self.ui.update_status("Ошибка обработки")
             messagebox.showerror("Ошибка", f"Не удалось запустить обработку скриншотов: {e}")
 
-    def fuzzy_keyword_match(self, text, keywords, threshold=0.8):
+    def fuzzy_keyword_match(self, text, threshold=0.8):
         """
         Проверяет, есть ли в тексте слова, похожие на ключевые (fuzzy matching).
 
         Args:
             text (str): Текст для поиска.
-            keywords (Iterable[str]): Список ключевых слов.
             threshold (float): Порог схожести для SequenceMatcher.
         Returns:
             bool: True, если найдено похожее слово, иначе False.
         """
-        text = text.lower()
-        for kw in keywords:
-            if kw in text:
-                return True
-            # Проверяем каждое слово в тексте
-            for word in text.split():
-                if SequenceMatcher(None, kw, word).ratio() >= threshold:
-                    return True
-        return False
+        return self._match_keyword(text, threshold) is not None
+
+    def _match_keyword(self, text, threshold=0.8):
+        """
+        Возвращает первое найденное ключевое слово {'keyword', 'path', 'token'} или None.
+        """
+        match = get_keyword_matcher().find_first(text, threshold)
+        if match:
+            logger.debug(f"Найдено ключевое слово '{match['keyword']}' ({match['path']}: '{match['token']}')")
+        return match
 
     def _save_and_send_lines_task(self):
         """
@@ -182,6 +291,9 @@ class MonitoringApp:
             processed_dir.mkdir(exist_ok=True)
 
             if not screenshots_dir.exists() or not any(screenshots_dir.rglob("*.*")):
+                if self.lines_streaming_mode:
+                    logger.info("Потоковый режим: кадры обрабатываются по мере захвата, папка 'screenshots' пуста.")
+                    return
                 logger.warning("Папка 'screenshots' пуста или не существует.")
                 self.ui.root.after(0, messagebox.showinfo, summary_title, "Папка 'screenshots' пуста. Нет файлов для обработки.")
                 self.ui.root.after(0, self.ui.update_processing_status, "Ожидание")
@@ -191,45 +303,38 @@ class MonitoringApp:
             self.ui.root.after(0, self.ui.show_progress)
             files_with_keywords = []
             file_captions = {}
+            file_channels = {}
             all_files = list(screenshots_dir.rglob("*.[jp][pn]g")) 
             logger.info(f"Найдено {len(all_files)} скриншотов для обработки.")
-            keywords = self._load_keywords()
-            today_str = datetime.now().strftime('%Y%m%d')
-            sent_texts_file = Path(f'sent_texts_{today_str}.txt')
-            sent_texts = []
-            if sent_texts_file.exists():
-                with sent_texts_file.open('r', encoding='utf-8') as f:
-                    sent_texts = [line.strip() for line in f if line.strip()]
-            session_texts = []  # Для хранения текстов в рамках одной обработки
+            sent_texts_index = self._get_sent_texts_index()
             total_files = len(all_files)
-            for i, file_path in enumerate(all_files):
-                recognized_text = self._extract_text_from_image(file_path)
+            # Распознавание в пуле процессов; результаты собираются по каналам в порядке времени
+            jobs = (
+                {
+                    'channel': file_path.parent.name,
+                    'timestamp': (self._parse_screenshot_timestamp(file_path), file_path.name),
+                    'file_path': file_path,
+                    'image': str(file_path),
+                }
+                for file_path in all_files
+            )
+            recognized = self.ocr_executor.recognize_many(
+                jobs,
+                on_progress=lambda done: self.ui.root.after(0, self.ui.update_progress, done / total_files * 100)
+            )
+            recognized_jobs = [job for channel_jobs in recognized.values() for job in channel_jobs]
+            for job in recognized_jobs:
+                file_path = job['file_path']
+                channel = job['channel']
+                timestamp = job['timestamp'][0]
+                recognized_text = job['text']
                 text_lower = recognized_text.lower()
-                has_keyword = False
                 # --- Fuzzy matching вместо Hugging Face ---
-                if self.fuzzy_keyword_match(text_lower, keywords):
-                    has_keyword = True
-                is_duplicate = False
-                for prev_text in sent_texts + session_texts:
-                    similarity = SequenceMatcher(None, text_lower, prev_text).ratio()
-                    if similarity > 0.8:
-                        is_duplicate = True
-                        break
-                channel = ""
-                timestamp = ""
-                try:
-                    channel = file_path.parent.name
-                except Exception:
-                    channel = ""
-                try:
-                    date_pattern = r'(\d{8})_(\d{6})'
-                    match = re.search(date_pattern, file_path.name)
-                    if match:
-                        date_str = match.group(1)
-                        time_str = match.group(2)
-                        timestamp = datetime.strptime(f"{date_str}_{time_str}", "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    timestamp = ""
+                match = self._match_keyword(text_lower)
+                has_keyword = match is not None
+                event_store.record_text(channel, recognized_text, captured_at=timestamp or None,
+                                        source=str(file_path), hits=[match] if match else [])
+                is_duplicate = has_keyword and sent_texts_index.is_duplicate(text_lower)
                 if has_keyword and not is_duplicate:
                     try:
                         new_path = processed_dir / file_path.name
@@ -237,7 +342,10 @@ class MonitoringApp:
                         files_with_keywords.append(new_path)
                         caption = f"{channel}\n{timestamp}\n{recognized_text}".strip()
                         file_captions[str(new_path)] = caption
-                        session_texts.append(text_lower)
+                        file_channels[str(new_path)] = channel
+                        # Текст сразу попадает в индекс и файл за день, чтобы следующие кадры считались дубликатами
+                        self._remember_sent_text(text_lower, channel, new_path.name)
+                        self._export_keyword_clip(channel, timestamp, recognized_text)
                         logger.info(f"Файл {file_path.name} перемещен в {processed_dir}")
                     except Exception as e:
                         logger.error(f"Не удалось переместить файл {file_path.name}: {e}")
@@ -247,36 +355,26 @@ class MonitoringApp:
                         logger.info(f"Файл {file_path.name} удален (нет ключевых слов или дубликат).")
                     except Exception as e:
                         logger.error(f"Не удалось удалить файл {file_path.name}: {e}")
-                # --- Обновление прогресса ---
-                percent = ((i + 1) / total_files) * 100 if total_files else 100
-                self.ui.root.after(0, self.ui.update_progress, percent)
-            # После отправки файлов — добавляем тексты в файл за день
-            if files_with_keywords:
-                with sent_texts_file.open('a', encoding='utf-8') as f:
-                    for file_path in files_with_keywords:
-                        text = self._extract_text_from_image(file_path).lower()
-                        f.write(text + '\n')
+            self._log_ocr_cache_stats()
             self.ui.root.after(0, self.ui.hide_progress)
             if not files_with_keywords:
                 self.ui.root.after(0, messagebox.showinfo, summary_title, "Обработка завершена. Файлов с ключевыми словами не найдено.")
                 self.ui.root.after(0, self.ui.update_processing_status, "Ожидание")
                 return
-            self.ui.root.after(0, self.ui.update_processing_status, f"Отправка {len(files_with_keywords)} файлов в Telegram...")
-            sent_count = 0
+            self.ui.root.after(0, self.ui.update_processing_status, f"Постановка {len(files_with_keywords)} файлов в очередь отправки...")
+            queued_count = 0
+            # Скриншоты уходят через очередь отправки: медиагруппами, с повторами и после перезапуска
             for file_path in files_with_keywords:
-                caption = file_captions.get(str(file_path), f"{file_path.name}")
-                if send_files([str(file_path)], caption=caption):
-                    sent_count += 1
-                    try:
-                        file_path.unlink() 
-                        logger.info(f"Файл {file_path.name} отправлен и удален.")
-                    except Exception as e:
-                        logger.error(f"Не удалось удалить файл {file_path.name} после отправки: {e}")
-                else:
-                    logger.warning(f"Не удалось отправить файл {file_path.name}")
-            summary_message = f"Обработка завершена.\n\nНайдено файлов с ключевыми словами: {len(files_with_keywords)}\nУспешно отправлено: {sent_count}"
-            if sent_count < len(files_with_keywords):
-                summary_message += "\n\nНекоторые файлы не удалось отправить. Подробности в логах."
+                try:
+                    if delivery_service.send_later('screenshot', file_path,
+                                                   caption=file_captions.get(str(file_path), f"{file_path.name}"),
+                                                   channel=file_channels.get(str(file_path))):
+                        queued_count += 1
+                except Exception as e:
+                    logger.error(f"Не удалось поставить файл {file_path.name} в очередь отправки: {e}")
+            summary_message = f"Обработка завершена.\n\nНайдено файлов с ключевыми словами: {len(files_with_keywords)}\nПоставлено в очередь отправки: {queued_count}"
+            if queued_count < len(files_with_keywords):
+                summary_message += "\n\nНекоторые файлы не удалось поставить в очередь. Подробности в логах."
             self.ui.root.after(0, messagebox.showinfo, summary_title, summary_message)
         except Exception as e:
             logger.error(f"Ошибка в задаче обработки скриншотов: {e}")
@@ -285,6 +383,174 @@ class MonitoringApp:
             self.ui.root.after(0, self.ui.update_processing_status, "Ожидание")
             self.ui.root.after(0, self.ui.hide_progress)
 
+    def _start_lines_stream_consumer_thread(self):
+        """
+        Запускает поток, распознающий кадры из очереди потокового режима.
+        """
+        def consumer():
+            while True:
+                try:
+                    channel, captured_at, frame = self.lines_frame_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                try:
+                    self._process_stream_frame(channel, captured_at, frame)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки кадра {channel} из очереди: {e}")
+                finally:
+                    self.lines_frame_queue.task_done()
+        threading.Thread(target=consumer, name="lines_stream_consumer", daemon=True).start()
+        logger.info("Запущен обработчик очереди кадров (потоковый режим строк)")
+
+    def _start_recording_frame_consumer_thread(self):
+        """
+        Запускает поток, распознающий кадры crop-видео во время записи.
+        """
+        def consumer():
+            while True:
+                try:
+                    job, frame_idx, timestamp_sec, frame = self.recording_frame_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                try:
+                    self._process_recording_frame(job, frame_idx, timestamp_sec, frame)
+                except Exception as e:
+                    logger.error(f"Ошибка распознавания кадра записи {job.channel_name}: {e}")
+                finally:
+                    job.frame_done()
+                    self.recording_frame_queue.task_done()
+        threading.Thread(target=consumer, name="recording_frame_consumer", daemon=True).start()
+        logger.info("Запущен обработчик кадров записи (распознавание во время записи)")
+
+    def _process_recording_frame(self, job, frame_idx, timestamp_sec, frame):
+        """
+        Распознает кадр записываемого crop-видео, дописывает текст в базу событий
+        и при найденном ключевом слове отмечает запись, не дожидаясь ее завершения.
+        Первое срабатывание каждого ключевого слова в записи сразу ставит кадр
+        в очередь отправки.
+        """
+        channel = job.channel_name
+        recognized = self.ocr_executor.recognize_many([{
+            'channel': channel,
+            'timestamp': frame_idx,
+            'image': frame,
+        }])
+        line_text = recognized[channel][0]['text'].replace('\n', ' ').strip()
+        if not line_text:
+            return
+        event_store.record_video_texts(channel, job.output_path.name, [(frame_idx, int(timestamp_sec), line_text)], replace=False)
+        match = self._match_keyword(line_text.lower())
+        if match is None:
+            return
+        event_store.record_text(channel, line_text, source=str(job.output_path), hits=[match])
+        logger.info(f"Ключевое слово '{match['keyword']}' в записи {job.output_path.name} на {int(timestamp_sec)} с")
+        first_hit = match['keyword'] not in job.keywords
+        job.mark_interesting(match['keyword'])
+        if first_hit:
+            # Оповещение сразу, не дожидаясь конца записи: одно на ключевое слово записи
+            self._send_keyword_frame(channel, datetime.now(), frame, line_text)
+
+    def _get_sent_texts_index(self):
+        """
+        Возвращает индекс текстов, отправленных за сегодня
+        (загружается из базы событий при запуске и смене дня).
+        """
+        today = datetime.now()
+        today_str = today.strftime('%Y%m%d')
+        with self._sent_texts_lock:
+            if self._sent_texts_day != today_str:
+                index = NearDuplicateIndex(threshold=0.8)
+                sent_texts = event_store.delivered_texts(today.strftime('%Y-%m-%d'))
+                sent_texts_file = Path(f'sent_texts_{today_str}.txt')
+                if not sent_texts and sent_texts_file.exists():
+                    # Файл прежней версии: переносим тексты в базу
+                    with sent_texts_file.open('r', encoding='utf-8') as f:
+                        sent_texts = [line.strip() for line in f if line.strip()]
+                    for text in sent_texts:
+                        event_store.record_delivery('screenshot', sent_texts_file.name, 'accepted', text=text)
+                index.add_many(sent_texts)
+                self._sent_texts_index = index
+                self._sent_texts_day = today_str
+            return self._sent_texts_index
+
+    def _remember_sent_text(self, text_lower, channel=None, file_name=None):
+        """
+        Добавляет текст в индекс дубликатов и записывает в базу событий как принятый к отправке.
+        """
+        index = self._get_sent_texts_index()
+        index.add(text_lower)
+        event_store.record_delivery('screenshot', file_name or '', 'accepted', channel=channel,
+                                    text=text_lower.replace('\n', ' '))
+
+    def _import_legacy_delivery_lists(self):
+        """
+        Переносит списки sent_videos.txt и failed_videos.txt прежней версии в базу событий.
+        """
+        for file_name, status in (('sent_videos.txt', 'sent'), ('failed_videos.txt', 'failed')):
+            legacy_file = Path(file_name)
+            if not legacy_file.exists():
+                continue
+            try:
+                with legacy_file.open('r', encoding='utf-8') as f:
+                    event_store.import_delivered_items('video', status, (line.strip() for line in f if line.strip()))
+                legacy_file.rename(legacy_file.with_suffix('.txt.imported'))
+                logger.info(f"Список {file_name} перенесен в базу событий")
+            except Exception as e:
+                logger.error(f"Не удалось перенести {file_name} в базу событий: {e}")
+
+    def _process_stream_frame(self, channel, captured_at, frame):
+        """
+        Распознает кадр из очереди. Кадр сохраняется на диск и отправляется
+        в Telegram только если в нем найдены ключевые слова и текст не дубликат.
+        """
+        recognized_text = self._extract_text_from_frame(frame, channel)
+        text_lower = recognized_text.lower()
+        if not text_lower.strip():
+            return
+        match = self._match_keyword(text_lower)
+        event_store.record_text(channel, recognized_text, captured_at=captured_at, source='stream',
+                                hits=[match] if match else [])
+        if match is None:
+            return
+        self._send_keyword_frame(channel, captured_at, frame, recognized_text)
+
+    def _send_keyword_frame(self, channel, captured_at, frame, recognized_text):
+        """
+        Сохраняет кадр с ключевым словом и ставит его в очередь отправки
+        (вместе с роликом из кольцевого буфера, если он ведется для канала).
+        Кадры с текстом, дублирующим отправленный, пропускаются.
+        """
+        text_lower = recognized_text.lower()
+        if self._get_sent_texts_index().is_duplicate(text_lower):
+            logger.info(f"Кадр {channel} пропущен: дубликат отправленного текста")
+            return
+        processed_dir = Path("screenshots_processed")
+        processed_dir.mkdir(exist_ok=True)
+        file_path = processed_dir / f"{channel}_{captured_at.strftime('%Y%m%d_%H%M%S')}.jpg"
+        if not cv2.imwrite(str(file_path), frame, [cv2.IMWRITE_JPEG_QUALITY, 95]):
+            logger.error(f"Не удалось сохранить кадр {file_path}")
+            return
+        self._remember_sent_text(text_lower, channel, file_path.name)
+        self._export_keyword_clip(channel, captured_at, recognized_text)
+        caption = f"{channel}\n{captured_at.strftime('%Y-%m-%d %H:%M:%S')}\n{recognized_text}".strip()
+        try:
+            delivery_service.send_later('screenshot', file_path, caption=caption, channel=channel)
+        except Exception as e:
+            logger.error(f"Не удалось поставить кадр {file_path.name} в очередь отправки: {e}")
+
+    def _parse_screenshot_timestamp(self, file_path):
+        """
+        Извлекает время захвата из имени скриншота (<канал>_YYYYMMDD_HHMMSS.jpg).
+        Возвращает строку 'YYYY-MM-DD HH:MM:SS' или пустую строку.
+        """
+        try:
+            match = re.search(r'(\d{8})_(\d{6})', file_path.name)
+            if match:
+                return datetime.strptime(f"{match.group(1)}_{match.group(2)}", "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            pass
+        return ""
+
     def _process_and_send_screenshots(self):
         """
         Обработка и отправка скриншотов.
@@ -307,14 +573,15 @@ class MonitoringApp:
         Отправка ежедневного файла в Telegram.
         """
         try:
-            file_path = get_daily_file_path()
-            if os.path.exists(file_path):
+            # Excel-файл строится из журнала строк за день только для отчета
+            file_path = export_daily_file()
+            if file_path and os.path.exists(file_path):
                 logger.info(f"Отправка ежедневного файла в Telegram: {file_path}")
                 self.ui.update_status("Отправка ежедневного файла в Telegram...")
                 
                 # Отправляем файл
                 from telegram_sender import send_report_files
-                send_report_files(file_path, [])
+                send_report_files(str(file_path), [])
                 
                 self.ui.update_status("Ежедневный файл отправлен в Telegram")
                 logger.info("Ежедневный файл успешно отправлен в Telegram")
@@ -328,10 +595,15 @@ class MonitoringApp:
     def _send_daily_sent_texts_to_telegram(self):
         """
         Отправка файла с текстами отправленных скриншотов за день в Telegram.
+        Файл sent_texts_YYYYMMDD.txt строится из базы событий.
         """
         try:
-            today_str = datetime.now().strftime('%Y%m%d')
-            sent_texts_file = Path(f'sent_texts_{today_str}.txt')
+            today = datetime.now()
+            sent_texts_file = Path(f"sent_texts_{today.strftime('%Y%m%d')}.txt")
+            sent_texts = event_store.delivered_texts(today.strftime('%Y-%m-%d'))
+            if sent_texts:
+                with sent_texts_file.open('w', encoding='utf-8') as f:
+                    f.writelines(text + '\n' for text in sent_texts)
             if sent_texts_file.exists():
                 logger.info(f"Отправка файла с текстами скриншотов за день в Telegram: {sent_texts_file}")
                 self.ui.update_status("Отправка файла с текстами скриншотов за день в Telegram...")
@@ -427,9 +699,9 @@ class MonitoringApp:
             logger.info("Начало распознавания текста из crop-видео")
             self.ui.root.after(0, self.ui.update_status, "Распознавание текста из crop-видео...")
             
-            # Обрабатываем crop-видео из папки lines_video
+            # Обрабатываем crop-видео из папки lines_video (только завершенные записи)
             logger.info("Обработка crop-видео из папки lines_video")
-            self._recognize_text_in_videos_to_channel_txt(lines_video_dir)
+            processed_videos = self._recognize_text_in_videos(lines_video_dir)
             
             logger.info("Распознавание завершено.")
             self.ui.root.after(0, self.ui.update_status, "Распознавание текста из crop-видео завершено.")
@@ -437,45 +709,43 @@ class MonitoringApp:
             # --- Этап 2: Поиск ключевых слов и отправка видео ---
             self.ui.root.after(0, self.ui.update_video_check_status, "Выполняется: Поиск ключевых слов...")
             logger.info("Поиск ключевых слов и их вариаций через Hugging Face API")
-            videos_to_send = self._get_videos_with_keywords_hf_channelwise()
+            videos_to_send = self._get_videos_with_keywords_hf_channelwise(processed_videos)
 
             if not videos_to_send:
                 self.ui.root.after(0, self.ui.update_status, "Crop-видео с ключевыми словами не найдены. Очистка...")
-                logger.info("Crop-видео с ключевыми словами не найдены. Все видеофайлы будут удалены.")
-                self._cleanup_video_files()
-                self._cleanup_recognized_texts_channelwise()
-                self.ui.root.after(0, messagebox.showinfo, summary_title, "Проверка завершена. Crop-видео с ключевыми словами не найдены. Все видеофайлы удалены.")
+                logger.info("Crop-видео с ключевыми словами не найдены. Проверенные видеофайлы будут удалены.")
+                self._cleanup_processed_videos(processed_videos)
+                self.ui.root.after(0, messagebox.showinfo, summary_title, "Проверка завершена. Crop-видео с ключевыми словами не найдены. Проверенные видеофайлы удалены.")
                 return
 
             logger.info(f"Найдено {len(videos_to_send)} crop-видео с ключевыми словами")
-            self.ui.root.after(0, self.ui.update_status, f"Отправка {len(videos_to_send)} crop-видео...")
+            self.ui.root.after(0, self.ui.update_status, f"Постановка {len(videos_to_send)} crop-видео в очередь отправки...")
 
-            sent_count = 0
+            queued_count = 0
             for video_info in videos_to_send:
                 try:
                     video_path = video_info['video_path']
                     channel_name = video_info['channel']
                     found_keywords = video_info['found_keywords']
                     if self._send_single_video_to_telegram(video_path, channel_name, found_keywords):
-                        sent_count += 1
-                        logger.info(f"Crop-видео {video_path.name} отправлено в Telegram")
+                        queued_count += 1
+                        logger.info(f"Crop-видео {video_path.name} поставлено в очередь отправки")
                         video_path.unlink(missing_ok=True)
-                        self._remove_video_text_from_channel_txt(video_path.name, channel_name)
+                        event_store.remove_video_texts(channel_name, video_path.name)
                     else:
-                        logger.error(f"Не удалось отправить crop-видео {video_path.name}")
+                        logger.error(f"Не удалось поставить crop-видео {video_path.name} в очередь отправки")
                 except Exception as e:
                     logger.error(f"Ошибка при отправке crop-видео {video_info.get('video_path', 'unknown')}: {e}")
 
-            self._cleanup_video_files()
-            self._cleanup_recognized_texts_channelwise()
+            self._cleanup_processed_videos(processed_videos)
 
-            final_status_msg = f"Отправлено {sent_count} из {len(videos_to_send)} crop-видео. Очистка завершена."
+            final_status_msg = f"В очередь отправки поставлено {queued_count} из {len(videos_to_send)} crop-видео. Очистка завершена."
             self.ui.root.after(0, self.ui.update_status, final_status_msg)
-            logger.info(f"Отправка завершена. Отправлено {sent_count} crop-видео, все файлы удалены")
+            logger.info(f"Проверка завершена. В очередь отправки поставлено {queued_count} crop-видео, остальные файлы удалены")
 
-            summary_message = f"Отправка завершена.\n\nНайдено crop-видео с ключевыми словами: {len(videos_to_send)}\nУспешно отправлено: {sent_count}"
-            if sent_count < len(videos_to_send):
-                summary_message += "\n\nНекоторые crop-видео не удалось отправить. Подробности смотрите в логах."
+            summary_message = f"Проверка завершена.\n\nНайдено crop-видео с ключевыми словами: {len(videos_to_send)}\nПоставлено в очередь отправки: {queued_count}"
+            if queued_count < len(videos_to_send):
+                summary_message += "\n\nНекоторые crop-видео не удалось поставить в очередь. Подробности смотрите в логах."
             self.ui.root.after(0, messagebox.showinfo, summary_title, summary_message)
 
         except Exception as e:
@@ -487,199 +757,138 @@ class MonitoringApp:
             self.video_recognition_running = False
             self.ui.root.after(0, self.ui.update_video_check_status, "Завершено")
 
-    def _recognize_text_in_videos_to_channel_txt(self, video_dir):
+    def _recognize_text_in_videos(self, video_dir):
         """
-        Распознаёт текст из всех crop-видеофайлов и сохраняет результаты в отдельные txt по каналам.
+        Распознаёт текст из crop-видеофайлов завершенных записей и сохраняет его в базу событий
+        (таблица video_texts: канал, видеофайл, номер кадра, секунда, текст).
+
+        Returns:
+            Множество (канал, имя файла) роликов, обработанных этим проходом
         """
-        recognized_dir = Path("recognized_text")
-        
-        # Создание директории recognized_text если она не существует
-        try:
-            recognized_dir.mkdir(exist_ok=True)
-            logger.info(f"Директория recognized_text создана/проверена: {recognized_dir}")
-        except Exception as e:
-            logger.error(f"Ошибка при создании директории recognized_text: {e}")
-            return
-        
+        processed = set()
         # Проверка существования и валидности video_dir
         if not video_dir.exists():
             logger.error(f"Директория video_dir не найдена: {video_dir}")
-            return
+            return processed
         
         if not video_dir.is_dir():
             logger.error(f"Путь video_dir не является директорией: {video_dir}")
-            return
+            return processed
         
-        channel_files = {}
-        for channel_dir in video_dir.iterdir():
-            if not channel_dir.is_dir():
-                continue
-            channel_name = channel_dir.name
-            txt_path = recognized_dir / f"{channel_name}.txt"
-            if channel_name not in channel_files:
-                try:
-                    channel_files[channel_name] = open(txt_path, 'w', encoding='utf-8')
-                except Exception as e:
-                    logger.error(f"Ошибка при создании файла {txt_path}: {e}")
-                    continue
-            txt_file = channel_files[channel_name]
-            for video_file in channel_dir.glob("*.mp4"):
-                try:
-                    cap = cv2.VideoCapture(str(video_file))
-                    if not cap.isOpened():
-                        logger.warning(f"Не удалось открыть видео {video_file}")
-                        continue
-                    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    step = int(fps * 2) if fps > 0 else 50  # Кадр каждые 2 секунды
-                    frame_idx = 0
-                    while True:
-                        ret, frame = cap.read()
-                        if not ret:
-                            break
-                        if frame_idx % step == 0:
-                            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            text = pytesseract.image_to_string(gray, lang='rus+eng')
-                            timestamp_sec = int(frame_idx / fps) if fps > 0 else frame_idx
-                            # Сохраняем: имя_файла\tномер_кадра\tсекунда\tтекст
-                            txt_file.write(f"{video_file.name}\t{frame_idx}\t{timestamp_sec}\t{text.replace('\n', ' ').strip()}\n")
-                        frame_idx += 1
-                    cap.release()
-                    logger.info(f"Распознан текст по кадрам для {video_file.name}")
-                except Exception as e:
-                    logger.error(f"Ошибка при распознавании текста в {video_file}: {e}")
-        for f in channel_files.values():
-            try:
-                f.close()
-            except Exception as e:
-                logger.error(f"Ошибка при закрытии файла: {e}")
+        channel_names = [channel_dir.name for channel_dir in video_dir.iterdir() if channel_dir.is_dir()]
 
-    def _get_videos_with_keywords_hf_channelwise(self):
+        app_config = config_manager.load_config()
+        sampler = FrameSampler(
+            policy=app_config.get('video_ocr_sampling', 'step'),
+            interval=app_config.get('video_ocr_interval', 2.0),
+            scene_threshold=app_config.get('video_ocr_scene_threshold', 0.05)
+        )
+
+        def sampled_frames():
+            # Декодирование идет в этом потоке, распознавание — в пуле OCR
+            for channel_name in channel_names:
+                for video_file in (video_dir / channel_name).glob("*.mp4"):
+                    # Ролики, которые еще записываются, проверяются следующим проходом
+                    if video_recorder.is_active(channel_name, video_file.name):
+                        logger.info(f"Crop-видео {video_file.name} еще записывается, пропускаем")
+                        continue
+                    processed.add((channel_name, video_file.name))
+                    # Ждем только кадры этой записи, опубликованные на распознавание
+                    if video_recorder.recognized_live(channel_name, video_file.name):
+                        logger.info(f"Кадры {video_file.name} распознаны во время записи, повторное распознавание не требуется")
+                        continue
+                    try:
+                        for frame_idx, timestamp_sec, gray in sampler.sample(video_file, read_deferred_crop(video_file)):
+                            yield {
+                                'channel': channel_name,
+                                'timestamp': (video_file.name, frame_idx),
+                                'timestamp_sec': int(timestamp_sec),
+                                'image': gray,
+                            }
+                        logger.info(f"Кадры {video_file.name} переданы на распознавание")
+                    except Exception as e:
+                        logger.error(f"Ошибка при распознавании текста в {video_file}: {e}")
+
+        started = time_module.perf_counter()
+        recognized = self.ocr_executor.recognize_many(sampled_frames())
+        elapsed = time_module.perf_counter() - started
+        stats = sampler.get_stats()
+        logger.info(
+            f"Выборка кадров '{stats['policy']}': прочитано {stats['frames_grabbed']}, "
+            f"декодировано {stats['frames_decoded']}, на OCR {stats['frames_sampled']}; "
+            f"декодирование {stats['decode_time']:.1f} с, OCR {max(0.0, elapsed - stats['decode_time']):.1f} с"
+        )
+        self._log_ocr_cache_stats()
+        for channel_name in channel_names:
+            # Задания канала упорядочены по (видеофайл, номер кадра)
+            video_rows = {}
+            for job in recognized.get(channel_name, []):
+                video_name, frame_idx = job['timestamp']
+                line_text = job['text'].replace('\n', ' ').strip()
+                video_rows.setdefault(video_name, []).append((frame_idx, job['timestamp_sec'], line_text))
+            for video_name, rows in video_rows.items():
+                event_store.record_video_texts(channel_name, video_name, rows)
+        return processed
+
+    def _get_videos_with_keywords_hf_channelwise(self, processed_videos=None):
         """
         Возвращает список crop-видео с найденными ключевыми словами (через Hugging Face).
+
+        Args:
+            processed_videos: Множество (канал, имя файла), которыми ограничивается поиск
+                (тексты роликов, которые еще записываются, не рассматриваются)
         """
-        recognized_dir = Path("recognized_text")
-        
-        # Проверка существования директории recognized_text
-        if not recognized_dir.exists():
-            logger.warning(f"Директория recognized_text не найдена: {recognized_dir}")
-            return []
-        
-        if not recognized_dir.is_dir():
-            logger.error(f"Путь recognized_text не является директорией: {recognized_dir}")
-            return []
-        
         keywords = list(self._load_keywords())
         videos_to_send = []
+        videos_found = {}
         
-        for txt_path in recognized_dir.glob("*.txt"):
-            channel_name = txt_path.stem
+        for channel_name, video_file, _, text in event_store.iter_video_texts():
+            if processed_videos is not None and (channel_name, video_file) not in processed_videos:
+                continue
             try:
-                with open(txt_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        try:
-                            video_file, text = line.strip().split('\t', 1)
-                            found_keywords = self._find_keywords_hf(text, keywords)
-                            if found_keywords:
-                                # Ищем видео только в lines_video (crop видео)
-                                video_path = Path("lines_video") / channel_name / video_file
-                                
-                                if video_path.exists():
-                                    videos_to_send.append({
-                                        'video_path': video_path,
-                                        'channel': channel_name,
-                                        'found_keywords': found_keywords
-                                    })
-                                else:
-                                    logger.warning(f"Crop-видео {video_file} не найдено в lines_video для канала {channel_name}")
-                        except Exception as e:
-                            logger.error(f"Ошибка при обработке строки recognized_text/{txt_path.name}: {e}")
+                found_keywords = self._find_keywords_hf(text, keywords)
+                if not found_keywords:
+                    continue
+                video_info = videos_found.get((channel_name, video_file))
+                if video_info is None:
+                    # Ищем видео только в lines_video (crop видео)
+                    video_path = Path("lines_video") / channel_name / video_file
+                    if not video_path.exists():
+                        logger.warning(f"Crop-видео {video_file} не найдено в lines_video для канала {channel_name}")
+                        continue
+                    video_info = videos_found[(channel_name, video_file)] = {
+                        'video_path': video_path,
+                        'channel': channel_name,
+                        'found_keywords': []
+                    }
+                    videos_to_send.append(video_info)
+                for keyword in found_keywords:
+                    if keyword not in video_info['found_keywords']:
+                        video_info['found_keywords'].append(keyword)
             except Exception as e:
-                logger.error(f"Ошибка при чтении файла {txt_path}: {e}")
+                logger.error(f"Ошибка при поиске ключевых слов в тексте {video_file} ({channel_name}): {e}")
         return videos_to_send
 
-    def _remove_video_text_from_channel_txt(self, video_file_name, channel_name):
-        """
-        Удаляет строку из recognized_text/<channel>.txt по имени видеофайла.
-        """
-        recognized_dir = Path("recognized_text")
-        
-        # Проверка существования директории recognized_text
-        if not recognized_dir.exists():
-            logger.warning(f"Директория recognized_text не найдена: {recognized_dir}")
-            return
-        
-        if not recognized_dir.is_dir():
-            logger.error(f"Путь recognized_text не является директорией: {recognized_dir}")
-            return
-        
-        txt_path = recognized_dir / f"{channel_name}.txt"
-        if not txt_path.exists():
-            logger.warning(f"Файл {txt_path} не найден")
-            return
-        
-        try:
-            lines = []
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                for line in lines:
-                    if not line.startswith(video_file_name + '\t'):
-                        f.write(line)
-            logger.info(f"Удалена строка для видео {video_file_name} из {txt_path}")
-        except Exception as e:
-            logger.error(f"Ошибка при удалении строки для видео {video_file_name} из {txt_path}: {e}")
-
-    def _cleanup_recognized_texts_channelwise(self):
-        """
-        Удаляет все recognized_text/<channel>.txt файлы.
-        """
-        recognized_dir = Path("recognized_text")
-        
-        # Проверка существования директории recognized_text
-        if not recognized_dir.exists():
-            logger.info(f"Директория recognized_text не существует, очистка не требуется: {recognized_dir}")
-            return
-        
-        if not recognized_dir.is_dir():
-            logger.error(f"Путь recognized_text не является директорией: {recognized_dir}")
-            return
-        
-        for txt_path in recognized_dir.glob("*.txt"):
-            try:
-                txt_path.unlink()
-                logger.info(f"Удален файл: {txt_path}")
-            except Exception as e:
-                logger.error(f"Ошибка при удалении файла {txt_path}: {e}")
-
-    def _cleanup_video_files(self):
+    def _cleanup_processed_videos(self, processed_videos):
         """
-        Удаляет все видеофайлы из папки lines_video.
+        Удаляет ролики, обработанные проходом проверки, вместе с файлами отложенного crop
+        и их текстами в базе событий. Записи, которые идут сейчас, не затрагиваются.
         """
-        lines_video_dir = Path("lines_video")
-        
-        # Проверка существования директории lines_video
-        if not lines_video_dir.exists():
-            logger.info(f"Директория lines_video не существует, очистка не требуется: {lines_video_dir}")
-            return
-        
-        if not lines_video_dir.is_dir():
-            logger.error(f"Путь lines_video не является директорией: {lines_video_dir}")
-            return
-        
         deleted_count = 0
-        for channel_dir in lines_video_dir.iterdir():
-            if not channel_dir.is_dir():
+        for channel_name, video_name in processed_videos:
+            if video_recorder.is_active(channel_name, video_name):
                 continue
-            for video_file in channel_dir.glob("*.mp4"):
+            video_path = Path("lines_video") / channel_name / video_name
+            for path in (video_path, crop_sidecar_path(video_path)):
                 try:
-                    video_file.unlink()
-                    deleted_count += 1
-                    logger.info(f"Удален видеофайл: {video_file}")
+                    if path.exists():
+                        path.unlink()
+                        deleted_count += 1
+                        logger.info(f"Удален видеофайл: {path}")
                 except Exception as e:
-                    logger.error(f"Ошибка при удалении видеофайла {video_file}: {e}")
-        
-        logger.info(f"Очистка видеофайлов завершена. Удалено файлов: {deleted_count}")
+                    logger.error(f"Ошибка при удалении видеофайла {path}: {e}")
+            event_store.remove_video_texts(channel_name, video_name)
+        logger.info(f"Очистка проверенных видеофайлов завершена. Удалено файлов: {deleted_count}")
 
     def cleanup(self):
         """
@@ -700,6 +909,9 @@ class MonitoringApp:
                 self.video_recognition_running = False
                 logger.info("Распознавание crop-видео остановлено")
             
+            # Дожидаемся отправки поставленных в очередь файлов
+            delivery_service.stop()
+            
             # Останавливаем event loop
             if self.loop and not self.loop.is_closed():
                 self.loop.call_soon_threadsafe(self.loop.stop)
@@ -709,6 +921,18 @@ class MonitoringApp:
             if hasattr(self, 'ui'):
                 self.ui.cleanup()
             
+            # Останавливаем записи (записанная часть роликов сохраняется) и закрываем сессии видеопотоков
+            video_recorder.stop_all()
+            preroll_buffer.stop_all()
+            stream_multiplexer.stop_all()
+            
+            # Останавливаем пул OCR
+            self.ocr_executor.shutdown()
+            self._log_ocr_cache_stats()
+
+            # Дописываем очередь событий в базу
+            event_store.close()
+            
             # Останавливаем HTTP-сервер
             if hasattr(self, 'httpd'):
                 logger.info("Остановка HTTP-сервера...")
@@ -774,13 +998,10 @@ class MonitoringApp:
             messagebox.showerror("Ошибка конфигурации", error_msg)
             return
         
-        channel_methods = {
-            "R1": self._start_r1_monitoring,
-            "Zvezda": self._start_zvezda_monitoring,
-            "TVC": self._start_other_channels_monitoring,
-            "RenTV": self._start_other_channels_monitoring,
-            "NTV": self._start_other_channels_monitoring,
-        }
+        # Запись crop-видео по расписанию можно отключить, если ролики выгружаются из кольцевых буферов
+        scheduled_crop_recording = config_manager.load_config().get('scheduled_crop_recording', True)
+        # Каналы с мониторингом строк по расписанию; длительность берется по каналу и слоту
+        lines_channels = ("R1", "Zvezda", "TVC", "RenTV", "NTV")
         for channel, info in channels.items():
             lines_times = set(info.get("lines", []))
             if not lines_times:
@@ -788,16 +1009,15 @@ class MonitoringApp:
             # Для RBK и MIR24 — запускать crop-видео и мониторинг строк по расписанию
             if channel in ("RBK", "MIR24"):
                 for t in lines_times:
-                    schedule.every().day.at(t).do(self._start_rbk_mir24_crop_recording)
-                    logger.info(f"Добавлено расписание записи crop-видео для {channel}: {t}")
+                    if scheduled_crop_recording:
+                        schedule.every().day.at(t).do(self._start_rbk_mir24_crop_recording)
+                        logger.info(f"Добавлено расписание записи crop-видео для {channel}: {t}")
                     schedule.every().day.at(t).do(self._start_rbk_mir24_lines_monitoring)
                     logger.info(f"Добавлено расписание мониторинга строк для {channel}: {t}")
-            else:
-                method = channel_methods.get(channel)
-                if method:
-                    for t in lines_times:
-                        schedule.every().day.at(t).do(method)
-                        logger.info(f"Добавлено расписание для {channel} (lines): {t}")
+            elif channel in lines_channels:
+                for t in lines_times:
+                    schedule.every().day.at(t).do(self._start_channel_lines_monitoring, channel)
+                    logger.info(f"Добавлено расписание для {channel} (lines): {t}, {config_manager.get_recording_duration(channel, t, VIDEO_DURATION)} с")
         schedule.every().day.at("22:00").do(self._send_daily_file_to_telegram)
         logger.info("Добавлено расписание отправки ежедневного файла в Telegram: 22:00")
         schedule.every().day.at("23:00").do(self._send_daily_sent_texts_to_telegram)
@@ -861,84 +1081,66 @@ class MonitoringApp:
         messagebox.showinfo("Информация", "Обработка полноценного видео больше не поддерживается. Используйте 'Проверка crop-видео' для обработки crop-роликов.")
         logger.info("Попытка запуска обработки полноценного видео - функция больше не поддерживается")
 
+    def _log_ocr_cache_stats(self):
+        """
+        Записывает в лог статистику кэша OCR.
+        """
+        stats = ocr_cache.get_stats()
+        logger.info(
+            f"Кэш OCR: попаданий {stats['hits']}, промахов {stats['misses']} "
+            f"({stats['hit_rate']:.1%}), записей {stats['size']}/{stats['max_size']}, "
+            f"вытеснено {stats['evictions']}, устарело {stats['expirations']}"
+        )
+        matcher_stats = get_keyword_matcher().get_stats()
+        logger.info(
+            f"Поиск ключевых слов: проверено текстов {matcher_stats['texts_checked']}, "
+            f"дошло до fuzzy {matcher_stats['texts_fuzzy']}, совпадения по путям {matcher_stats['paths']}"
+        )
+        delivery_stats = delivery_service.get_stats()
+        logger.info(
+            f"Отправка в Telegram: успешно {delivery_stats['sent']}, с ошибкой {delivery_stats['failed']}, "
+            f"в очереди {delivery_stats['queue_depth']}, задержка средняя {delivery_stats['latency_avg']:.2f} с, "
+            f"максимальная {delivery_stats['latency_max']:.2f} с"
+        )
+
     def _extract_text_from_image(self, image_path):
         """
-        Извлекает текст из изображения с помощью pytesseract.
+        Извлекает текст из изображения.
         """
         try:
             img = cv2.imread(str(image_path))
             if img is None:
                 return ""
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            text = pytesseract.image_to_string(gray, lang='rus+eng')
-            return text
+            return self._extract_text_from_frame(img)
         except Exception as e:
             logger.error(f"Ошибка при извлечении текста из {image_path}: {e}")
             return ""
 
+    def _extract_text_from_frame(self, frame, channel=""):
+        """
+        Извлекает текст из кадра (numpy-массив BGR или полутоновый) общим движком OCR.
+        """
+        try:
+            return recognize_text(frame, channel=channel)
+        except Exception as e:
+            logger.error(f"Ошибка при извлечении текста из кадра: {e}")
+            return ""
+
     def _load_keywords(self):
         """
         Загружает и приводит к нижнему регистру список ключевых слов.
         """
-        return set(word.lower() for word in config_manager.get_keywords_list())
+        return set(get_keyword_matcher().keywords)
 
-    def _find_keywords_local(self, text, keywords):
+    def _find_keywords_local(self, text):
         """
-        Улучшенная локальная проверка ключевых слов без использования API.
+        Улучшенная локальная проверка ключевых слов без использования API
+        (точное вхождение, вхождение в слово, fuzzy matching).
         """
-        found = []
-        text_lower = text.lower()
-        
-        # Предобработка текста
-        import re
-        text_clean = re.sub(r'\s+', ' ', text_lower).strip()
-        words = text_clean.split()
-        
-        for kw in keywords:
-            kw_lower = kw.lower()
-            kw_found = False
-            
-            # 1. Точное совпадение
-            if kw_lower in text_clean:
-                found.append(kw)
-                logger.debug(f"Найдено точное совпадение ключевого слова '{kw}'")
-                continue
-            
-            # 2. Проверка на уровне слов
-            for word in words:
-                word_clean = re.sub(r'[^\wа-яё]', '', word)
-                if len(word_clean) < 3:
-                    continue
-                
-                if word_clean == kw_lower:
-                    found.append(kw)
-                    logger.debug(f"Найдено точное совпадение слова '{kw}' в '{word_clean}'")
-                    kw_found = True
-                    break
-                
-                if kw_lower in word_clean or word_clean in kw_lower:
-                    found.append(kw)
-                    logger.debug(f"Найдено вхождение ключевого слова '{kw}' в слово '{word_clean}'")
-                    kw_found = True
-                    break
-            
-            if kw_found:
-                continue
-            
-            # 3. Fuzzy matching
-            from difflib import SequenceMatcher
-            for word in words:
-                word_clean = re.sub(r'[^\wа-яё]', '', word)
-                if len(word_clean) < 3:
-                    continue
-                
-                similarity = SequenceMatcher(None, kw_lower, word_clean).ratio()
-                if similarity >= 0.8:
-                    found.append(kw)
-                    logger.debug(f"Найдено fuzzy совпадение '{kw}' ~ '{word_clean}' (схожесть: {similarity:.2f})")
-                    break
-        
-        return found
+        matches = get_keyword_matcher().find_matches(text)
+        for match in matches:
+            logger.debug(f"Найдено ключевое слово '{match['keyword']}' ({match['path']}: '{match['token']}')")
+        return [match['keyword'] for match in matches]
 
     def _find_keywords_hf(self, text, keywords):
         """
@@ -954,7 +1156,7 @@ class MonitoringApp:
         # Проверка существования токена HF_API_TOKEN
         if not HF_API_TOKEN:
             logger.warning("HF_API_TOKEN не найден в переменных окружения, используется локальная проверка")
-            return self._find_keywords_local(text, keywords)
+            return self._find_keywords_local(text)
         
         # Создаем ключ кэша на основе текста и ключевых слов
         cache_key = f"{hash(text)}:{hash(tuple(sorted(keywords)))}"
@@ -1035,25 +1237,25 @@ Example responses:
             else:
                 logger.warning(f"HF API error: {response.status_code} {response.text}")
                 # При ошибке API используем локальную проверку
-                found = self._find_keywords_local(text, keywords)
+                found = self._find_keywords_local(text)
                 
         except requests.exceptions.Timeout:
             logger.warning("Таймаут при проверке ключевых слов через Hugging Face API")
-            found = self._find_keywords_local(text, keywords)
+            found = self._find_keywords_local(text)
         except requests.exceptions.RequestException as e:
             logger.warning(f"Ошибка сети при проверке ключевых слов через Hugging Face API: {e}")
-            found = self._find_keywords_local(text, keywords)
+            found = self._find_keywords_local(text)
         except (ValueError, KeyError) as e:
             logger.warning(f"Ошибка парсинга ответа Hugging Face API: {e}")
-            found = self._find_keywords_local(text, keywords)
+            found = self._find_keywords_local(text)
         except Exception as e:
             logger.error(f"Неожиданная ошибка при проверке ключевых слов через Hugging Face API: {e}")
-            found = self._find_keywords_local(text, keywords)
+            found = self._find_keywords_local(text)
         
         # Если API не дал результатов, используем локальную проверку
         if not found:
             logger.info("Hugging Face API не нашел ключевых слов, используется локальная проверка")
-            found = self._find_keywords_local(text, keywords)
+            found = self._find_keywords_local(text)
         
         # Сохраняем результат в кэш
         self._add_to_hf_cache(cache_key, found)
@@ -1083,27 +1285,6 @@ Example responses:
             self.hf_cache.clear()
             logger.info("Кэш Hugging Face API очищен")
 
-    def _start_r1_monitoring(self):
-        """
-        Запуск мониторинга строк для канала R1 по расписанию.
-        """
-        self.rbk_mir24_manager.start_scheduled_lines_monitoring(['R1'])
-
-    def _start_zvezda_monitoring(self):
-        """
-        Запуск мониторинга строк для канала Zvezda по расписанию.
-        """
-        self.rbk_mir24_manager.start_scheduled_lines_monitoring(['Zvezda'])
-
-    def _start_other_channels_monitoring(self):
-        """
-        Запуск мониторинга строк для других каналов по расписанию (TVC, RenTV, NTV).
-        """
-        # Определяем канал из контекста планировщика
-        # Поскольку этот метод используется для нескольких каналов, 
-        # мы не можем точно определить канал, поэтому используем общий подход
-        self.rbk_mir24_manager.start_scheduled_lines_monitoring()
-
     def _check_and_start_idle_monitoring(self):
         """
         Заглушка для проверки и запуска idle-мониторинга (для планировщика).
@@ -1158,26 +1339,20 @@ Example responses:
 
     def get_video_fragments_with_keywords(self, video_path, channel_name, keywords, context_sec=2):
         """
-        По файлу recognized_text/<channel>.txt и списку ключевых слов возвращает интервалы (start_sec, end_sec)
+        По текстам видео из базы событий и списку ключевых слов возвращает интервалы (start_sec, end_sec)
         для нарезки видео (±context_sec вокруг каждого найденного предложения).
         """
-        recognized_file = Path("recognized_text") / f"{channel_name}.txt"
-        if not recognized_file.exists():
-            logger.warning(f"Файл распознанного текста не найден: {recognized_file}")
+        # Строки только этого видео (выборка по индексу канал + видеофайл)
+        rows = event_store.video_texts(channel_name, video_path.name)
+        if not rows:
+            logger.warning(f"Распознанный текст для {video_path.name} ({channel_name}) не найден")
             return []
         fragments = []
-        video_name = video_path.name
-        # Собираем все строки для этого видео
-        with open(recognized_file, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f if line.startswith(video_name + '\t')]
-        for line in lines:
+        for row in rows:
             try:
-                parts = line.split('\t', 3)
-                if len(parts) < 4:
-                    continue
-                _, _, timestamp_sec, text = parts
-                timestamp_sec = int(timestamp_sec)
-                found = self._find_keywords_local(text, keywords)
+                timestamp_sec = int(row['timestamp_sec'])
+                text = row['text']
+                found = self._find_keywords_local(text)
                 if found:
                     start = max(0, timestamp_sec - context_sec)
                     end = timestamp_sec + context_sec
@@ -1257,73 +1432,47 @@ Example responses:
 
     def _send_single_video_to_telegram(self, video_path, channel_name, found_keywords):
         """
-        Отправляет одно видео в Telegram. Если есть ключевые слова — отправляет видео целиком.
-        Не отправляет видео, если оно уже было отправлено (sent_videos.txt) или неудачно отправлено (failed_videos.txt).
-        После двух неудачных попыток отправки — добавляет в failed_videos.txt и очищает папку, как при успехе.
+        Ставит одно видео в очередь отправки в Telegram, если есть ключевые слова.
+        Не ставит видео, если оно уже было отправлено, неудачно отправлено или уже в очереди.
+        Повторы с растущей задержкой и пометку failed выполняет очередь отправки.
         """
         try:
-            from telegram_sender import send_files
-            sent_videos_file = Path('sent_videos.txt')
-            failed_videos_file = Path('failed_videos.txt')
-            sent_videos = set()
-            failed_videos = set()
-            if sent_videos_file.exists():
-                with sent_videos_file.open('r', encoding='utf-8') as f:
-                    sent_videos = set(line.strip() for line in f if line.strip())
-            if failed_videos_file.exists():
-                with failed_videos_file.open('r', encoding='utf-8') as f:
-                    failed_videos = set(line.strip() for line in f if line.strip())
             video_name = os.path.basename(str(video_path))
-            if video_name in sent_videos or video_name in failed_videos:
+            if {'sent', 'failed'} & set(event_store.delivery_statuses('video', video_name)):
                 logger.info(f"Видео {video_name} уже было отправлено ранее или неудачно отправлено, пропуск отправки.")
                 return False
+            if event_store.outbox_status('video', video_name) is not None:
+                logger.info(f"Видео {video_name} уже в очереди отправки, пропуск.")
+                return False
             if found_keywords:
                 caption = f"Канал: {channel_name}\nНайденные ключевые слова: {', '.join(found_keywords)}"
                 file_to_send = str(video_path)
             else:
                 logger.info(f"Нет ключевых слов для {video_path.name}, видео не отправляется")
                 return False
+            # Ролик записан без перекодирования — crop применяется только к отправляемому ролику
+            crop_params = read_deferred_crop(video_path)
+            if crop_params:
+                cropped = crop_clip(video_path, crop_params, Path(video_path).with_name(f"{Path(video_path).stem}_crop.mp4"))
+                if cropped:
+                    file_to_send = cropped
+                else:
+                    logger.warning(f"Не удалось обрезать {video_name}, отправляется полный кадр")
             file_size = os.path.getsize(file_to_send)
             file_size_mb = file_size / (1024 * 1024)
-            logger.info(f"Отправка видео {os.path.basename(file_to_send)} ({file_size_mb:.2f} MB) в Telegram")
-            max_attempts = 2
-            for attempt in range(max_attempts):
-                success = send_files([file_to_send], caption=caption)
-                if success:
-                    logger.info(f"Видео {os.path.basename(file_to_send)} успешно отправлено в Telegram")
-                    with sent_videos_file.open('a', encoding='utf-8') as f:
-                        f.write(video_name + '\n')
-                    # Очистка папки после успешной отправки
-                    self._cleanup_channel_video_folder(channel_name)
-                    return True
-                else:
-                    logger.error(f"Не удалось отправить видео {os.path.basename(file_to_send)} в Telegram (попытка {attempt+1})")
-            # После двух неудачных попыток
-            logger.error(f"Видео {os.path.basename(file_to_send)} не удалось отправить после {max_attempts} попыток. Помещаем в failed_videos.txt и очищаем папку.")
-            with failed_videos_file.open('a', encoding='utf-8') as f:
-                f.write(video_name + '\n')
-            self._cleanup_channel_video_folder(channel_name)
+            logger.info(f"Постановка видео {video_name} ({file_size_mb:.2f} MB) в очередь отправки")
+            # Исходный ролик и его файл crop удаляет проход проверки (_cleanup_processed_videos),
+            # записи канала, которые еще идут или не проверены, не затрагиваются
+            if delivery_service.send_later('video', file_to_send, caption=caption, channel=channel_name, item=video_name):
+                return True
+            if file_to_send != str(video_path):
+                # Обрезанная копия не поставлена в очередь — иначе следующий проход примет ее за новую запись
+                Path(file_to_send).unlink(missing_ok=True)
             return False
         except Exception as e:
             logger.error(f"Ошибка при отправке видео {video_path}: {e}")
             return False
 
-    def _cleanup_channel_video_folder(self, channel_name):
-        """
-        Очищает папку lines_video/<channel_name> (удаляет все mp4-файлы).
-        """
-        try:
-            channel_dir = Path("lines_video") / channel_name
-            if channel_dir.exists() and channel_dir.is_dir():
-                for file in channel_dir.glob("*.mp4"):
-                    try:
-                        file.unlink()
-                        logger.info(f"Удалён файл {file} из папки {channel_dir}")
-                    except Exception as e:
-                        logger.error(f"Ошибка при удалении файла {file}: {e}")
-        except Exception as e:
-            logger.error(f"Ошибка при очистке папки lines_video/{channel_name}: {e}")
-
     def _start_watchdog_thread(self):
         def watchdog():
             while True:
@@ -1438,6 +1587,8 @@ class StatusHandler(BaseHTTPRequestHandler):
         return
 
 if __name__ == "__main__":
+    # Необходимо для пула процессов OCR в собранном exe (PyInstaller, Windows)
+    multiprocessing.freeze_support()
     app = MonitoringApp()
     try:
         app.ui.run()
@@ -0,0 +1,618 @@
+import os
+import sys
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+OCR_LANG = 'rus+eng'
+# Размер уменьшенного изображения для перцептивного хеша (ширина, высота)
+OCR_HASH_SIZE = (128, 16)
+# Пакетный режим: высота белого разделителя между полосами на общей странице
+OCR_BATCH_SEPARATOR = 24
+
+
+def get_resource_path(filename, subdir="bin"):
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, subdir, filename)
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """
+    Приводит изображение к полутоновому непрерывному массиву uint8.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return np.ascontiguousarray(image, dtype=np.uint8)
+
+
+def perceptual_hash(image: np.ndarray, size: Tuple[int, int] = OCR_HASH_SIZE) -> bytes:
+    """
+    Разностный перцептивный хеш (dHash) полосы с текстом.
+
+    Изображение уменьшается усреднением, поэтому кадры, отличающиеся
+    несколькими пикселями, дают одинаковый хеш.
+    """
+    gray = to_gray(image)
+    width, height = size
+    small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    return np.packbits(diff).tobytes()
+
+
+class OCRResultCache:
+    """
+    LRU-кэш результатов OCR по перцептивному хешу изображения.
+
+    Размер ограничен max_size записями (вытесняются самые старые по
+    использованию), у каждой записи есть срок жизни, который можно задать
+    отдельно для канала.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 600.0, channel_ttl: Optional[Dict[str, float]] = None):
+        """
+        Инициализация кэша.
+
+        Args:
+            max_size: Максимальное количество записей
+            ttl: Срок жизни записи в секундах по умолчанию
+            channel_ttl: Сроки жизни для отдельных каналов {канал: секунды}
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel_ttl = dict(channel_ttl or {})
+        self._entries: "OrderedDict[tuple, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def configure(self, max_size: Optional[int] = None, ttl: Optional[float] = None,
+                  channel_ttl: Optional[Dict[str, float]] = None):
+        """
+        Меняет параметры кэша (например, из config.json).
+        """
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max(0, int(max_size))
+            if ttl is not None:
+                self.ttl = float(ttl)
+            if channel_ttl is not None:
+                self.channel_ttl = {channel: float(value) for channel, value in channel_ttl.items()}
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def make_key(self, channel: str, image: np.ndarray, lang: str = OCR_LANG) -> tuple:
+        """
+        Ключ кэша: канал, языки и перцептивный хеш изображения.
+        """
+        return channel or "", lang, perceptual_hash(image)
+
+    def get(self, key: tuple) -> Optional[Tuple[str, float]]:
+        """
+        Возвращает (текст, уверенность) или None, если записи нет или она устарела.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                text, confidence, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return text, confidence
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, result: Tuple[str, float]):
+        """
+        Сохраняет результат распознавания.
+        """
+        with self._lock:
+            if self.max_size <= 0:
+                return
+            ttl = self.channel_ttl.get(key[0], self.ttl)
+            self._entries[key] = (result[0], result[1], time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def count_hit(self):
+        """
+        Учитывает попадание, обслуженное без обращения к кэшу (дубликат в пакете).
+        """
+        with self._lock:
+            self.hits += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """
+        Статистика кэша: размер, попадания, промахи, доля попаданий, вытеснения.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Глобальный кэш результатов OCR
+ocr_cache = OCRResultCache()
+
+
+def stack_crops(images: List[np.ndarray], separator: int = OCR_BATCH_SEPARATOR) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Складывает полосы в одну страницу друг под другом.
+
+    Узкие полосы дополняются справа цветом своего фона (медиана краев),
+    между полосами и по краям страницы — белые разделители.
+
+    Returns:
+        (страница, [(верх, низ) каждой полосы на странице])
+    """
+    grays = [to_gray(image) for image in images]
+    width = max(gray.shape[1] for gray in grays)
+    parts = [np.full((separator, width), 255, dtype=np.uint8)]
+    bands = []
+    top = separator
+    for gray in grays:
+        height, crop_width = gray.shape[:2]
+        if crop_width < width:
+            border = np.concatenate((gray[0, :], gray[-1, :], gray[:, 0], gray[:, -1]))
+            padded = np.full((height, width), int(np.median(border)), dtype=np.uint8)
+            padded[:, :crop_width] = gray
+            gray = padded
+        parts.append(gray)
+        parts.append(np.full((separator, width), 255, dtype=np.uint8))
+        # Разделитель делится пополам между соседними полосами
+        bands.append((top - separator // 2, top + height + separator // 2))
+        top += height + separator
+    return np.vstack(parts), bands
+
+
+class TesseractEngine:
+    """
+    Движок OCR с постоянно загруженной моделью Tesseract.
+
+    Если установлен tesserocr, используется C API: traineddata загружается
+    один раз при создании движка, изображение передается из памяти без
+    временных файлов и запуска процесса. Без tesserocr движок работает
+    через pytesseract (отдельный процесс на каждый вызов).
+    """
+
+    def __init__(self, lang: str = OCR_LANG):
+        """
+        Инициализация движка.
+
+        Args:
+            lang: Языки распознавания в формате Tesseract
+        """
+        self.lang = lang
+        self._api = None
+        if tesserocr is not None:
+            tessdata_dir = get_resource_path("tessdata")
+            try:
+                if os.path.isdir(tessdata_dir):
+                    self._api = tesserocr.PyTessBaseAPI(path=tessdata_dir, lang=lang)
+                else:
+                    self._api = tesserocr.PyTessBaseAPI(lang=lang)
+                logger.info(f"Инициализирован движок tesserocr ({lang}) в потоке {threading.current_thread().name}")
+            except Exception as e:
+                logger.error(f"Не удалось инициализировать tesserocr, используется pytesseract: {e}")
+                self._api = None
+
+    @property
+    def is_persistent(self) -> bool:
+        """
+        True, если движок работает через постоянный экземпляр C API.
+        """
+        return self._api is not None
+
+    def recognize(self, image: np.ndarray) -> Tuple[str, float]:
+        """
+        Распознает текст на изображении.
+
+        Args:
+            image: Изображение (BGR или полутоновое)
+        Returns:
+            Кортеж (текст, средняя уверенность 0-100; -1 если неизвестна)
+        """
+        gray = to_gray(image)
+        if self._api is not None:
+            height, width = gray.shape[:2]
+            self._api.SetImageBytes(gray.tobytes(), width, height, 1, width)
+            text = self._api.GetUTF8Text()
+            confidence = float(self._api.MeanTextConf())
+            return text, confidence
+        return pytesseract.image_to_string(gray, lang=self.lang), -1.0
+
+    def recognize_words(self, image: np.ndarray) -> List[dict]:
+        """
+        Распознает слова с координатами (аналог image_to_data).
+
+        Returns:
+            Список слов {'text', 'conf', 'left', 'top', 'width', 'height', 'line'}
+            в порядке чтения; 'line' — сквозной номер строки на странице
+        """
+        gray = to_gray(image)
+        words = []
+        if self._api is not None:
+            height, width = gray.shape[:2]
+            self._api.SetImageBytes(gray.tobytes(), width, height, 1, width)
+            self._api.Recognize()
+            iterator = self._api.GetIterator()
+            level = tesserocr.RIL.WORD
+            line = -1
+            if iterator is not None:
+                while True:
+                    text = iterator.GetUTF8Text(level)
+                    if text:
+                        if line < 0 or iterator.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                            line += 1
+                        bbox = iterator.BoundingBox(level)
+                        if bbox:
+                            left, top, right, bottom = bbox
+                            words.append({
+                                'text': text.strip(), 'conf': float(iterator.Confidence(level)),
+                                'left': left, 'top': top, 'width': right - left, 'height': bottom - top,
+                                'line': line,
+                            })
+                    if not iterator.Next(level):
+                        break
+            return words
+        data = pytesseract.image_to_data(gray, lang=self.lang, output_type=pytesseract.Output.DICT)
+        line_ids = {}
+        for i, text in enumerate(data['text']):
+            if not text or not text.strip():
+                continue
+            line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            words.append({
+                'text': text.strip(), 'conf': float(data['conf'][i]),
+                'left': data['left'][i], 'top': data['top'][i],
+                'width': data['width'][i], 'height': data['height'][i],
+                'line': line_ids.setdefault(line_key, len(line_ids)),
+            })
+        return words
+
+    def recognize_batch(self, images: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """
+        Распознает несколько полос за один вызов Tesseract.
+
+        Полосы складываются в одну страницу друг под другом через белые
+        разделители, после распознавания слова раскладываются по исходным
+        полосам по вертикальному центру их рамок.
+
+        Returns:
+            Список (текст, средняя уверенность) в порядке images
+        """
+        if not images:
+            return []
+        if len(images) == 1:
+            return [self.recognize(images[0])]
+        page, bands = stack_crops(images)
+        words = self.recognize_words(page)
+        band_words: List[List[dict]] = [[] for _ in images]
+        for word in words:
+            center = word['top'] + word['height'] / 2
+            for index, (top, bottom) in enumerate(bands):
+                if top <= center < bottom:
+                    band_words[index].append(word)
+                    break
+        results = []
+        for crop_words in band_words:
+            lines: Dict[int, List[str]] = {}
+            for word in crop_words:
+                lines.setdefault(word['line'], []).append(word['text'])
+            text = "\n".join(" ".join(line_words) for line_words in lines.values())
+            confidences = [word['conf'] for word in crop_words if word['conf'] >= 0]
+            confidence = sum(confidences) / len(confidences) if confidences else -1.0
+            results.append((text, confidence))
+        return results
+
+    def close(self):
+        """
+        Освобождает ресурсы C API.
+        """
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+
+
+_local = threading.local()
+
+
+def get_engine(lang: str = OCR_LANG) -> TesseractEngine:
+    """
+    Возвращает движок OCR текущего потока (создается при первом обращении).
+    """
+    engines = getattr(_local, 'engines', None)
+    if engines is None:
+        engines = _local.engines = {}
+    engine = engines.get(lang)
+    if engine is None:
+        engine = engines[lang] = TesseractEngine(lang)
+    return engine
+
+
+def recognize_text(image: np.ndarray, lang: str = OCR_LANG, channel: str = "") -> str:
+    """
+    Распознает текст на изображении движком текущего потока (с учетом кэша OCR).
+    """
+    text, _ = recognize_text_with_confidence(image, lang, channel)
+    return text
+
+
+def recognize_batch(images: List[np.ndarray], lang: str = OCR_LANG) -> List[Tuple[str, float]]:
+    """
+    Распознает несколько полос одним вызовом Tesseract движком текущего потока.
+    """
+    return get_engine(lang).recognize_batch(images)
+
+
+def recognize_text_with_confidence(image: np.ndarray, lang: str = OCR_LANG, channel: str = "") -> Tuple[str, float]:
+    """
+    Распознает текст и возвращает его вместе со средней уверенностью.
+    Перед вызовом Tesseract проверяется кэш результатов.
+    """
+    gray = to_gray(image)
+    key = ocr_cache.make_key(channel, gray, lang)
+    result = ocr_cache.get(key)
+    if result is None:
+        result = get_engine(lang).recognize(gray)
+        ocr_cache.put(key, result)
+    return result
+
+
+def _init_worker(tesseract_cmd: str):
+    """
+    Инициализация процесса-воркера: путь к tesseract для fallback через pytesseract.
+    """
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def _worker_recognize(image: Union[np.ndarray, str], lang: str) -> Tuple[str, float]:
+    """
+    Распознавание в процессе-воркере. image — массив или путь к файлу изображения.
+    """
+    if isinstance(image, str):
+        image = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return "", -1.0
+    return get_engine(lang).recognize(image)
+
+
+def _worker_recognize_batch(images: List[np.ndarray], lang: str) -> List[Tuple[str, float]]:
+    """
+    Пакетное распознавание в процессе-воркере.
+    """
+    return get_engine(lang).recognize_batch(images)
+
+
+class OCRExecutor:
+    """
+    Пул процессов OCR с ограниченной очередью заданий.
+
+    Каждый процесс держит собственный постоянный движок (get_engine).
+    submit блокируется, пока в работе max_pending заданий, поэтому
+    производитель кадров не может переполнить память.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 lang: str = OCR_LANG, batch_size: int = 1):
+        """
+        Инициализация пула.
+
+        Args:
+            workers: Количество процессов (по умолчанию число ядер минус одно)
+            max_pending: Максимум заданий в работе (по умолчанию workers * 4)
+            lang: Языки распознавания
+            batch_size: Сколько полос склеивать в одну страницу (1 — без пакетов)
+        """
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_size = max(1, int(batch_size or 1))
+        self.max_pending = max_pending or self.workers * 4
+        self.lang = lang
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Создает пул процессов при первом обращении.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(pytesseract.pytesseract.tesseract_cmd,)
+                )
+                logger.info(f"Запущен пул OCR: {self.workers} процессов, очередь {self.max_pending} заданий")
+            return self._pool
+
+    def _submit_call(self, func: Callable, *args) -> Future:
+        """
+        Отправляет вызов в пул, блокируясь, пока очередь заполнена.
+        """
+        self._slots.acquire()
+        try:
+            future = self._get_pool().submit(func, *args)
+        except Exception as e:
+            # Пул недоступен (например, процесс-воркер упал) — распознаем в текущем потоке
+            logger.error(f"Пул OCR недоступен, распознавание в текущем потоке: {e}")
+            self._slots.release()
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as ocr_error:
+                future.set_exception(ocr_error)
+            return future
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit(self, image: Union[np.ndarray, str]) -> Future:
+        """
+        Ставит изображение (массив или путь к файлу) в очередь распознавания.
+        Блокируется, пока очередь заполнена.
+
+        Returns:
+            Future с результатом (текст, уверенность)
+        """
+        return self._submit_call(_worker_recognize, image, self.lang)
+
+    def submit_batch(self, images: List[np.ndarray]) -> Future:
+        """
+        Ставит пакет полос в очередь как одно задание (одна страница на вызов Tesseract).
+
+        Returns:
+            Future со списком (текст, уверенность) в порядке images
+        """
+        return self._submit_call(_worker_recognize_batch, images, self.lang)
+
+    def _flush_batch(self, batch: List[Tuple[np.ndarray, Future]]):
+        """
+        Отправляет накопленный пакет и раздает результаты по Future отдельных заданий.
+        """
+        if not batch:
+            return
+        items = list(batch)
+        batch.clear()
+        batch_future = self.submit_batch([image for image, _ in items])
+
+        def _distribute(done: Future):
+            try:
+                results = done.result()
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                return
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+        batch_future.add_done_callback(_distribute)
+
+    def _submit_cached(self, job: dict, pending: Dict[tuple, Future],
+                       batch: List[Tuple[np.ndarray, Future]]) -> Tuple[Optional[tuple], Future]:
+        """
+        Ставит задание в очередь, если результата нет в кэше OCR.
+        Одинаковые изображения внутри пакета распознаются один раз.
+
+        Returns:
+            (ключ кэша, если результат нужно сохранить; Future с результатом)
+        """
+        image = job['image']
+        if isinstance(image, str):
+            image = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                logger.error(f"Не удалось прочитать изображение {job['image']}")
+                future = Future()
+                future.set_result(("", -1.0))
+                return None, future
+        image = to_gray(image)
+        key = ocr_cache.make_key(job.get('channel', ""), image, self.lang)
+        if key in pending:
+            ocr_cache.count_hit()
+            return None, pending[key]
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return None, future
+        if self.batch_size > 1:
+            future = Future()
+            batch.append((image, future))
+            if len(batch) >= self.batch_size:
+                self._flush_batch(batch)
+        else:
+            future = self.submit(image)
+        pending[key] = future
+        return key, future
+
+    def recognize_many(self, jobs: Iterable[dict],
+                       on_progress: Optional[Callable[[int], None]] = None) -> Dict[str, List[dict]]:
+        """
+        Распознает набор заданий и собирает результаты по каналам в порядке времени.
+        Изображения, уже распознанные ранее (по перцептивному хешу), берутся из кэша.
+
+        Args:
+            jobs: Задания-словари с ключами 'channel', 'timestamp' (любое сравнимое значение),
+                  'image' (массив или путь) и любыми дополнительными полями
+            on_progress: Вызывается с количеством завершенных заданий
+        Returns:
+            {канал: [задание без 'image' с полями 'text' и 'confidence', ...]} по возрастанию timestamp
+        """
+        submitted = []
+        done_count = [0]
+        done_lock = threading.Lock()
+
+        def _on_done(_):
+            with done_lock:
+                done_count[0] += 1
+                count = done_count[0]
+            if on_progress:
+                try:
+                    on_progress(count)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике прогресса OCR: {e}")
+
+        pending: Dict[tuple, Future] = {}
+        batch: List[Tuple[np.ndarray, Future]] = []
+        for job in jobs:
+            cache_key, future = self._submit_cached(job, pending, batch)
+            future.add_done_callback(_on_done)
+            submitted.append(({key: value for key, value in job.items() if key != 'image'}, cache_key, future))
+        self._flush_batch(batch)
+
+        results: Dict[str, List[dict]] = {}
+        for job, cache_key, future in submitted:
+            try:
+                job['text'], job['confidence'] = future.result()
+                if cache_key is not None:
+                    ocr_cache.put(cache_key, (job['text'], job['confidence']))
+            except Exception as e:
+                logger.error(f"Ошибка распознавания задания {job.get('channel')} {job.get('timestamp')}: {e}")
+                job['text'], job['confidence'] = "", -1.0
+            results.setdefault(job['channel'], []).append(job)
+        for channel_jobs in results.values():
+            channel_jobs.sort(key=lambda item: item['timestamp'])
+        return results
+
+    def shutdown(self):
+        """
+        Останавливает пул процессов.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                logger.info("Пул OCR остановлен")
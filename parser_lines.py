@@ -3,6 +3,7 @@ import time
 import json
 import logging
 import threading
+import queue
 from datetime import datetime
 import subprocess
 from utils import setup_logging
@@ -10,6 +11,7 @@ import cv2
 import numpy as np
 from pathlib import Path
 from config_manager import config_manager
+from stream_capture import stream_multiplexer
 
 # Инициализация логирования
 logger = setup_logging('parser_lines_log.txt')
@@ -20,6 +22,117 @@ monitoring_threads_lock = threading.Lock()
 force_capture_event = threading.Event()
 stop_monitoring_event = threading.Event()
 
+# Максимальное время ожидания кадра из сессии потока, сек
+FRAME_TIMEOUT = 15.0
+# Время без прочитанных кадров, после которого сессия потока считается зависшей
+# и заменяется новой (больше максимальной паузы переподключения сессии), сек
+SESSION_STALL_TIMEOUT = 120.0
+
+# Параметры фильтра изменений кадра
+HASH_SIZE = (32, 4)  # Размер разностного хэша (ширина x высота) для узкой полосы строки
+HASH_DISTANCE_THRESHOLD = 6  # Кадры с расстоянием Хэмминга не больше порога считаются одинаковыми
+MIN_EDGE_DENSITY = 0.01  # Минимальная доля пикселей-границ, при которой в полосе есть текст
+
+# Очередь кадров для потокового режима (кадры передаются в OCR без записи на диск)
+frame_queue = None
+FRAME_QUEUE_PUT_TIMEOUT = 1.0
+
+# Счетчики отброшенных кадров по каналам
+dropped_frames = {}
+dropped_frames_lock = threading.Lock()
+
+class FrameChangeDetector:
+    """
+    Дешевая проверка изменений обрезанной полосы бегущей строки.
+    Отбрасывает кадры, почти совпадающие с последним сохраненным,
+    и кадры без текстоподобных границ (например, во время рекламы).
+    Кадр становится образцом для сравнения только после commit(),
+    то есть когда он действительно сохранен или передан в очередь OCR.
+    """
+    def __init__(self, channel_name, hash_threshold=HASH_DISTANCE_THRESHOLD, min_edge_density=MIN_EDGE_DENSITY):
+        """
+        Инициализация детектора для канала.
+        """
+        self.channel_name = channel_name
+        self.hash_threshold = hash_threshold
+        self.min_edge_density = min_edge_density
+        self.last_hash = None
+        self.pending_hash = None
+
+    @staticmethod
+    def compute_hash(gray):
+        """
+        Разностный хэш (dHash) полутонового изображения.
+        """
+        width, height = HASH_SIZE
+        small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+        return small[:, 1:] > small[:, :-1]
+
+    def check(self, frame):
+        """
+        Проверяет кадр. Возвращает None, если кадр нужно сохранить,
+        или причину отбрасывания: 'no_text' или 'duplicate'.
+        Хэш принятого кадра запоминается до вызова commit().
+        """
+        self.pending_hash = None
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        edges = cv2.Canny(gray, 100, 200)
+        if np.count_nonzero(edges) < self.min_edge_density * edges.size:
+            return 'no_text'
+        frame_hash = self.compute_hash(gray)
+        if self.last_hash is not None and np.count_nonzero(frame_hash != self.last_hash) <= self.hash_threshold:
+            return 'duplicate'
+        self.pending_hash = frame_hash
+        return None
+
+    def commit(self):
+        """
+        Делает последний принятый check() кадр образцом для следующих сравнений.
+        Вызывается после успешного сохранения кадра или передачи его в очередь OCR.
+        """
+        if self.pending_hash is not None:
+            self.last_hash = self.pending_hash
+            self.pending_hash = None
+
+def count_dropped_frame(channel_name, reason):
+    """
+    Увеличивает счетчик отброшенных кадров канала.
+    """
+    with dropped_frames_lock:
+        stats = dropped_frames.setdefault(channel_name, {'duplicate': 0, 'no_text': 0, 'queue_full': 0})
+        stats[reason] += 1
+
+def set_frame_queue(target_queue):
+    """
+    Включает потоковый режим: обрезанные кадры передаются в очередь
+    (channel_name, datetime, frame) вместо записи в screenshots/.
+    None выключает потоковый режим.
+    """
+    global frame_queue
+    frame_queue = target_queue
+    logger.info(f"Потоковый режим передачи кадров в OCR {'включен' if target_queue is not None else 'выключен'}")
+
+def enqueue_frame(channel_name, frame):
+    """
+    Кладет кадр в очередь потокового режима. Если очередь заполнена
+    дольше FRAME_QUEUE_PUT_TIMEOUT, кадр отбрасывается.
+    """
+    try:
+        frame_queue.put((channel_name, datetime.now(), frame.copy()), timeout=FRAME_QUEUE_PUT_TIMEOUT)
+        logger.info(f"Кадр {channel_name} передан в очередь OCR (размер очереди: {frame_queue.qsize()})")
+        return True
+    except queue.Full:
+        count_dropped_frame(channel_name, 'queue_full')
+        logger.warning(f"Очередь OCR заполнена, кадр {channel_name} отброшен")
+        return None
+
+def get_dropped_frames():
+    """
+    Возвращает копию счетчиков отброшенных кадров: {канал: {причина: количество}}.
+    """
+    with dropped_frames_lock:
+        return {channel: dict(stats) for channel, stats in dropped_frames.items()}
+
 def load_channels():
     """
     Загрузка конфигурации каналов из JSON файла через config_manager.
@@ -43,9 +156,50 @@ def parse_interval(interval_str):
         logger.error(f"Ошибка парсинга интервала {interval_str}: {e}. Используется 10 секунд.")
         return 10
 
-def capture_screenshot(channel_name, stream_url, output_dir, crop_params=None):
+def apply_crop(frame, crop_params, channel_name):
+    """
+    Применяет параметры crop (формат: crop=width:height:x:y) к кадру.
+    Если параметры некорректны или превышают размеры кадра, возвращает полный кадр.
+    """
+    if not crop_params:
+        return frame
+    try:
+        crop_str = crop_params.replace("crop=", "")
+        width, height, x, y = map(int, crop_str.split(":"))
+        h, w = frame.shape[:2]
+        if x + width > w or y + height > h:
+            logger.warning(f"Параметры crop для {channel_name} превышают размеры кадра. Используется полный кадр.")
+            return frame
+        return frame[y:y+height, x:x+width]
+    except Exception as e:
+        logger.error(f"Ошибка при применении crop для {channel_name}: {e}. Используется полный кадр.")
+        return frame
+
+def read_single_frame(channel_name, stream_url):
+    """
+    Открывает видеопоток, читает один кадр и закрывает поток.
+    Используется, когда постоянная сессия потока недоступна.
+    """
+    cap = cv2.VideoCapture(stream_url)
+    try:
+        if not cap.isOpened():
+            logger.error(f"Не удалось открыть видеопоток для {channel_name}: {stream_url}")
+            return None
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            logger.error(f"Не удалось прочитать кадр из потока для {channel_name}")
+            return None
+        return frame
+    finally:
+        cap.release()
+
+def capture_screenshot(channel_name, stream_url, output_dir, crop_params=None, session=None, change_detector=None):
     """
     Создание скриншота из видеопотока с использованием OpenCV.
+    Если передана сессия потока (StreamSession), кадр берется из нее
+    без повторного открытия потока. Если передан FrameChangeDetector,
+    неизмененные кадры и кадры без текста не сохраняются.
+    Возвращает True при сохранении, None если кадр отброшен фильтром, False при ошибке.
     """
     try:
         # Формируем имя файла с текущей датой и временем
@@ -55,51 +209,52 @@ def capture_screenshot(channel_name, stream_url, output_dir, crop_params=None):
         # Создание директории если она не существует
         try:
             output_dir.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Директория для скриншотов создана/проверена: {output_dir}")
         except Exception as e:
             logger.error(f"Ошибка при создании директории для скриншотов: {e}")
             return False
         
         output_file = output_dir / f"{channel_name}_{timestamp}.jpg"
         
-        # Открываем видеопоток
-        cap = cv2.VideoCapture(stream_url)
-        
-        if not cap.isOpened():
-            logger.error(f"Не удалось открыть видеопоток для {channel_name}: {stream_url}")
-            return False
-        
-        # Читаем кадр
-        ret, frame = cap.read()
-        
-        if not ret or frame is None:
-            logger.error(f"Не удалось прочитать кадр из потока для {channel_name}")
-            cap.release()
-            return False
+        # Получаем кадр из постоянной сессии или открываем поток разово
+        if session is not None:
+            frame = session.get_frame(timeout=FRAME_TIMEOUT)
+            if frame is None:
+                logger.error(f"Не удалось получить кадр из сессии потока для {channel_name}")
+                return False
+        else:
+            frame = read_single_frame(channel_name, stream_url)
+            if frame is None:
+                return False
         
         # Применяем обрезку если указаны параметры
         if crop_params:
-            try:
-                # Парсим параметры crop (формат: crop=width:height:x:y)
-                crop_str = crop_params.replace("crop=", "")
-                width, height, x, y = map(int, crop_str.split(":"))
-                h, w = frame.shape[:2]
-                if x + width > w or y + height > h:
-                    logger.warning(f"Параметры crop для {channel_name} превышают размеры кадра. Используется полный кадр.")
-                else:
-                    frame = frame[y:y+height, x:x+width]
-            except Exception as e:
-                logger.error(f"Ошибка при применении crop для {channel_name}: {e}. Используется полный кадр.")
+            frame = apply_crop(frame, crop_params, channel_name)
         else:
             logger.info(f"Для канала {channel_name} не указан crop. Используется полный кадр.")
         
+        # Отбрасываем кадр до кодирования JPEG, если полоса не изменилась или пуста
+        if change_detector is not None:
+            reason = change_detector.check(frame)
+            if reason:
+                count_dropped_frame(channel_name, reason)
+                logger.debug(f"Кадр {channel_name} отброшен фильтром изменений: {reason}")
+                return None
+        
+        # В потоковом режиме кадр уходит в OCR без кодирования и записи на диск.
+        # Отброшенный (очередь заполнена) или несохраненный кадр не становится
+        # образцом фильтра — следующий такой же кадр будет распознан
+        if frame_queue is not None:
+            queued = enqueue_frame(channel_name, frame)
+            if queued and change_detector is not None:
+                change_detector.commit()
+            return queued
+        
         # Сохраняем изображение
         success = cv2.imwrite(str(output_file), frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
         
-        # Освобождаем ресурсы
-        cap.release()
-        
         if success:
+            if change_detector is not None:
+                change_detector.commit()
             logger.info(f"Скриншот создан: {output_file}")
             return True
         else:
@@ -114,6 +269,8 @@ def monitor_channel(channel_name, channel_info):
     """
     Мониторинг отдельного канала.
     """
+    session = None
+    stream_url = None
     try:
         # Получаем URL потока из конфигурации
         stream_url = channel_info.get('url')
@@ -134,6 +291,11 @@ def monitor_channel(channel_name, channel_info):
         crop_params = channel_info.get('crop')
         interval = parse_interval(channel_info.get('interval', '1/10'))
         
+        # Одна долгоживущая сессия потока на все время мониторинга канала;
+        # каналы с одинаковым URL используют общую сессию
+        session = stream_multiplexer.acquire(stream_url, channel_name)
+        change_detector = FrameChangeDetector(channel_name)
+        
         logger.info(f"Запущен мониторинг канала {channel_name} (URL: {stream_url}, интервал: {interval} сек)")
         
         last_capture_time = None
@@ -145,12 +307,19 @@ def monitor_channel(channel_name, channel_info):
                 # Проверяем флаг принудительного захвата или прошло достаточно времени
                 if force_capture_event.is_set() or (last_capture_time is None or current_time - last_capture_time >= interval):
                     # Создаем скриншот
-                    result = capture_screenshot(channel_name, stream_url, output_dir, crop_params)
+                    result = capture_screenshot(channel_name, stream_url, output_dir, crop_params,
+                                                session=session, change_detector=change_detector)
                     if result:
                         logger.info(f"Скриншот успешно создан для {channel_name}")
                         last_capture_time = current_time
+                    elif result is None:
+                        last_capture_time = current_time
                     else:
                         logger.error(f"Не удалось создать скриншот для {channel_name}")
+                        # Поток сессии завершился или давно не читает кадры — открываем новую сессию
+                        if not session.is_running() or time.time() - session.last_grab_time >= SESSION_STALL_TIMEOUT:
+                            logger.warning(f"Сессия потока {channel_name} не выдает кадры, переподключение")
+                            session = stream_multiplexer.reacquire(session, channel_name)
                     
                     # Сбрасываем флаг принудительного захвата
                     if force_capture_event.is_set():
@@ -168,6 +337,8 @@ def monitor_channel(channel_name, channel_info):
     except Exception as e:
         logger.error(f"Критическая ошибка при мониторинге канала {channel_name}: {e}")
     finally:
+        if session is not None:
+            stream_multiplexer.release(session)
         logger.info(f"Мониторинг канала {channel_name} завершен")
 
 def start_force_capture():
@@ -207,6 +378,7 @@ def stop_subprocesses():
                 logger.info(f"Поток {thread.name} уже завершён.")
         monitoring_threads.clear()
     stop_monitoring_event.clear()
+    logger.info(f"Отброшено кадров фильтром изменений: {get_dropped_frames()}")
     logger.info("Все потоки мониторинга остановлены")
 
 def main():
@@ -258,7 +430,7 @@ def main():
         stop_subprocesses()
 
 # Экспортируем необходимые функции
-__all__ = ['main', 'stop_subprocesses', 'start_force_capture', 'stop_force_capture']
+__all__ = ['main', 'stop_subprocesses', 'start_force_capture', 'stop_force_capture', 'get_dropped_frames', 'set_frame_queue']
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
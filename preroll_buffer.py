@@ -0,0 +1,281 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+import subprocess
+import concurrent.futures
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Параметры по умолчанию
+DEFAULT_SEGMENT_SECONDS = 6  # Длительность сегмента кольцевого буфера, сек
+DEFAULT_BUFFER_SECONDS = 300  # Сколько последних секунд потока хранится на диске
+DEFAULT_RECONNECT_DELAY = 1.0  # Начальная пауза перед перезапуском ffmpeg, сек
+MAX_RECONNECT_DELAY = 60.0  # Максимальная пауза перед перезапуском ffmpeg, сек
+
+
+def get_resource_path(filename, subdir="bin"):
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, subdir, filename)
+
+
+class ChannelRingBuffer:
+    """
+    Кольцевой буфер последних сегментов потока одного канала.
+
+    ffmpeg без перекодирования (-c copy) нарезает поток на сегменты
+    segment_seconds секунд и перезаписывает их по кругу (-segment_wrap),
+    поэтому на диске всегда лежат только последние buffer_seconds секунд.
+    Время сегмента определяется по времени изменения файла (конец сегмента).
+    При обрыве ffmpeg перезапускается с экспоненциальной задержкой.
+    """
+
+    def __init__(self, channel_name: str, url: str, directory: Path,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                 buffer_seconds: float = DEFAULT_BUFFER_SECONDS):
+        """
+        Инициализация буфера.
+
+        Args:
+            channel_name: Имя канала
+            url: URL видеопотока
+            directory: Папка сегментов канала
+            segment_seconds: Длительность сегмента, сек
+            buffer_seconds: Объем буфера, сек
+        """
+        self.channel_name = channel_name
+        self.url = url
+        self.directory = Path(directory)
+        self.segment_seconds = segment_seconds
+        self.max_segments = max(2, int(buffer_seconds // segment_seconds) + 1)
+        self.restarts = 0
+        self._stop_event = threading.Event()
+        self._process: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Очищает папку буфера и запускает фоновый поток ffmpeg.
+        """
+        if self.is_running():
+            return
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"preroll_{self.channel_name}",
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Кольцевой буфер {self.channel_name} запущен: {self.max_segments} сегментов по {self.segment_seconds} с")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Останавливает ffmpeg и фоновый поток. Сегменты на диске сохраняются до следующего запуска.
+        """
+        self._stop_event.set()
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        logger.info(f"Кольцевой буфер {self.channel_name} остановлен")
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _command(self) -> List[str]:
+        return [
+            get_resource_path("ffmpeg.exe"), "-hide_banner", "-loglevel", "error",
+            "-i", self.url,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(self.segment_seconds),
+            "-segment_wrap", str(self.max_segments),
+            "-segment_format", "mpegts",
+            "-reset_timestamps", "1",
+            str(self.directory / "seg_%03d.ts")
+        ]
+
+    def _run(self):
+        delay = DEFAULT_RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self._process = subprocess.Popen(
+                    self._command(), stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+                )
+                _, stderr = self._process.communicate()
+                if not self._stop_event.is_set():
+                    logger.warning(
+                        f"ffmpeg кольцевого буфера {self.channel_name} завершился (код {self._process.returncode}): "
+                        f"{stderr.decode(errors='ignore').strip()[-500:]}"
+                    )
+            except Exception as e:
+                logger.error(f"Ошибка запуска ffmpeg кольцевого буфера {self.channel_name}: {e}")
+            if self._stop_event.is_set():
+                break
+            # Долгая успешная работа — сбрасываем задержку перезапуска
+            if time.monotonic() - started > MAX_RECONNECT_DELAY:
+                delay = DEFAULT_RECONNECT_DELAY
+            self.restarts += 1
+            logger.info(f"Перезапуск кольцевого буфера {self.channel_name} через {delay:.0f} сек")
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def segments(self, start: float, end: float) -> List[Path]:
+        """
+        Сегменты, пересекающиеся с интервалом [start, end] (время time.time()), по порядку.
+        Последний (еще записываемый) сегмент не включается.
+        """
+        files = []
+        for path in self.directory.glob("seg_*.ts"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        # Самый свежий файл еще дописывается ffmpeg
+        files = files[:-1]
+        return [
+            path for mtime, path in files
+            if mtime >= start and mtime - self.segment_seconds <= end
+        ]
+
+
+class PrerollBuffer:
+    """
+    Кольцевые буферы всех каналов и выгрузка роликов вокруг найденных ключевых слов.
+
+    export() ждет, пока в буфер попадут post секунд после срабатывания,
+    и склеивает сегменты [срабатывание - pre, срабатывание + post] в mp4
+    без перекодирования. Срабатывания, попадающие в уже выгружаемый
+    интервал канала, новых роликов не создают.
+    """
+
+    def __init__(self):
+        self.buffers: Dict[str, ChannelRingBuffer] = {}
+        self.root = Path("preroll")
+        self.clips_dir = Path("preroll_clips")
+        self.pre_seconds = 30.0
+        self.post_seconds = 30.0
+        self._covered_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def configure(self, channels: Dict[str, str], root: str = "preroll",
+                  segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                  buffer_seconds: float = DEFAULT_BUFFER_SECONDS,
+                  pre_seconds: float = 30.0, post_seconds: float = 30.0):
+        """
+        Запускает буферы для каналов.
+
+        Args:
+            channels: Канал -> URL потока
+            root: Корневая папка сегментов
+            segment_seconds: Длительность сегмента, сек
+            buffer_seconds: Объем буфера каждого канала, сек (не меньше pre + post)
+            pre_seconds: Сколько секунд до срабатывания попадает в ролик
+            post_seconds: Сколько секунд после срабатывания попадает в ролик
+        """
+        self.stop_all()
+        self.root = Path(root)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        # Буфер должен вмещать весь ролик и запас на позднюю обработку срабатывания
+        buffer_seconds = max(buffer_seconds, pre_seconds + post_seconds + 2 * segment_seconds)
+        # Выгрузка ждет post секунд после срабатывания — по обработчику на канал
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(channels)), thread_name_prefix="preroll_export"
+        )
+        for channel_name, url in channels.items():
+            buffer = ChannelRingBuffer(channel_name, url, self.root / channel_name, segment_seconds, buffer_seconds)
+            self.buffers[channel_name] = buffer
+            buffer.start()
+
+    def is_enabled(self, channel_name: str) -> bool:
+        return channel_name in self.buffers
+
+    def export(self, channel_name: str, hit_time: datetime) -> Optional[concurrent.futures.Future]:
+        """
+        Планирует выгрузку ролика вокруг срабатывания.
+
+        Returns:
+            Future с путем к ролику (или None при ошибке); None, если канал
+            без буфера или срабатывание уже покрыто выгружаемым роликом
+        """
+        buffer = self.buffers.get(channel_name)
+        if buffer is None or self._executor is None:
+            return None
+        hit = hit_time.timestamp()
+        with self._lock:
+            if hit <= self._covered_until.get(channel_name, 0.0):
+                logger.info(f"Срабатывание {channel_name} в {hit_time:%H:%M:%S} уже входит в выгружаемый ролик")
+                return None
+            self._covered_until[channel_name] = hit + self.post_seconds
+        return self._executor.submit(self._export, buffer, hit)
+
+    def _export(self, buffer: ChannelRingBuffer, hit: float) -> Optional[str]:
+        start, end = hit - self.pre_seconds, hit + self.post_seconds
+        # Ждем, пока сегмент с концом интервала будет дописан
+        wait = end + buffer.segment_seconds - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        segments = buffer.segments(start, end)
+        if not segments:
+            logger.warning(f"В буфере {buffer.channel_name} нет сегментов для {datetime.fromtimestamp(hit):%H:%M:%S}")
+            return None
+        output_dir = self.clips_dir / buffer.channel_name
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f"{buffer.channel_name}_hit_{datetime.fromtimestamp(hit):%Y-%m-%d_%H-%M-%S}.mp4"
+        concat_list = output_dir / f"{output_path.stem}.txt"
+        try:
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                for segment in segments:
+                    f.write(f"file '{segment.resolve().as_posix()}'\n")
+            cmd = [
+                get_resource_path("ffmpeg.exe"), "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "concat", "-safe", "0", "-i", str(concat_list),
+                "-c", "copy", "-bsf:a", "aac_adtstoasc",
+                str(output_path)
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                logger.error(f"Ошибка ffmpeg при выгрузке ролика {buffer.channel_name}: {result.stderr.decode(errors='ignore')}")
+                return None
+            logger.info(f"Ролик {output_path.name} выгружен из буфера: {len(segments)} сегментов")
+            return str(output_path)
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки ролика {buffer.channel_name}: {e}")
+            return None
+        finally:
+            concat_list.unlink(missing_ok=True)
+
+    def stop_all(self):
+        """
+        Останавливает буферы и отменяет еще не начатые выгрузки.
+        """
+        for buffer in self.buffers.values():
+            buffer.stop()
+        self.buffers.clear()
+        self._covered_until.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальные кольцевые буферы каналов
+preroll_buffer = PrerollBuffer()
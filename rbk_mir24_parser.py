@@ -5,11 +5,11 @@ import asyncio
 import subprocess
 import urllib.request
 from datetime import datetime
-import cv2
 import numpy as np
 from utils import setup_logging
 from pathlib import Path
 from config_manager import config_manager
+from video_recorder import video_recorder
 import threading
 from typing import Optional, List, Dict, Any
 from tkinter import messagebox
@@ -20,7 +20,7 @@ from parser_lines import main as start_lines_monitoring, stop_subprocesses, star
 logger = setup_logging('rbk_mir24_parser_log.txt')
 base_dir = Path("video").resolve()  # Абсолютный путь для надежности
 LINES_VIDEO_ROOT = Path("lines_video").resolve()  # Для crop-роликов
-VIDEO_DURATION = 240  # 240 секунд
+VIDEO_DURATION = 240  # Длительность записи, если у канала не задан default_duration, сек
 
 def get_resource_path(filename, subdir="bin"):
     if getattr(sys, 'frozen', False):
@@ -131,67 +131,21 @@ async def validate_crop_params(channel_name, channel_info, resolution):
 async def record_video_opencv(channel_name, stream_url, output_path, crop_params, duration):
     """
     Запись видео с использованием OpenCV.
+    Запись выполняется в отдельном потоке (video_recorder), кадры берутся
+    из общей сессии потока (stream_multiplexer), поэтому одновременные записи
+    каналов не блокируют цикл событий и не открывают поток повторно.
+
+    Returns:
+        Статистика записи (кадры, достигнутый fps и fps источника)
     """
-    try:
-        cap = cv2.VideoCapture(stream_url)
-        if not cap.isOpened():
-            logger.error(f"Не удалось открыть видеопоток для {channel_name}: {stream_url}")
-            return
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps <= 0:
-            fps = 25.0
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        if crop_params:
-            try:
-                crop_str = crop_params.replace("crop=", "")
-                crop_width, crop_height, x, y = map(int, crop_str.split(":"))
-                width, height = crop_width, crop_height
-            except Exception as e:
-                logger.error(f"Ошибка при парсинге crop для {channel_name}: {e}")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        if not out.isOpened():
-            logger.error(f"Не удалось создать VideoWriter для {channel_name}")
-            cap.release()
-            return
-        start_time = asyncio.get_event_loop().time()
-        frame_count = 0
-        logger.info(f"Начало записи видео для {channel_name}")
-        while True:
-            if stop_monitoring_event.is_set():
-                logger.info(f"Остановка записи видео для {channel_name} по флагу stop_monitoring_event")
-                break
-            if asyncio.get_event_loop().time() - start_time >= duration:
-                break
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                logger.warning(f"Не удалось прочитать кадр {frame_count} для {channel_name}")
-                break
-            if crop_params:
-                try:
-                    crop_str = crop_params.replace("crop=", "")
-                    crop_width, crop_height, x, y = map(int, crop_str.split(":"))
-                    frame = frame[y:y+crop_height, x:x+crop_width]
-                except Exception as e:
-                    logger.error(f"Ошибка при применении crop для кадра {frame_count} в {channel_name}: {e}")
-            out.write(frame)
-            frame_count += 1
-            await asyncio.sleep(0.001)
-        cap.release()
-        out.release()
-        logger.info(f"Запись завершена для {channel_name}: {frame_count} кадров")
-    except Exception as e:
-        logger.error(f"Ошибка при записи видео для {channel_name}: {e}")
-        try:
-            cap.release()
-            out.release()
-        except:
-            pass
+    return await video_recorder.record(
+        channel_name, stream_url, output_path, crop_params, duration, stop_event=stop_monitoring_event
+    )
 
 async def record_lines_video(channel_name, channel_info, duration=VIDEO_DURATION):
     """
     Записывает crop-ролик в lines_video/<channel>/.
+    Длительность (сек) берется из таблицы длительностей по слоту расписания.
     """
     try:
         if not LINES_VIDEO_ROOT.exists():
@@ -218,8 +172,13 @@ async def record_lines_video(channel_name, channel_info, duration=VIDEO_DURATION
         if stop_monitoring_event.is_set():
             logger.info(f"Остановка записи crop-видео для {channel_name} по флагу stop_monitoring_event")
             return
-        await record_video_opencv(channel_name, channel_info["url"], output_path, crop_filter, duration)
+        stats = await record_video_opencv(channel_name, channel_info["url"], output_path, crop_filter, duration)
+        if not stats['frames']:
+            logger.error(f"Crop-видео для {channel_name} не записано")
+            return
         logger.info(f"Crop-видео для {channel_name} сохранено: {output_path}")
+        if stats['keywords']:
+            logger.info(f"Во время записи {channel_name} найдены ключевые слова: {', '.join(stats['keywords'])}")
     except Exception as e:
         logger.error(f"Ошибка при записи crop-видео для {channel_name}: {e}")
 
@@ -267,15 +226,17 @@ async def process_rbk_mir24(app, ui, send_files=False, channels=None, force_crop
                 continue
             info = channels_data[name]
             lines_times = set(info.get("lines", []))
+            # Длительность слота: special_durations, иначе default_duration канала (в минутах)
+            duration = config_manager.get_recording_duration(name, now_str, VIDEO_DURATION)
             if force_crop:
-                logger.info(f"{name}: ручной запуск — запись crop-ролика (lines_video)")
-                task = asyncio.create_task(record_lines_video(name, info, VIDEO_DURATION))
+                logger.info(f"{name}: ручной запуск — запись crop-ролика (lines_video), {duration} с")
+                task = asyncio.create_task(record_lines_video(name, info, duration))
                 record_tasks.append(task)
                 recorded_videos.append({"channel": name, "type": "crop"})
             else:
                 if now_str in lines_times:
-                    logger.info(f"{name}: {now_str} найдено в lines — запись crop-ролика (lines_video)")
-                    task = asyncio.create_task(record_lines_video(name, info, VIDEO_DURATION))
+                    logger.info(f"{name}: {now_str} найдено в lines — запись crop-ролика (lines_video), {duration} с")
+                    task = asyncio.create_task(record_lines_video(name, info, duration))
                     record_tasks.append(task)
                     recorded_videos.append({"channel": name, "type": "crop"})
                 else:
@@ -513,7 +474,14 @@ class RBKMIR24Manager:
         Запуск мониторинга строк (скриншотов) для RBK и MIR24 по расписанию.
         Args:
             channels: Список каналов для мониторинга. Если None, используются RBK и MIR24.
+        Мониторинг останавливается по самой длинной длительности слота среди каналов.
         """
+        slot = get_current_time_str()
+        duration = max(
+            config_manager.get_recording_duration(channel, slot, VIDEO_DURATION)
+            for channel in (channels or ['RBK', 'MIR24'])
+        )
+
         def run_and_process():
             try:
                 channel_names = ', '.join(channels) if channels else "RBK+MIR24"
@@ -527,10 +495,10 @@ class RBKMIR24Manager:
                 self.lines_monitoring_thread = thread
                 
                 self.ui.update_lines_status(f"Запущен ({channel_names})")
-                logger.info(f"Запущен мониторинг строк для {channel_names} по расписанию")
+                logger.info(f"Запущен мониторинг строк для {channel_names} по расписанию на {duration} с (слот {slot})")
                 
                 # Таймер для автоматической остановки
-                timer = threading.Timer(VIDEO_DURATION, self.stop_lines_monitoring)
+                timer = threading.Timer(duration, self.stop_lines_monitoring)
                 timer.start()
                 
                 thread.join()
@@ -0,0 +1,122 @@
+from functools import lru_cache
+
+# Стеммер русского языка по алгоритму Snowball (Porter):
+# https://snowballstem.org/algorithms/russian/stemmer.html
+
+VOWELS = set("аеиоуыэюя")
+
+PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")
+PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+REFLEXIVE = ("ся", "сь")
+VERB_1 = (
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны",
+    "ть", "ешь", "нно",
+)
+VERB_2 = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им",
+    "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть",
+    "ишь", "ую", "ю",
+)
+NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей",
+    "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях",
+    "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _longest(word, endings):
+    """
+    Самое длинное окончание из endings, которым заканчивается word, или None.
+    """
+    best = None
+    for ending in endings:
+        if word.endswith(ending) and (best is None or len(ending) > len(best)):
+            best = ending
+    return best
+
+
+def _remove(rv, endings, after_a=()):
+    """
+    Удаляет самое длинное окончание из endings и after_a (для окончаний after_a
+    перед ними должна стоять 'а' или 'я'). Возвращает (rv, удалено ли окончание).
+    """
+    ending = _longest(rv, endings + after_a)
+    if ending is None:
+        return rv, False
+    if ending not in endings:
+        if len(rv) <= len(ending) or rv[-len(ending) - 1] not in "ая":
+            return rv, False
+    return rv[:-len(ending)], True
+
+
+def _gopast(word, position, vowel):
+    """
+    Позиция сразу после первой гласной (vowel=True) или согласной, начиная с position.
+    """
+    while position < len(word) and (word[position] in VOWELS) != vowel:
+        position += 1
+    return min(position + 1, len(word))
+
+
+def _regions(word):
+    """
+    Границы областей RV и R2 (индексы начала).
+    """
+    rv = _gopast(word, 0, True)
+    # R1 — после первой согласной, следующей за гласной; R2 — то же внутри R1
+    r1 = _gopast(word, rv, False)
+    r2 = _gopast(word, _gopast(word, r1, True), False)
+    return rv, r2
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """
+    Возвращает основу русского слова (нижний регистр, 'ё' заменяется на 'е').
+    """
+    word = word.lower().replace("ё", "е")
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    rv, removed = _remove(rv, PERFECTIVE_GERUND_2, PERFECTIVE_GERUND_1)
+    if not removed:
+        rv, _ = _remove(rv, REFLEXIVE)
+        ending = _longest(rv, ADJECTIVE)
+        if ending is not None:
+            rv = rv[:-len(ending)]
+            rv, _ = _remove(rv, PARTICIPLE_2, PARTICIPLE_1)
+        else:
+            rv, removed = _remove(rv, VERB_2, VERB_1)
+            if not removed:
+                rv, _ = _remove(rv, NOUN)
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные окончания только в R2
+    ending = _longest(rv, DERIVATIONAL)
+    if ending is not None and rv_start + len(rv) - len(ending) >= r2_start:
+        rv = rv[:-len(ending)]
+
+    # Шаг 4
+    ending = _longest(rv, SUPERLATIVE)
+    if ending is not None:
+        rv = rv[:-len(ending)]
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+    elif rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+
+    return prefix + rv
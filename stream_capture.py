@@ -0,0 +1,431 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Параметры переподключения по умолчанию
+DEFAULT_RECONNECT_DELAY = 1.0  # Начальная пауза перед переподключением, сек
+MAX_RECONNECT_DELAY = 60.0  # Максимальная пауза между попытками, сек
+
+
+def parse_crop(crop_params: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Парсит строку crop (формат: crop=width:height:x:y).
+
+    Returns:
+        Кортеж (width, height, x, y) или None, если crop не задан или некорректен
+    """
+    if not crop_params:
+        return None
+    try:
+        width, height, x, y = map(int, crop_params.replace("crop=", "").split(":"))
+    except (ValueError, AttributeError):
+        logger.error(f"Некорректные параметры crop: {crop_params}")
+        return None
+    if width <= 0 or height <= 0 or x < 0 or y < 0:
+        logger.error(f"Недействительные параметры crop: {crop_params}")
+        return None
+    return width, height, x, y
+
+
+class StreamSession:
+    """
+    Долгоживущая сессия чтения видеопотока.
+
+    Фоновый поток держит один открытый cv2.VideoCapture, непрерывно читает
+    поток (grab) и преобразует кадр в изображение (retrieve) только когда
+    его кто-то запросил или когда подошла очередь хотя бы одного подписчика
+    (см. FrameSubscription.is_due). При обрыве соединения сессия
+    переподключается с экспоненциальной задержкой.
+    """
+
+    def __init__(self, name: str, url: str,
+                 reconnect_delay: float = DEFAULT_RECONNECT_DELAY,
+                 max_reconnect_delay: float = MAX_RECONNECT_DELAY):
+        """
+        Инициализация сессии.
+
+        Args:
+            name: Имя сессии (используется в логах и имени потока)
+            url: URL видеопотока
+            reconnect_delay: Начальная пауза перед переподключением
+            max_reconnect_delay: Максимальная пауза перед переподключением
+        """
+        self.name = name
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._stop_event = threading.Event()
+        self._frame_requested = threading.Event()
+        self._cond = threading.Condition()
+        self._latest_frame: Optional[np.ndarray] = None
+        self._latest_frame_time = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._subscribers: List["FrameSubscription"] = []
+        self._subscribers_lock = threading.Lock()
+        self.connected = False
+        self.reconnects = 0
+        self.fps = 0.0
+        self.last_grab_time = 0.0
+
+    def start(self):
+        """
+        Запускает фоновый поток чтения.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.last_grab_time = time.time()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"stream_{self.name}",
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Сессия потока {self.name} запущена: {self.url}")
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Останавливает фоновый поток и освобождает VideoCapture.
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logger.warning(f"Поток сессии {self.name} не завершился за {timeout} сек")
+        self._thread = None
+        logger.info(f"Сессия потока {self.name} остановлена")
+
+    def is_running(self) -> bool:
+        """
+        Проверяет, работает ли фоновый поток сессии.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_subscriber(self, subscriber: "FrameSubscription"):
+        """
+        Добавляет подписчика, получающего каждый декодированный кадр.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+
+    def remove_subscriber(self, subscriber: "FrameSubscription"):
+        """
+        Удаляет подписчика.
+        """
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _has_due_subscriber(self, frame_time: float) -> bool:
+        """
+        Проверяет, ждет ли кадр хотя бы один подписчик (с учетом его min_interval).
+        """
+        with self._subscribers_lock:
+            return any(subscriber.is_due(frame_time) for subscriber in self._subscribers)
+
+    def _dispatch(self, frame: np.ndarray, frame_time: float):
+        """
+        Раздает кадр всем подписчикам.
+        """
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.push(frame, frame_time)
+            except Exception as e:
+                logger.error(f"Ошибка подписчика {subscriber.name} потока {self.name}: {e}")
+
+    def get_frame(self, timeout: float = 10.0) -> Optional[np.ndarray]:
+        """
+        Возвращает свежий кадр потока (декодированный после вызова).
+
+        Args:
+            timeout: Максимальное время ожидания кадра, сек
+        Returns:
+            Кадр в формате BGR или None, если кадр не получен за timeout
+        """
+        frame, _ = self.get_frame_with_time(timeout)
+        return frame
+
+    def get_frame_with_time(self, timeout: float = 10.0) -> Tuple[Optional[np.ndarray], float]:
+        """
+        Возвращает свежий кадр потока и время его получения (time.time()).
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            requested_at = time.time()
+            self._frame_requested.set()
+            while self._latest_frame_time < requested_at:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stop_event.is_set():
+                    return None, 0.0
+                self._cond.wait(remaining)
+            return self._latest_frame, self._latest_frame_time
+
+    def _open(self):
+        """
+        Открывает VideoCapture для URL потока.
+        """
+        cap = cv2.VideoCapture(self.url)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _run(self):
+        """
+        Основной цикл фонового потока: чтение кадров и переподключение.
+        """
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            cap = self._open()
+            if cap is None:
+                logger.error(f"Не удалось открыть видеопоток {self.name}, повтор через {delay:.0f} сек")
+                if self._stop_event.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self.connected = True
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps and fps > 0 else 25.0
+            logger.info(f"Видеопоток {self.name} открыт (fps: {self.fps})")
+            try:
+                while not self._stop_event.is_set():
+                    if not cap.grab():
+                        logger.warning(f"Обрыв видеопотока {self.name}")
+                        break
+                    # Успешное чтение — сбрасываем задержку переподключения
+                    delay = self.reconnect_delay
+                    self.last_grab_time = time.time()
+                    frame_time = time.time()
+                    if not self._frame_requested.is_set() and not self._has_due_subscriber(frame_time):
+                        continue
+                    ret, frame = cap.retrieve()
+                    if not ret or frame is None:
+                        continue
+                    with self._cond:
+                        self._latest_frame = frame
+                        self._latest_frame_time = frame_time
+                        self._frame_requested.clear()
+                        self._cond.notify_all()
+                    self._dispatch(frame, frame_time)
+            except cv2.error as e:
+                logger.error(f"OpenCV ошибка при чтении потока {self.name}: {e}")
+            finally:
+                self.connected = False
+                cap.release()
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            logger.info(f"Переподключение к потоку {self.name} через {delay:.0f} сек")
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+
+class FrameSubscription:
+    """
+    Подписка на кадры общего потока с собственным crop.
+
+    Кадры кладутся в ограниченную очередь; при переполнении вытесняются
+    самые старые. Обрезанная область копируется, чтобы не удерживать
+    в памяти полный кадр.
+    """
+
+    def __init__(self, multiplexer: "StreamMultiplexer", session: StreamSession, name: str,
+                 crop_params: Optional[str] = None, maxsize: int = 1, min_interval: float = 0.0):
+        """
+        Инициализация подписки.
+
+        Args:
+            multiplexer: Мультиплексор, выдавший подписку
+            session: Сессия потока
+            name: Имя потребителя (канал, окно предпросмотра и т.п.)
+            crop_params: Параметры crop (формат: crop=width:height:x:y)
+            maxsize: Размер очереди кадров
+            min_interval: Минимальный интервал между принимаемыми кадрами, сек
+        """
+        self.multiplexer = multiplexer
+        self.session = session
+        self.name = name
+        self.crop = parse_crop(crop_params)
+        self.min_interval = min_interval
+        self.last_frame: Optional[np.ndarray] = None
+        self.last_frame_time = 0.0
+        self.dropped = 0
+        self._queue = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self._released = False
+
+    def _crop(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Обрезает кадр; при выходе crop за границы кадра возвращает полный кадр.
+        """
+        if self.crop is None:
+            return frame
+        width, height, x, y = self.crop
+        h, w = frame.shape[:2]
+        if x + width > w or y + height > h:
+            return frame
+        return frame[y:y+height, x:x+width].copy()
+
+    def is_due(self, frame_time: float) -> bool:
+        """
+        Проверяет, примет ли подписка кадр с временем frame_time (истек ли min_interval).
+        """
+        return not self.min_interval or frame_time - self.last_frame_time >= self.min_interval
+
+    def push(self, frame: np.ndarray, frame_time: float):
+        """
+        Принимает кадр от сессии (вызывается из потока чтения).
+        """
+        if not self.is_due(frame_time):
+            return
+        frame = self._crop(frame)
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((frame, frame_time))
+            self.last_frame = frame
+            self.last_frame_time = frame_time
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Возвращает следующий кадр из очереди.
+
+        Args:
+            timeout: Время ожидания кадра, сек (0 — не ждать, None — ждать без ограничения)
+        Returns:
+            Кадр или None, если кадр не получен
+        """
+        with self._cond:
+            if not self._queue and timeout != 0:
+                self._cond.wait_for(lambda: self._queue or self._released, timeout)
+            if not self._queue:
+                return None
+            frame, _ = self._queue.popleft()
+            return frame
+
+    def is_active(self) -> bool:
+        """
+        Проверяет, что подписка не освобождена и сессия потока работает.
+        """
+        return not self._released and self.session.is_running()
+
+    def release(self):
+        """
+        Отписывается от потока. Сессия останавливается, когда у нее не остается потребителей.
+        """
+        if self._released:
+            return
+        self._released = True
+        self.session.remove_subscriber(self)
+        with self._cond:
+            self._cond.notify_all()
+        self.multiplexer.release(self.session)
+
+
+class StreamMultiplexer:
+    """
+    Мультиплексор видеопотоков: одна сессия (одно декодирование) на URL,
+    сколько бы каналов, записей и окон предпросмотра его ни использовали.
+    Потребители считаются по объекту сессии: если упавшая сессия заменена
+    новой, освобождение старой не уменьшает счетчик новой.
+    """
+
+    def __init__(self):
+        """
+        Инициализация мультиплексора.
+        """
+        self._sessions: Dict[str, StreamSession] = {}
+        self._refcounts: Dict[StreamSession, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str, name: Optional[str] = None) -> StreamSession:
+        """
+        Возвращает сессию для URL, создавая и запуская ее при первом обращении.
+        Каждый вызов acquire должен сопровождаться вызовом release с полученной сессией.
+        """
+        with self._lock:
+            session = self._sessions.get(url)
+            if session is None or not session.is_running():
+                # Потребители упавшей сессии освобождают ее сами, счетчик новой начинается с нуля
+                session = StreamSession(name or url, url)
+                session.start()
+                self._sessions[url] = session
+                self._refcounts[session] = 0
+            self._refcounts[session] += 1
+            logger.info(f"Поток {session.name}: потребителей {self._refcounts[session]}")
+            return session
+
+    def release(self, session: StreamSession):
+        """
+        Освобождает сессию; при отсутствии потребителей сессия останавливается.
+        """
+        with self._lock:
+            if session not in self._refcounts:
+                return
+            self._refcounts[session] -= 1
+            if self._refcounts[session] > 0:
+                return
+            del self._refcounts[session]
+            # Замененная сессия уже не числится за URL
+            if self._sessions.get(session.url) is session:
+                del self._sessions[session.url]
+        session.stop()
+
+    def reacquire(self, session: StreamSession, name: Optional[str] = None) -> StreamSession:
+        """
+        Заменяет упавшую или зависшую сессию потребителя новой.
+
+        Старая сессия перестает выдаваться по URL (остальные ее потребители
+        переходят на новую при своем reacquire или acquire) и останавливается,
+        когда у нее не остается потребителей.
+        """
+        with self._lock:
+            if self._sessions.get(session.url) is session:
+                del self._sessions[session.url]
+        self.release(session)
+        return self.acquire(session.url, name)
+
+    def subscribe(self, url: str, name: str, crop_params: Optional[str] = None,
+                  maxsize: int = 1, min_interval: float = 0.0) -> FrameSubscription:
+        """
+        Создает подписку на все кадры потока с указанным crop.
+        """
+        session = self.acquire(url, name)
+        subscription = FrameSubscription(self, session, name, crop_params, maxsize, min_interval)
+        session.add_subscriber(subscription)
+        return subscription
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Возвращает количество потребителей для каждого открытого потока.
+        """
+        with self._lock:
+            return {session.name: self._refcounts.get(session, 0) for session in self._sessions.values()}
+
+    def stop_all(self):
+        """
+        Останавливает все сессии.
+        """
+        with self._lock:
+            sessions = list(set(self._sessions.values()) | set(self._refcounts))
+            self._sessions.clear()
+            self._refcounts.clear()
+        for session in sessions:
+            session.stop()
+
+
+# Глобальный мультиплексор потоков
+stream_multiplexer = StreamMultiplexer()
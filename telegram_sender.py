@@ -1,8 +1,12 @@
 import os
 import sys
+import time
+import asyncio
 import logging
-from datetime import datetime
-from telegram import Bot
+import threading
+import concurrent.futures
+from datetime import datetime, timedelta
+from telegram import Bot, InputMediaDocument
 from telegram.constants import ParseMode
 from telegram.request import HTTPXRequest
 from PIL import Image
@@ -13,7 +17,9 @@ from pathlib import Path
 import cv2
 import tempfile
 import json
+import hashlib
 from logging.handlers import RotatingFileHandler
+from event_store import event_store
 
 def get_resource_path(filename, subdir=""):
     if getattr(sys, 'frozen', False):
@@ -64,6 +70,14 @@ def load_config():
         'max_video_size': 50 * 1024 * 1024,  # 50MB
         'telegram_timeout': 600.0,  # 10 минут
         'telegram_connect_timeout': 60.0,  # 1 минута
+        'telegram_pool_size': 8,
+        'telegram_chat_check_ttl': 600,
+        'telegram_workers': 2,
+        'telegram_chat_interval': 1.0,
+        'outbox_dir': 'outbox',
+        'outbox_max_attempts': 10,
+        'outbox_retry_base': 30,
+        'outbox_retry_max': 3600,
     }
     
     config_file = get_resource_path('config.json', '')
@@ -127,6 +141,17 @@ try:
     # Увеличенные таймауты для отправки больших файлов
     TELEGRAM_TIMEOUT = config['telegram_timeout']
     TELEGRAM_CONNECT_TIMEOUT = config['telegram_connect_timeout']
+    # Постоянный клиент: размер пула соединений и срок кэширования доступности чатов
+    TELEGRAM_POOL_SIZE = int(config['telegram_pool_size'])
+    TELEGRAM_CHAT_CHECK_TTL = float(config['telegram_chat_check_ttl'])
+    # Число одновременных отправок и минимальный интервал между сообщениями в один чат
+    TELEGRAM_WORKERS = max(1, int(config['telegram_workers']))
+    TELEGRAM_CHAT_INTERVAL = float(config['telegram_chat_interval'])
+    # Очередь отправки: папка файлов, число попыток и экспоненциальная задержка повторов
+    OUTBOX_DIR = Path(config['outbox_dir'])
+    OUTBOX_MAX_ATTEMPTS = int(config['outbox_max_attempts'])
+    OUTBOX_RETRY_BASE = float(config['outbox_retry_base'])
+    OUTBOX_RETRY_MAX = float(config['outbox_retry_max'])
     
     logger.info("Конфигурация успешно загружена")
     
@@ -144,6 +169,43 @@ except Exception as e:
     MAX_VIDEO_SIZE = 50 * 1024 * 1024
     TELEGRAM_TIMEOUT = 600.0
     TELEGRAM_CONNECT_TIMEOUT = 60.0
+    TELEGRAM_POOL_SIZE = 8
+    TELEGRAM_CHAT_CHECK_TTL = 600.0
+    TELEGRAM_WORKERS = 2
+    TELEGRAM_CHAT_INTERVAL = 1.0
+    OUTBOX_DIR = Path("outbox")
+    OUTBOX_MAX_ATTEMPTS = 10
+    OUTBOX_RETRY_BASE = 30.0
+    OUTBOX_RETRY_MAX = 3600.0
+
+# Максимальное число файлов в одной медиагруппе Telegram (sendMediaGroup)
+MEDIA_GROUP_SIZE = 10
+# Очередь отправки: как часто она проверяется, если диспетчер не разбужен
+OUTBOX_POLL_INTERVAL = 5.0
+
+
+class ChatRateLimiter:
+    """
+    Ограничение частоты сообщений в каждый чат: не чаще одного раза в interval секунд.
+    Слоты резервируются под блокировкой потока, поэтому ограничитель работает
+    и в цикле службы отправки, и в разовых asyncio.run.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    async def wait(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(chat_id, now))
+            self._next_slot[chat_id] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+chat_rate_limiter = ChatRateLimiter(TELEGRAM_CHAT_INTERVAL)
 
 def compress_video(input_path, output_path=None, target_size_mb=45):
     """
@@ -191,6 +253,65 @@ def compress_video(input_path, output_path=None, target_size_mb=45):
         logger.error(f"Ошибка при сжатии видео {input_path}: {e}")
         return None
 
+def recompress_video(input_path):
+    """
+    Дополнительное сжатие видео: fps=10, кадры пережимаются через JPEG качества 70.
+    Возвращает путь к временному файлу или None.
+    """
+    cap = cv2.VideoCapture(str(input_path))
+    if not cap.isOpened():
+        logger.error(f"Не удалось открыть видео для дополнительного сжатия: {input_path}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    new_fps = min(fps, 10) if fps > 0 else 10
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+    temp_output.close()
+    out = cv2.VideoWriter(temp_output.name, fourcc, new_fps, (width, height))
+    frame_count = 0
+    frame_skip = max(1, int(fps / new_fps)) if fps > 0 else 1
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_skip == 0:
+            # Доп. сжатие JPEG качества
+            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
+            result, encimg = cv2.imencode('.jpg', frame, encode_param)
+            if result:
+                frame = cv2.imdecode(encimg, 1)
+            out.write(frame)
+        frame_count += 1
+    cap.release()
+    out.release()
+    logger.info(f"Дополнительное сжатие завершено: {temp_output.name}")
+    return temp_output.name
+
+def show_user_warning(title, message, error=False):
+    """
+    Показывает пользователю окно с предупреждением (или пишет в лог, если окно недоступно).
+    """
+    try:
+        import tkinter
+        from tkinter import messagebox
+        root = None
+        # Попытка найти уже существующий root
+        for widget in tkinter._default_root.children.values():
+            if isinstance(widget, tkinter.Tk):
+                root = widget
+                break
+        if root is None:
+            root = tkinter.Tk()
+            root.withdraw()
+        if error:
+            messagebox.showerror(title, message)
+        else:
+            messagebox.showwarning(title, message)
+    except Exception:
+        logger.warning(f"[UI] {message}")
+
 def process_image(image_path):
     """
     Обработка изображения для соответствия требованиям Telegram.
@@ -231,9 +352,10 @@ def process_image(image_path):
         logger.error(f"Ошибка при обработке изображения {image_path}: {e}")
         raise
 
-async def send_to_telegram(excel_file, screenshot_files):
+async def send_to_telegram(excel_file, screenshot_files, bot=None, available_chats=None):
     """
     Асинхронная отправка Excel-файла и скриншотов в Telegram.
+    bot и available_chats передает служба доставки; без них бот создается на один вызов.
     """
     try:
         # Проверяем конфигурацию
@@ -255,21 +377,9 @@ async def send_to_telegram(excel_file, screenshot_files):
             except Exception as e:
                 logger.error(f"Ошибка при создании директории processed_dir: {e}")
         
-        # Используем увеличенные таймауты
-        httpx_request = HTTPXRequest(read_timeout=TELEGRAM_TIMEOUT, connect_timeout=TELEGRAM_CONNECT_TIMEOUT)
-        bot = Bot(token=TELEGRAM_TOKEN, request=httpx_request)
+        if bot is None:
+            bot, available_chats = await _create_bot()
         sent_files = []  # Список для отслеживания успешно отправленных файлов
-        available_chats = []  # Список доступных чатов
-
-        # Проверяем доступность чатов
-        for chat_id in CHAT_IDS:
-            try:
-                await bot.get_chat(chat_id)
-                logger.info(f"Chat {chat_id} is available")
-                available_chats.append(chat_id)
-            except Exception as e:
-                logger.error(f"Chat {chat_id} is not available: {e}")
-                continue
 
         if not available_chats:
             logger.error("No available chats found")
@@ -310,6 +420,7 @@ async def send_to_telegram(excel_file, screenshot_files):
                             try:
                                 for chat_id in available_chats:
                                     try:
+                                        await chat_rate_limiter.wait(chat_id)
                                         await bot.send_message(
                                             chat_id=chat_id,
                                             text=chunk,
@@ -317,7 +428,6 @@ async def send_to_telegram(excel_file, screenshot_files):
                                         )
                                         logger.info(f"Sent recognized text to Telegram chat {chat_id} (попытка {attempt + 1})")
                                         text_sent = True
-                                        break
                                     except Exception as e:
                                         logger.error(f"Error sending text to chat {chat_id} (попытка {attempt + 1}): {e}")
                                         continue
@@ -330,7 +440,6 @@ async def send_to_telegram(excel_file, screenshot_files):
                                 logger.error(f"Ошибка при попытке {attempt + 1} отправки текста: {error_msg}")
                                 if "Timed out" in error_msg and attempt < max_retries - 1:
                                     logger.info(f"Таймаут при отправке текста, повторная попытка {attempt + 2}/{max_retries}")
-                                    import asyncio
                                     await asyncio.sleep(2)
                                     continue
                                 elif attempt == max_retries - 1:
@@ -342,24 +451,15 @@ async def send_to_telegram(excel_file, screenshot_files):
                 
                 for attempt in range(max_retries):
                     try:
-                        with open(excel_file, 'rb') as f:
-                            for chat_id in available_chats:
-                                try:
-                                    await bot.send_document(
-                                        chat_id=chat_id,
-                                        document=f,
-                                        caption=f"Running strings report {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                                        parse_mode=ParseMode.HTML
-                                    )
-                                    logger.info(f"Sent Excel file {excel_file} to Telegram chat {chat_id} (попытка {attempt + 1})")
-                                    sent_files.append(excel_file)
-                                    excel_sent = True
-                                    break
-                                except Exception as e:
-                                    logger.error(f"Error sending Excel to chat {chat_id} (попытка {attempt + 1}): {e}")
-                                    continue
-                        
-                        if excel_sent:
+                        # Файл загружается один раз, остальным чатам отправляется по file_id
+                        if await send_to_chats(
+                            bot, available_chats, 'document', excel_file,
+                            caption=f"Running strings report {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                            parse_mode=ParseMode.HTML
+                        ):
+                            logger.info(f"Sent Excel file {excel_file} to Telegram (попытка {attempt + 1})")
+                            sent_files.append(excel_file)
+                            excel_sent = True
                             break
                             
                     except Exception as e:
@@ -367,15 +467,17 @@ async def send_to_telegram(excel_file, screenshot_files):
                         logger.error(f"Ошибка при попытке {attempt + 1} отправки Excel файла: {error_msg}")
                         if "Timed out" in error_msg and attempt < max_retries - 1:
                             logger.info(f"Таймаут при отправке Excel, повторная попытка {attempt + 2}/{max_retries}")
-                            import asyncio
                             await asyncio.sleep(2)
                             continue
                         elif attempt == max_retries - 1:
                             logger.error(f"Все попытки отправки Excel файла исчерпаны")
+                if not excel_sent:
+                    logger.warning(f"Excel файл {excel_file} не отправлен ни в один чат")
 
-                # Отправляем скриншоты как документы
+                # Отправляем скриншоты как документы медиагруппами
                 if screenshot_files:
                     logger.info(f"Found {len(screenshot_files)} screenshot files to send")
+                    items = []
                     for screenshots in screenshot_files:
                         for screenshot in screenshots:
                             # Определяем путь и текст
@@ -390,53 +492,12 @@ async def send_to_telegram(excel_file, screenshot_files):
                                 timestamp = recognized_times.get(fname, '')
                                 # Формируем подпись
                                 caption = f"{channel}\n{timestamp}\n{text}".strip()
-                            
                             if os.path.exists(screenshot_path):
-                                try:
-                                    # Отправляем скриншот как документ с повторными попытками
-                                    screenshot_sent = False
-                                    max_retries = 3
-                                    
-                                    for attempt in range(max_retries):
-                                        try:
-                                            with open(screenshot_path, 'rb') as f:
-                                                for chat_id in available_chats:
-                                                    try:
-                                                        await bot.send_document(
-                                                            chat_id=chat_id,
-                                                            document=f,
-                                                            caption=caption if caption else None,
-                                                            parse_mode=ParseMode.HTML
-                                                        )
-                                                        logger.info(f"Sent screenshot {screenshot_path} to Telegram chat {chat_id} (попытка {attempt + 1})")
-                                                        sent_files.append(screenshot_path)
-                                                        screenshot_sent = True
-                                                        break
-                                                    except Exception as e:
-                                                        logger.error(f"Error sending screenshot to chat {chat_id} (попытка {attempt + 1}): {e}")
-                                                        continue
-                                            
-                                            if screenshot_sent:
-                                                break
-                                                
-                                        except Exception as e:
-                                            error_msg = str(e)
-                                            logger.error(f"Ошибка при попытке {attempt + 1} отправки скриншота {screenshot_path}: {error_msg}")
-                                            if "Timed out" in error_msg and attempt < max_retries - 1:
-                                                logger.info(f"Таймаут при отправке скриншота, повторная попытка {attempt + 2}/{max_retries}")
-                                                import asyncio
-                                                await asyncio.sleep(2)
-                                                continue
-                                            elif attempt == max_retries - 1:
-                                                logger.error(f"Все попытки отправки скриншота {screenshot_path} исчерпаны")
-                                    
-                                    if not screenshot_sent:
-                                        logger.warning(f"Не удалось отправить скриншот {screenshot_path} после {max_retries} попыток")
-                                        
-                                except Exception as e:
-                                    logger.error(f"Error sending screenshot {screenshot_path}: {e}")
+                                items.append((screenshot_path, caption))
                             else:
                                 logger.warning(f"Screenshot {screenshot_path} not found")
+                    results = await send_documents_grouped(items, bot, available_chats)
+                    sent_files.extend(path for (path, _), sent in zip(items, results) if sent)
                 else:
                     logger.info("No screenshots to send")
 
@@ -466,7 +527,6 @@ def send_report_files(excel_file, screenshot_files):
     """
     Отправка отчётных файлов в Telegram (синхронно).
     """
-    import asyncio
     try:
         # Проверяем существование Excel файла
         if not os.path.exists(excel_file):
@@ -502,16 +562,178 @@ def send_report_files(excel_file, screenshot_files):
         
         logger.info(f"Подготовлено для отправки: Excel файл + {len(valid_screenshots)} групп скриншотов")
         
-        asyncio.run(send_to_telegram(excel_file, valid_screenshots))
+        if delivery_service.running:
+            delivery_service.wait(delivery_service.enqueue_report(excel_file, valid_screenshots))
+        else:
+            asyncio.run(send_to_telegram(excel_file, valid_screenshots))
         logger.info("Files sent and deleted successfully")
         return True
     except Exception as e:
         logger.error(f"Failed to send files: {e}")
         return False
 
-async def send_files_with_caption(file_paths, caption=""):
+async def _create_bot():
+    """
+    Создает бота на один вызов и проверяет доступность чатов.
+    Returns:
+        (bot, список доступных чатов)
+    """
+    httpx_request = HTTPXRequest(read_timeout=TELEGRAM_TIMEOUT, connect_timeout=TELEGRAM_CONNECT_TIMEOUT)
+    bot = Bot(token=TELEGRAM_TOKEN, request=httpx_request)
+    available_chats = []
+    for chat_id in CHAT_IDS:
+        try:
+            await bot.get_chat(chat_id)
+            logger.info(f"Chat {chat_id} is available")
+            available_chats.append(chat_id)
+        except Exception as e:
+            logger.error(f"Chat {chat_id} is not available: {e}")
+            continue
+    return bot, available_chats
+
+# Метод бота и поле сообщения для каждого вида файла
+SEND_METHODS = {
+    'document': 'send_document',
+    'video': 'send_video',
+}
+
+def file_content_hash(file_path):
+    """
+    SHA-256 содержимого файла (ключ кэша file_id).
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _message_file_id(message, kind):
+    media = getattr(message, kind, None)
+    return getattr(media, 'file_id', None)
+
+async def send_to_chats(bot, chats, kind, file_path, **kwargs):
+    """
+    Отправляет файл во все чаты: байты загружаются один раз (в первый чат,
+    принявший файл), остальным чатам файл отправляется по полученному file_id.
+    file_id кэшируется по хешу содержимого в базе событий, поэтому повторная
+    отправка того же файла не загружает его снова.
+
+    Args:
+        kind: 'document' или 'video'
+        kwargs: Параметры метода отправки (caption, parse_mode, ...)
+    Returns:
+        Количество чатов, получивших файл
+    Raises:
+        Последнюю ошибку загрузки, если файл не получил ни один чат
+    """
+    method = getattr(bot, SEND_METHODS[kind])
+    content_hash = await asyncio.to_thread(file_content_hash, file_path)
+    file_id = await asyncio.to_thread(event_store.telegram_file_id, content_hash, kind)
+    delivered = 0
+    last_error = None
+    for chat_id in chats:
+        await chat_rate_limiter.wait(chat_id)
+        if file_id:
+            try:
+                await method(chat_id=chat_id, **{kind: file_id}, **kwargs)
+                delivered += 1
+                logger.info(f"Файл {file_path} отправлен в Telegram chat {chat_id} по file_id")
+                continue
+            except Exception as e:
+                logger.warning(f"file_id файла {file_path} не принят chat {chat_id}, файл будет загружен заново: {e}")
+                event_store.forget_telegram_file_id(content_hash, kind)
+                file_id = None
+        try:
+            with open(file_path, 'rb') as f:
+                message = await method(chat_id=chat_id, **{kind: f}, **kwargs)
+            delivered += 1
+            logger.info(f"Файл {file_path} загружен в Telegram chat {chat_id}")
+            file_id = _message_file_id(message, kind)
+            if file_id:
+                event_store.record_telegram_file_id(content_hash, kind, file_id)
+        except Exception as e:
+            last_error = e
+            logger.error(f"Ошибка отправки файла {file_path} в chat {chat_id}: {e}")
+    if not delivered and last_error is not None:
+        raise last_error
+    return delivered
+
+async def send_documents_grouped(items, bot=None, available_chats=None, notify=True):
+    """
+    Отправляет документы с подписями медиагруппами до MEDIA_GROUP_SIZE файлов
+    (один вызов sendMediaGroup вместо вызова на каждый файл). Если группу
+    не удалось отправить ни в один чат, ее файлы отправляются по одному.
+
+    Args:
+        items: [(путь к файлу, подпись), ...]
+        notify: Показывать пользователю окно при неудачной отправке файла
+    Returns:
+        Список успехов отправки в порядке items
+    """
+    if bot is None:
+        bot, available_chats = await _create_bot()
+    if not available_chats:
+        logger.error("No available chats found")
+        raise Exception("No available chats found")
+    results = []
+    for start in range(0, len(items), MEDIA_GROUP_SIZE):
+        group = items[start:start + MEDIA_GROUP_SIZE]
+        group_sent = False
+        if len(group) > 1:
+            hashes = await asyncio.to_thread(lambda: [file_content_hash(file_path) for file_path, _ in group])
+            file_ids = await asyncio.to_thread(lambda: [event_store.telegram_file_id(h, 'document') for h in hashes])
+            # Группа загружается один раз, остальным чатам отправляется по file_id
+            for chat_id in available_chats:
+                handles = []
+                try:
+                    media = []
+                    for (file_path, caption), file_id in zip(group, file_ids):
+                        if file_id is None:
+                            handle = open(file_path, 'rb')
+                            handles.append(handle)
+                        media.append(InputMediaDocument(
+                            media=file_id or handle,
+                            caption=caption if caption else None,
+                            parse_mode=ParseMode.HTML
+                        ))
+                    await chat_rate_limiter.wait(chat_id)
+                    messages = await bot.send_media_group(chat_id=chat_id, media=media)
+                    logger.info(f"Медиагруппа из {len(group)} файлов отправлена в Telegram chat {chat_id}")
+                    group_sent = True
+                    for index, message in enumerate(messages or []):
+                        new_file_id = _message_file_id(message, 'document')
+                        if new_file_id and index < len(file_ids) and file_ids[index] is None:
+                            file_ids[index] = new_file_id
+                            event_store.record_telegram_file_id(hashes[index], 'document', new_file_id)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки медиагруппы из {len(group)} файлов в chat {chat_id}: {e}")
+                    if any(file_ids):
+                        # Сохраненные file_id могли устареть: в следующий чат группа загружается заново
+                        for content_hash in hashes:
+                            event_store.forget_telegram_file_id(content_hash, 'document')
+                        file_ids = [None] * len(group)
+                finally:
+                    for handle in handles:
+                        handle.close()
+        if group_sent:
+            results.extend([True] * len(group))
+            continue
+        if len(group) > 1:
+            logger.warning(f"Медиагруппа не отправлена, файлы ({len(group)}) отправляются по одному")
+        for file_path, caption in group:
+            try:
+                results.append(await send_files_with_caption([file_path], caption, bot, available_chats, notify))
+            except Exception as e:
+                logger.error(f"Ошибка отправки файла {file_path}: {e}")
+                results.append(False)
+    return results
+
+async def send_files_with_caption(file_paths, caption="", bot=None, available_chats=None, notify=True):
     """
     Асинхронная отправка файлов с подписью в Telegram.
+    bot и available_chats передает служба доставки; без них бот создается на один вызов.
+    notify=False отключает окна с ошибками (очередь отправки повторит попытку сама).
+    Тяжелые операции (сжатие видео, окна предупреждений) выполняются вне цикла событий.
     """
     try:
         # Проверяем конфигурацию
@@ -521,19 +743,10 @@ async def send_files_with_caption(file_paths, caption=""):
         if not CHAT_IDS:
             logger.error("Chat IDs не настроены! Проверьте конфигурацию.")
             raise ValueError("Chat IDs не настроены")
-        httpx_request = HTTPXRequest(read_timeout=TELEGRAM_TIMEOUT, connect_timeout=TELEGRAM_CONNECT_TIMEOUT)
-        bot = Bot(token=TELEGRAM_TOKEN, request=httpx_request)
+        if bot is None:
+            bot, available_chats = await _create_bot()
         sent_files = []
-        available_chats = []
         temp_files = []
-        for chat_id in CHAT_IDS:
-            try:
-                await bot.get_chat(chat_id)
-                logger.info(f"Chat {chat_id} is available")
-                available_chats.append(chat_id)
-            except Exception as e:
-                logger.error(f"Chat {chat_id} is not available: {e}")
-                continue
         if not available_chats:
             logger.error("No available chats found")
             raise Exception("No available chats found")
@@ -555,7 +768,7 @@ async def send_files_with_caption(file_paths, caption=""):
                     # Сначала легкое сжатие, если нужно
                     if file_size > MAX_VIDEO_SIZE:
                         logger.info(f"Видео {file_path} превышает лимит Telegram (50 МБ), начинаем легкое сжатие...")
-                        compressed_path = compress_video(str(file_path), target_size_mb=45)
+                        compressed_path = await asyncio.to_thread(compress_video, str(file_path), None, 45)
                         if compressed_path is None:
                             logger.error(f"Не удалось сжать видео {file_path} до требуемого размера")
                             continue
@@ -568,73 +781,32 @@ async def send_files_with_caption(file_paths, caption=""):
                     max_retries = 2  # 1 обычная + 1 попытка с доп. сжатием
                     for attempt in range(max_retries):
                         try:
-                            with open(actual_file_path, 'rb') as f:
-                                for chat_id in available_chats:
-                                    try:
-                                        await bot.send_video(
-                                            chat_id=chat_id,
-                                            video=f,
-                                            caption=caption,
-                                            parse_mode=ParseMode.HTML,
-                                            supports_streaming=True
-                                        )
-                                        logger.info(f"Видео {file_path} успешно отправлено в Telegram chat {chat_id} (попытка {attempt + 1})")
-                                        sent_files.append(str(file_path))
-                                        video_sent = True
-                                        break
-                                    except Exception as e:
-                                        error_msg = str(e)
-                                        logger.error(f"Ошибка отправки видео в chat {chat_id} (попытка {attempt + 1}): {error_msg}")
-                                        if "Request Entity Too Large" in error_msg and attempt == 0:
-                                            logger.warning(f"Файл слишком большой для Telegram: {actual_file_path}. Пробуем дополнительное сжатие...")
-                                            # Дополнительное сжатие: fps=10, качество=70
-                                            import tempfile
-                                            import cv2
-                                            cap = cv2.VideoCapture(str(file_path))
-                                            if not cap.isOpened():
-                                                logger.error(f"Не удалось открыть видео для дополнительного сжатия: {file_path}")
-                                                break
-                                            fps = cap.get(cv2.CAP_PROP_FPS)
-                                            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                                            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                                            new_fps = min(fps, 10) if fps > 0 else 10
-                                            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                                            temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-                                            temp_output.close()
-                                            out = cv2.VideoWriter(temp_output.name, fourcc, new_fps, (width, height))
-                                            frame_count = 0
-                                            frame_skip = max(1, int(fps / new_fps)) if fps > 0 else 1
-                                            while True:
-                                                ret, frame = cap.read()
-                                                if not ret:
-                                                    break
-                                                if frame_count % frame_skip == 0:
-                                                    # Доп. сжатие JPEG качества
-                                                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-                                                    result, encimg = cv2.imencode('.jpg', frame, encode_param)
-                                                    if result:
-                                                        frame = cv2.imdecode(encimg, 1)
-                                                    out.write(frame)
-                                                frame_count += 1
-                                            cap.release()
-                                            out.release()
-                                            actual_file_path = temp_output.name
-                                            temp_files.append(temp_output.name)
-                                            logger.info(f"Дополнительное сжатие завершено: {actual_file_path}")
-                                            break  # выйти из цикла chat_id, повторить попытку отправки
-                                        elif "Request Entity Too Large" in error_msg and attempt == 1:
-                                            logger.error(f"Файл слишком большой даже после дополнительного сжатия: {actual_file_path}. Видео не будет отправлено.")
-                                            video_sent = False
-                                            break
-                                        continue
-                            if video_sent:
+                            # Видео загружается один раз, остальным чатам отправляется по file_id
+                            if await send_to_chats(
+                                bot, available_chats, 'video', actual_file_path,
+                                caption=caption, parse_mode=ParseMode.HTML, supports_streaming=True
+                            ):
+                                logger.info(f"Видео {file_path} успешно отправлено в Telegram (попытка {attempt + 1})")
+                                sent_files.append(str(file_path))
+                                video_sent = True
                                 break
                         except Exception as e:
                             error_msg = str(e)
                             logger.error(f"Ошибка при попытке {attempt + 1} отправки видео {file_path}: {error_msg}")
+                            if "Request Entity Too Large" in error_msg and attempt == 0:
+                                logger.warning(f"Файл слишком большой для Telegram: {actual_file_path}. Пробуем дополнительное сжатие...")
+                                # Дополнительное сжатие: fps=10, качество=70
+                                recompressed_path = await asyncio.to_thread(recompress_video, file_path)
+                                if recompressed_path is None:
+                                    break
+                                actual_file_path = recompressed_path
+                                temp_files.append(recompressed_path)
+                                continue
+                            elif "Request Entity Too Large" in error_msg:
+                                logger.error(f"Файл слишком большой даже после дополнительного сжатия: {actual_file_path}. Видео не будет отправлено.")
+                                break
                             if "Timed out" in error_msg and attempt < max_retries - 1:
                                 logger.info(f"Таймаут при отправке, повторная попытка {attempt + 2}/{max_retries}")
-                                import asyncio
                                 await asyncio.sleep(2)
                                 continue
                             elif attempt == max_retries - 1:
@@ -659,30 +831,20 @@ async def send_files_with_caption(file_paths, caption=""):
                     max_retries = 3
                     for attempt in range(max_retries):
                         try:
-                            with file_path.open('rb') as f:
-                                for chat_id in available_chats:
-                                    try:
-                                        await bot.send_document(
-                                            chat_id=chat_id,
-                                            document=f,
-                                            caption=caption,
-                                            parse_mode=ParseMode.HTML
-                                        )
-                                        logger.info(f"Файл {file_path} успешно отправлен в Telegram chat {chat_id} (попытка {attempt + 1})")
-                                        sent_files.append(str(file_path))
-                                        file_sent = True
-                                        break
-                                    except Exception as e:
-                                        logger.error(f"Ошибка отправки файла в chat {chat_id} (попытка {attempt + 1}): {e}")
-                                        continue
-                            if file_sent:
+                            # Файл загружается один раз, остальным чатам отправляется по file_id
+                            if await send_to_chats(
+                                bot, available_chats, 'document', file_path,
+                                caption=caption, parse_mode=ParseMode.HTML
+                            ):
+                                logger.info(f"Файл {file_path} успешно отправлен в Telegram (попытка {attempt + 1})")
+                                sent_files.append(str(file_path))
+                                file_sent = True
                                 break
                         except Exception as e:
                             error_msg = str(e)
                             logger.error(f"Ошибка при попытке {attempt + 1} отправки файла {file_path}: {error_msg}")
                             if "Timed out" in error_msg and attempt < max_retries - 1:
                                 logger.info(f"Таймаут при отправке, повторная попытка {attempt + 2}/{max_retries}")
-                                import asyncio
                                 await asyncio.sleep(2)
                                 continue
                             elif attempt == max_retries - 1:
@@ -692,22 +854,8 @@ async def send_files_with_caption(file_paths, caption=""):
                         notify_user = True
                         notify_message = f"Файл {file_path.name} не удалось отправить в Telegram. Проверьте лимиты размера и логи."
                 # Уведомление пользователя (если не удалось отправить)
-                if notify_user and notify_message:
-                    try:
-                        import tkinter
-                        from tkinter import messagebox
-                        root = None
-                        # Попытка найти уже существующий root
-                        for widget in tkinter._default_root.children.values():
-                            if isinstance(widget, tkinter.Tk):
-                                root = widget
-                                break
-                        if root is None:
-                            root = tkinter.Tk()
-                            root.withdraw()
-                        messagebox.showwarning("Ошибка отправки файла", notify_message)
-                    except Exception:
-                        logger.warning(f"[UI] {notify_message}")
+                if notify and notify_user and notify_message:
+                    await asyncio.to_thread(show_user_warning, "Ошибка отправки файла", notify_message)
             except Exception as e:
                 logger.error(f"Ошибка обработки файла {file_path}: {e}")
                 continue
@@ -722,27 +870,15 @@ async def send_files_with_caption(file_paths, caption=""):
     except Exception as e:
         logger.error(f"Ошибка отправки файлов в Telegram: {e}")
         # Попытка уведомить пользователя о критической ошибке
-        try:
-            import tkinter
-            from tkinter import messagebox
-            root = None
-            for widget in tkinter._default_root.children.values():
-                if isinstance(widget, tkinter.Tk):
-                    root = widget
-                    break
-            if root is None:
-                root = tkinter.Tk()
-                root.withdraw()
-            messagebox.showerror("Ошибка Telegram", f"Ошибка отправки файлов: {e}")
-        except Exception:
-            logger.warning(f"[UI] Ошибка отправки файлов: {e}")
+        if notify:
+            await asyncio.to_thread(show_user_warning, "Ошибка Telegram", f"Ошибка отправки файлов: {e}", True)
         raise
 
 def send_files(file_paths, caption=""):
     """
     Синхронная отправка файлов с подписью в Telegram.
+    Если служба отправки запущена, файлы идут через ее очередь и постоянное соединение.
     """
-    import asyncio
     try:
         # Проверяем файлы перед отправкой
         valid_files = []
@@ -765,7 +901,10 @@ def send_files(file_paths, caption=""):
             return False
         
         logger.info(f"Подготовлено {len(valid_files)} файлов для отправки")
-        success = asyncio.run(send_files_with_caption(valid_files, caption))
+        if delivery_service.running:
+            success = delivery_service.wait(delivery_service.enqueue_files(valid_files, caption))
+        else:
+            success = asyncio.run(send_files_with_caption(valid_files, caption))
         if success:
             logger.info("Files sent successfully")
         else:
@@ -776,5 +915,376 @@ def send_files(file_paths, caption=""):
         # Возвращаем False вместо вызова raise, чтобы приложение не падало
         return False
 
+class TelegramDeliveryService:
+    """
+    Постоянная служба отправки в Telegram на цикле событий приложения.
+
+    Один бот с пулом HTTP-соединений живет все время работы приложения;
+    доступность чатов проверяется не при каждой отправке, а раз в
+    TELEGRAM_CHAT_CHECK_TTL секунд. Задания ставятся в очередь из любого
+    потока (enqueue_files, enqueue_report) и возвращают concurrent.futures.Future
+    с результатом отправки. Задержка каждой отправки и глубина очереди
+    пишутся в лог и доступны через get_stats().
+
+    Очередь отправки (outbox) хранится в базе событий: send_later() переносит
+    файл в OUTBOX_DIR и ставит его в очередь, фоновый диспетчер забирает
+    элементы, время попытки которых наступило, и отправляет их в
+    TELEGRAM_WORKERS параллельных обработчиков (скриншоты — медиагруппами).
+    Неудачная попытка переносится с экспоненциальной задержкой, после
+    OUTBOX_MAX_ATTEMPTS попыток элемент помечается неудачным: это пишется
+    в лог, попадает в get_stats() и передается в on_outbox_failed (если задан)
+    без модальных окон. Прерванные сбоем отправки при следующем запуске
+    возвращаются в очередь.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._queue = None
+        self._wakeup = None
+        self._worker = None
+        self._bot = None
+        self._chat_checked = {}
+        self._loop_thread_id = None
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+        self.outbox_failed = []
+        # Неблокирующее уведомление интерфейса: (элемент, попыток, ошибка)
+        self.on_outbox_failed = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self, loop):
+        """
+        Запускает службу на цикле событий loop (цикл уже должен работать в своем потоке).
+        """
+        if self.running:
+            return
+        self.loop = loop
+        recovered = event_store.outbox_recover()
+        if recovered:
+            logger.info(f"В очередь отправки возвращено прерванных отправок: {recovered}")
+        self._worker = asyncio.run_coroutine_threadsafe(self._run(), loop)
+        logger.info("Служба отправки в Telegram запущена")
+
+    def stop(self, timeout=30):
+        """
+        Дожидается отправки поставленных заданий и закрывает соединения.
+        """
+        if not self.running:
+            return
+        for _ in range(TELEGRAM_WORKERS):
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        try:
+            self._worker.result(timeout)
+        except Exception as e:
+            logger.error(f"Ошибка остановки службы отправки в Telegram: {e}")
+        logger.info("Служба отправки в Telegram остановлена")
+
+    def enqueue_files(self, file_paths, caption="", notify=True):
+        """
+        Ставит файлы с подписью в очередь отправки.
+
+        Returns:
+            concurrent.futures.Future с результатом send_files_with_caption (bool)
+        """
+        return self._enqueue('files', ([str(path) for path in file_paths], caption, notify))
+
+    def enqueue_documents(self, items, notify=True):
+        """
+        Ставит документы с подписями в очередь отправки медиагруппами (send_documents_grouped).
+
+        Args:
+            items: [(путь к файлу, подпись), ...]
+        Returns:
+            concurrent.futures.Future со списком успехов в порядке items
+        """
+        return self._enqueue('documents', ([(str(path), caption) for path, caption in items], notify))
+
+    def send_later(self, kind, file_path, caption="", channel=None, item=None) -> bool:
+        """
+        Переносит файл в папку очереди отправки и ставит его в outbox.
+        Отправка переживает перезапуск приложения; повторно тот же элемент не ставится.
+
+        Args:
+            kind: 'screenshot' (отправляются медиагруппами) или 'video'
+            file_path: Путь к файлу
+            caption: Подпись
+            channel: Канал
+            item: Ключ элемента (по умолчанию — имя файла)
+        Returns:
+            True, если файл поставлен в очередь
+        """
+        file_path = Path(file_path)
+        item = item or file_path.name
+        if event_store.outbox_status(kind, item) is not None:
+            logger.info(f"{item} уже есть в очереди отправки, пропуск")
+            return False
+        target_dir = OUTBOX_DIR / (channel or kind)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        # Файл другого элемента с тем же именем не перезаписывается
+        target = target_dir / file_path.name
+        counter = 1
+        while target.exists():
+            target = target_dir / f"{file_path.stem}_{counter}{file_path.suffix}"
+            counter += 1
+        shutil.move(str(file_path), str(target))
+        try:
+            added = event_store.outbox_add(kind, item, str(target), caption, channel)
+        except Exception as e:
+            logger.error(f"Не удалось поставить {item} в очередь отправки: {e}")
+            added = False
+        if not added:
+            # Элемент не в очереди — файл возвращается вызывающему коду
+            shutil.move(str(target), str(file_path))
+            return False
+        logger.info(f"{item} поставлен в очередь отправки")
+        self.wake()
+        return True
+
+    def wake(self):
+        """
+        Будит диспетчер очереди отправки.
+        """
+        if self.running and self._wakeup is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def enqueue_report(self, excel_file, screenshot_files):
+        """
+        Ставит отчет (Excel-файл и скриншоты) в очередь отправки.
+
+        Returns:
+            concurrent.futures.Future с результатом отправки (True или исключение)
+        """
+        return self._enqueue('report', (excel_file, screenshot_files))
+
+    def wait(self, future):
+        """
+        Ожидает результат задания из потока, отличного от потока цикла событий.
+        """
+        if threading.get_ident() == self._loop_thread_id:
+            raise RuntimeError("Ожидание отправки в потоке цикла событий приведет к взаимной блокировке")
+        return future.result()
+
+    def _enqueue(self, kind, args):
+        future = concurrent.futures.Future()
+        if not self.running:
+            future.set_exception(RuntimeError("Служба отправки в Telegram не запущена"))
+            return future
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, (kind, args, future, time.perf_counter()))
+        return future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            completed = self.sent + self.failed
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'queue_depth': self.queue_depth(),
+                'latency_avg': self.latency_total / completed if completed else 0.0,
+                'latency_max': self.latency_max,
+                'latency_last': self.latency_last,
+                'outbox': event_store.outbox_counts(),
+                'outbox_failed_recent': list(self.outbox_failed),
+            }
+
+    async def _available_chats(self):
+        """
+        Доступные чаты; результат проверки каждого чата кэшируется на TELEGRAM_CHAT_CHECK_TTL секунд.
+        """
+        now = time.monotonic()
+        stale = [
+            chat_id for chat_id in CHAT_IDS
+            if chat_id not in self._chat_checked or now - self._chat_checked[chat_id][1] >= TELEGRAM_CHAT_CHECK_TTL
+        ]
+
+        async def check(chat_id):
+            try:
+                await self._bot.get_chat(chat_id)
+                logger.info(f"Chat {chat_id} is available")
+                return chat_id, True
+            except Exception as e:
+                logger.error(f"Chat {chat_id} is not available: {e}")
+                return chat_id, False
+
+        for chat_id, available in await asyncio.gather(*(check(chat_id) for chat_id in stale)):
+            self._chat_checked[chat_id] = (available, now)
+        return [chat_id for chat_id in CHAT_IDS if self._chat_checked[chat_id][0]]
+
+    async def _run(self):
+        self._loop_thread_id = threading.get_ident()
+        self._queue = asyncio.Queue()
+        if TELEGRAM_TOKEN:
+            httpx_request = HTTPXRequest(
+                connection_pool_size=TELEGRAM_POOL_SIZE,
+                read_timeout=TELEGRAM_TIMEOUT,
+                connect_timeout=TELEGRAM_CONNECT_TIMEOUT
+            )
+            self._bot = Bot(token=TELEGRAM_TOKEN, request=httpx_request)
+            try:
+                await self._bot.initialize()
+            except Exception as e:
+                logger.error(f"Ошибка инициализации бота Telegram: {e}")
+        self._wakeup = asyncio.Event()
+        workers = [asyncio.create_task(self._work()) for _ in range(TELEGRAM_WORKERS)]
+        dispatcher = asyncio.create_task(self._dispatch_outbox())
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            dispatcher.cancel()
+            if self._bot is not None:
+                try:
+                    await self._bot.shutdown()
+                except Exception as e:
+                    logger.error(f"Ошибка закрытия соединений Telegram: {e}")
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                break
+            await self._process(*job)
+
+    async def _dispatch_outbox(self):
+        """
+        Забирает из outbox элементы, время попытки которых наступило, и отправляет их.
+
+        Каждая единица отправки (видео или медиагруппа скриншотов) завершается
+        в собственной задаче; новая единица забирается, как только освобождается
+        один из TELEGRAM_WORKERS обработчиков, поэтому долгая загрузка видео
+        не задерживает скриншоты, поставленные в очередь после нее.
+        """
+        in_flight = set()
+
+        def settled(task):
+            in_flight.discard(task)
+            self._wakeup.set()
+
+        while True:
+            self._wakeup.clear()
+            while len(in_flight) < TELEGRAM_WORKERS:
+                try:
+                    rows = await asyncio.to_thread(event_store.outbox_claim_next, ('screenshot',), MEDIA_GROUP_SIZE)
+                except Exception as e:
+                    logger.error(f"Ошибка чтения очереди отправки: {e}")
+                    rows = []
+                if not rows:
+                    break
+                if rows[0]['kind'] == 'screenshot':
+                    future = self.enqueue_documents([(row['file_path'], row['caption']) for row in rows], notify=False)
+                else:
+                    future = self.enqueue_files([rows[0]['file_path']], rows[0]['caption'], notify=False)
+                task = asyncio.create_task(self._settle_outbox(rows, future))
+                in_flight.add(task)
+                task.add_done_callback(settled)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _settle_outbox(self, rows, future):
+        """
+        Записывает результат отправки элементов outbox и планирует повторы.
+        """
+        retry_after = 0
+        try:
+            result = await asyncio.wrap_future(future)
+            results = result if isinstance(result, list) else [bool(result)] * len(rows)
+            error = "Telegram не принял файл"
+        except Exception as e:
+            results = [False] * len(rows)
+            error = str(e)
+            retry_after = getattr(e, 'retry_after', 0) or 0
+            if hasattr(retry_after, 'total_seconds'):
+                retry_after = retry_after.total_seconds()
+        for row, sent in zip(rows, results):
+            await asyncio.to_thread(self._finish_outbox_item, row, sent, error, retry_after)
+
+    def _finish_outbox_item(self, row, sent, error, retry_after):
+        file_path = Path(row['file_path'])
+        attempts = row['attempts'] + 1
+        if sent:
+            event_store.outbox_mark_sent(row['id'])
+            event_store.record_delivery(row['kind'], row['item'], 'sent', channel=row['channel'])
+            logger.info(f"{row['item']} отправлен из очереди (попытка {attempts})")
+        elif attempts < OUTBOX_MAX_ATTEMPTS and file_path.exists():
+            delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+            delay = max(delay, float(retry_after))
+            event_store.outbox_mark_failed(row['id'], error, datetime.now() + timedelta(seconds=delay))
+            logger.warning(f"{row['item']} не отправлен (попытка {attempts}): {error}. Повтор через {delay:.0f} с")
+            return
+        else:
+            event_store.outbox_mark_failed(row['id'], error)
+            event_store.record_delivery(row['kind'], row['item'], 'failed', channel=row['channel'])
+            logger.error(f"{row['item']} не удалось отправить после {attempts} попыток: {error}")
+            with self._stats_lock:
+                self.outbox_failed.append(row['item'])
+                del self.outbox_failed[:-20]
+            # Модальное окно здесь остановило бы очередь: интерфейс уведомляется без ожидания
+            if self.on_outbox_failed is not None:
+                try:
+                    self.on_outbox_failed(row['item'], attempts, error)
+                except Exception as e:
+                    logger.error(f"Ошибка уведомления о неудачной отправке {row['item']}: {e}")
+        try:
+            file_path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.error(f"Не удалось удалить файл очереди {file_path}: {e}")
+
+    async def _process(self, kind, args, future, enqueued_at):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        try:
+            if self._bot is None:
+                raise ValueError("Telegram токен не настроен")
+            available_chats = await self._available_chats()
+            if kind == 'files':
+                file_paths, caption, notify = args
+                result = await send_files_with_caption(file_paths, caption, self._bot, available_chats, notify)
+                success = bool(result)
+            elif kind == 'documents':
+                items, notify = args
+                result = await send_documents_grouped(items, self._bot, available_chats, notify)
+                success = all(result)
+            else:
+                excel_file, screenshot_files = args
+                await send_to_telegram(excel_file, screenshot_files, self._bot, available_chats)
+                result = success = True
+        except Exception as e:
+            self._record(False, started)
+            future.set_exception(e)
+        else:
+            self._record(success, started)
+            future.set_result(result)
+        finished = time.perf_counter()
+        logger.info(
+            f"Отправка в Telegram ({kind}): {finished - started:.2f} с, "
+            f"ожидание в очереди {started - enqueued_at:.2f} с, в очереди {self.queue_depth()}"
+        )
+
+    def _record(self, success, started):
+        latency = time.perf_counter() - started
+        with self._stats_lock:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_last = latency
+
+
+# Глобальная служба отправки (запускается приложением на его цикле событий)
+delivery_service = TelegramDeliveryService()
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
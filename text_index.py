@@ -0,0 +1,231 @@
+import re
+import zlib
+import itertools
+import logging
+import threading
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Параметры MinHash/LSH: длина шингла в символах, число хеш-функций и полос.
+# Вероятность попасть в кандидаты при схожести шинглов J: 1 - (1 - J^(perm/bands))^bands.
+# У пар на пороге ratio 0.8 сходство 3-шинглов опускается до J ~ 0.25, а у не связанных
+# между собой строк одной тематики (общие частые слова) доходит до 0.1-0.2, поэтому
+# полоса из 4 строк проверяется с несколькими пробами: каждая строка сигнатуры
+# сохраненного текста сравнивается с PROBE_DEPTH наименьшими хешами запроса.
+SHINGLE_SIZE = 3
+NUM_PERM = 256
+NUM_BANDS = 64
+PROBE_DEPTH = 2
+# Точная верхняя оценка SequenceMatcher.quick_ratio() по гистограмме символов
+# (символы сворачиваются в CHAR_BINS корзин — оценка остается верхней)
+CHAR_BINS = 64
+# Простое число больше 2^32 для универсального хеширования
+_PRIME = np.uint64(4294967311)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нижний регистр и схлопнутые пробелы.
+    """
+    return WHITESPACE_RE.sub(' ', text.lower()).strip()
+
+
+class NearDuplicateIndex:
+    """
+    Индекс почти-дубликатов текстов на MinHash/LSH по символьным шинглам.
+
+    Для нового текста кандидаты берутся из корзин LSH (время почти не зависит
+    от числа сохраненных текстов): в каждой полосе проверяются все сочетания
+    PROBE_DEPTH наименьших хешей запроса по строкам полосы. Кандидаты сначала
+    отсеиваются векторной верхней оценкой quick_ratio() по гистограммам
+    символов (без потери полноты), оставшиеся проверяются точно тем же
+    SequenceMatcher(...).ratio() > threshold, что и полный перебор.
+
+    Читатели работают без блокировок: корзины хранят неизменяемые кортежи,
+    которые писатель (под блокировкой) заменяет целиком; строка гистограммы
+    текста записывается до его публикации в корзинах.
+    """
+
+    def __init__(self, threshold: float = 0.8, shingle_size: int = SHINGLE_SIZE,
+                 num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS,
+                 probe_depth: int = PROBE_DEPTH):
+        """
+        Инициализация индекса.
+
+        Args:
+            threshold: Порог схожести SequenceMatcher, выше которого текст считается дубликатом
+            shingle_size: Длина символьного шингла
+            num_perm: Количество хеш-функций MinHash
+            num_bands: Количество полос LSH (num_perm должно делиться на num_bands)
+            probe_depth: Сколько наименьших хешей запроса пробуется в каждой строке полосы
+        """
+        if num_perm % num_bands:
+            raise ValueError("num_perm должно делиться на num_bands")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.probe_depth = max(1, probe_depth)
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, 2 ** 31, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=(num_perm, 1)).astype(np.uint64)
+        # Сочетания проб для строк полосы: (probe_depth ** rows, rows), первое — все минимумы
+        self._probes = np.array(list(itertools.product(range(self.probe_depth), repeat=self.rows)), dtype=np.intp)
+        self._texts: List[str] = []
+        self._exact: Dict[str, int] = {}
+        self._buckets: List[Dict[bytes, Tuple[int, ...]]] = [{} for _ in range(num_bands)]
+        self._histograms = np.zeros((64, CHAR_BINS), dtype=np.uint16)
+        self._lengths = np.zeros(64, dtype=np.int32)
+        self._write_lock = threading.Lock()
+        self.queries = 0
+        self.candidates_found = 0
+        self.candidates_checked = 0
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _hashes(self, text: str) -> np.ndarray:
+        """
+        Хеши шинглов текста под каждой хеш-функцией: (num_perm, число шинглов).
+        """
+        size = self.shingle_size
+        if len(text) <= size:
+            shingles = {text}
+        else:
+            shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return (self._a * hashes + self._b) % _PRIME
+
+    def _signature(self, text: str) -> np.ndarray:
+        return self._hashes(text).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.num_bands)]
+
+    def _probe_keys(self, text: str) -> List[List[bytes]]:
+        """
+        Ключи корзин для запроса: по полосам, все сочетания probe_depth наименьших хешей строк.
+        """
+        hashes = self._hashes(text)
+        depth = min(self.probe_depth, hashes.shape[1])
+        smallest = np.sort(np.partition(hashes, depth - 1, axis=1)[:, :depth], axis=1)
+        if depth < self.probe_depth:
+            # Текст короче глубины проб: недостающие пробы повторяют последний хеш
+            smallest = np.pad(smallest, ((0, 0), (0, self.probe_depth - depth)), mode='edge')
+        bands = smallest.reshape(self.num_bands, self.rows, self.probe_depth)
+        # (полосы, сочетания, строки): значение строки r в сочетании p — bands[:, r, probes[p, r]]
+        values = np.ascontiguousarray(bands[:, np.arange(self.rows), self._probes])
+        key_size = self.rows * values.itemsize
+        keys = []
+        for band in values:
+            raw = band.tobytes()
+            keys.append(list(dict.fromkeys(raw[i:i + key_size] for i in range(0, len(raw), key_size))))
+        return keys
+
+    @staticmethod
+    def _histogram(text: str) -> np.ndarray:
+        codes = np.fromiter((ord(ch) % CHAR_BINS for ch in text), dtype=np.intp, count=len(text))
+        return np.bincount(codes, minlength=CHAR_BINS).astype(np.uint16)
+
+    def add(self, text: str) -> bool:
+        """
+        Добавляет текст в индекс.
+
+        Returns:
+            False, если такой же текст (после нормализации) уже есть
+        """
+        normalized = normalize_text(text)
+        if not normalized or normalized in self._exact:
+            return False
+        signature = self._signature(normalized)
+        histogram = self._histogram(normalized)
+        with self._write_lock:
+            if normalized in self._exact:
+                return False
+            text_id = len(self._texts)
+            if text_id == len(self._lengths):
+                # Новые массивы заменяют старые целиком: читатели дочитывают прежние
+                self._histograms = np.concatenate([self._histograms, np.zeros_like(self._histograms)])
+                self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+            self._histograms[text_id] = histogram
+            self._lengths[text_id] = len(normalized)
+            self._texts.append(normalized)
+            self._exact[normalized] = text_id
+            for buckets, key in zip(self._buckets, self._band_keys(signature)):
+                buckets[key] = buckets.get(key, ()) + (text_id,)
+        return True
+
+    def add_many(self, texts: Iterable[str]) -> int:
+        """
+        Добавляет несколько текстов. Возвращает количество новых.
+        """
+        return sum(1 for text in texts if self.add(text))
+
+    def candidates(self, text: str) -> List[int]:
+        """
+        Идентификаторы сохраненных текстов, попавших с text хотя бы в одну корзину LSH.
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return []
+        found = set()
+        for buckets, keys in zip(self._buckets, self._probe_keys(normalized)):
+            for key in keys:
+                found.update(buckets.get(key, ()))
+        return sorted(found)
+
+    def _bounded(self, text: str, text_ids: List[int]) -> List[int]:
+        """
+        Оставляет кандидатов, у которых верхняя оценка quick_ratio() выше порога.
+        """
+        if not text_ids:
+            return []
+        ids = np.array(text_ids, dtype=np.intp)
+        histograms, lengths = self._histograms, self._lengths
+        common = np.minimum(histograms[ids], self._histogram(text)).sum(axis=1)
+        bound = 2.0 * common / (lengths[ids] + len(text))
+        return ids[bound > self.threshold].tolist()
+
+    def find_duplicate(self, text: str) -> Optional[str]:
+        """
+        Возвращает сохраненный текст, схожесть с которым выше порога, или None.
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return None
+        self.queries += 1
+        if normalized in self._exact:
+            return normalized
+        candidates = self.candidates(normalized)
+        self.candidates_found += len(candidates)
+        matcher = SequenceMatcher(None)
+        matcher.set_seq1(normalized)
+        for text_id in self._bounded(normalized, candidates):
+            candidate = self._texts[text_id]
+            self.candidates_checked += 1
+            matcher.set_seq2(candidate)
+            if matcher.ratio() > self.threshold:
+                return candidate
+        return None
+
+    def is_duplicate(self, text: str) -> bool:
+        """
+        True, если в индексе есть текст, схожесть с которым выше порога.
+        """
+        return self.find_duplicate(text) is not None
+
+    def get_stats(self) -> dict:
+        return {
+            'texts': len(self._texts),
+            'queries': self.queries,
+            'candidates_found': self.candidates_found,
+            'candidates_checked': self.candidates_checked,
+            'candidates_per_query': self.candidates_found / self.queries if self.queries else 0.0,
+            'checked_per_query': self.candidates_checked / self.queries if self.queries else 0.0,
+        }
@@ -0,0 +1,598 @@
+import os
+import sys
+import time
+import queue
+import asyncio
+import logging
+import tempfile
+import threading
+import subprocess
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from config_manager import config_manager
+from stream_capture import stream_multiplexer, parse_crop
+
+logger = logging.getLogger(__name__)
+
+RECORD_QUEUE_SIZE = 250  # Буфер кадров записи (~10 секунд при 25 fps)
+FIRST_FRAME_TIMEOUT = 30.0  # Ожидание первого кадра при подключении к потоку, сек
+FRAME_READ_TIMEOUT = 10.0  # Ожидание очередного кадра, сек
+LOW_FPS_RATIO = 0.9  # Доля fps источника, ниже которой запись считается отстающей
+FFMPEG_STOP_TIMEOUT = 10.0  # Ожидание завершения ffmpeg после команды остановки, сек
+LIVE_OCR_WAIT_TIMEOUT = 30.0  # Ожидание распознавания кадров, опубликованных завершенной записью, сек
+# Режимы записи: reencode — декодирование, crop и кодирование mp4v;
+# copy — сегменты потока сохраняются без перекодирования, crop откладывается
+RECORD_MODES = ('reencode', 'copy')
+CROP_SIDECAR_SUFFIX = '.crop'  # Файл отложенного crop рядом с роликом: <ролик>.mp4.crop
+BMP_HEADER_SIZE = 14  # Заголовок BMP: сигнатура BM и размер файла (байты 2-5)
+
+
+def get_resource_path(filename, subdir="bin"):
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, subdir, filename)
+
+
+def crop_sidecar_path(video_path) -> Path:
+    video_path = Path(video_path)
+    return video_path.with_name(video_path.name + CROP_SIDECAR_SUFFIX)
+
+
+def read_deferred_crop(video_path) -> Optional[str]:
+    """
+    Возвращает отложенный crop ролика, записанного без перекодирования (или None).
+    """
+    sidecar = crop_sidecar_path(video_path)
+    try:
+        return sidecar.read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Не удалось прочитать crop {sidecar}: {e}")
+        return None
+
+
+def crop_clip(video_path, crop_params: str, output_path=None) -> Optional[str]:
+    """
+    Применяет отложенный crop к ролику (одно кодирование H.264, звук копируется).
+
+    Returns:
+        Путь к обрезанному ролику или None при ошибке
+    """
+    crop = parse_crop(crop_params)
+    if crop is None:
+        return None
+    width, height, x, y = crop
+    if output_path is None:
+        handle = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+        handle.close()
+        output_path = handle.name
+    cmd = [
+        get_resource_path("ffmpeg.exe"), "-hide_banner", "-loglevel", "error", "-y",
+        "-i", str(video_path),
+        "-vf", f"crop={width}:{height}:{x}:{y}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "26",
+        "-c:a", "copy", "-movflags", "+faststart",
+        str(output_path)
+    ]
+    started = time.perf_counter()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logger.error(f"Ошибка ffmpeg при обрезке {video_path}: {result.stderr.decode(errors='ignore')}")
+        return None
+    logger.info(f"Ролик {Path(video_path).name} обрезан за {time.perf_counter() - started:.1f} с")
+    return str(output_path)
+
+
+class RecordingJob:
+    """
+    Запись одного ролика в собственном потоке.
+
+    Кадры берутся из общей сессии потока (stream_multiplexer) и пишутся
+    в cv2.VideoWriter; OpenCV отпускает GIL на время кодирования, поэтому
+    одновременные записи нескольких каналов выполняются параллельно
+    и не занимают цикл событий приложения. Результат — словарь статистики
+    в concurrent.futures.Future (future).
+
+    Если задана очередь кадров (VideoRecorder.set_frame_queue), каждые
+    sample_interval секунд записи кадр публикуется в нее еще во время
+    записи — распознавание идет параллельно, и найденные ключевые слова
+    отмечают запись (mark_interesting) до ее завершения. Обработчик очереди
+    вызывает frame_done() для каждого кадра, поэтому wait_live() ждет только
+    кадры этой записи, а не всю очередь.
+    """
+
+    def __init__(self, channel_name: str, stream_url: str, output_path, crop_params: Optional[str],
+                 duration: float, stop_event: Optional[threading.Event] = None,
+                 frame_queue: Optional[queue.Queue] = None, sample_interval: float = 2.0):
+        """
+        Инициализация записи.
+
+        Args:
+            channel_name: Имя канала
+            stream_url: URL видеопотока
+            output_path: Путь к выходному файлу
+            crop_params: Параметры crop (формат: crop=width:height:x:y)
+            duration: Длительность записи, сек
+            stop_event: Внешний флаг остановки (например, остановка мониторинга)
+            frame_queue: Очередь (задание, номер кадра, секунда, кадр) для распознавания во время записи
+            sample_interval: Шаг публикации кадров в очередь, сек
+        """
+        self.channel_name = channel_name
+        self.stream_url = stream_url
+        self.output_path = Path(output_path)
+        self.crop_params = crop_params
+        self.duration = duration
+        self.stop_event = stop_event
+        self.future = concurrent.futures.Future()
+        self.frame_queue = frame_queue
+        self.sample_interval = sample_interval
+        self.frames = 0
+        self.started_at = 0.0
+        self.published = 0
+        self.publish_dropped = 0
+        self.keywords: List[str] = []
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._live_done = threading.Event()
+        self._live_done.set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Запускает поток записи.
+        """
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"recorder_{self.channel_name}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Просит поток записи завершиться; уже записанные кадры сохраняются.
+        """
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _stopped(self) -> bool:
+        return self._stop.is_set() or (self.stop_event is not None and self.stop_event.is_set())
+
+    @property
+    def interesting(self) -> bool:
+        return bool(self.keywords)
+
+    def mark_interesting(self, keyword: str):
+        """
+        Отмечает запись как содержащую ключевое слово (вызывается распознаванием во время записи).
+        """
+        if keyword not in self.keywords:
+            self.keywords.append(keyword)
+            logger.info(f"Запись {self.output_path.name} отмечена: найдено ключевое слово '{keyword}'")
+
+    def _publish(self, frame_idx: int, timestamp_sec: float, frame):
+        """
+        Передает кадр на распознавание, не блокируя запись (при заполненной очереди кадр пропускается).
+        """
+        with self._pending_lock:
+            self._pending += 1
+            self._live_done.clear()
+        try:
+            self.frame_queue.put_nowait((self, frame_idx, timestamp_sec, frame))
+            self.published += 1
+        except queue.Full:
+            self.publish_dropped += 1
+            self.frame_done()
+
+    def frame_done(self):
+        """
+        Отмечает опубликованный кадр обработанным (вызывается обработчиком очереди кадров).
+        """
+        with self._pending_lock:
+            self._pending -= 1
+            if self._pending <= 0:
+                self._pending = 0
+                self._live_done.set()
+
+    def wait_live(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ждет распознавания всех опубликованных кадров записи.
+
+        Returns:
+            False, если за timeout секунд обработаны не все кадры
+        """
+        return self._live_done.wait(timeout)
+
+    def _new_stats(self) -> dict:
+        return {
+            'channel': self.channel_name,
+            'output_path': str(self.output_path),
+            'status': 'failed',
+            'frames': 0,
+            'elapsed': 0.0,
+            'fps': 0.0,
+            'source_fps': 0.0,
+            'dropped': 0,
+            'live_frames': 0,
+            'live_dropped': 0,
+            'keywords': [],
+        }
+
+    def _run(self):
+        stats = self._new_stats()
+        subscription = None
+        out = None
+        try:
+            subscription = stream_multiplexer.subscribe(
+                self.stream_url, self.channel_name, self.crop_params, maxsize=RECORD_QUEUE_SIZE
+            )
+            # Первый кадр определяет размер выходного видео
+            frame = subscription.get(FIRST_FRAME_TIMEOUT)
+            if frame is None:
+                logger.error(f"Не удалось открыть видеопоток для {self.channel_name}: {self.stream_url}")
+                return
+            source_fps = subscription.session.fps or 25.0
+            stats['source_fps'] = source_fps
+            height, width = frame.shape[:2]
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(str(self.output_path), fourcc, source_fps, (width, height))
+            if not out.isOpened():
+                logger.error(f"Не удалось создать VideoWriter для {self.channel_name}")
+                return
+            self.started_at = time.monotonic()
+            logger.info(f"Начало записи видео для {self.channel_name}")
+            stats['status'] = 'completed'
+            publish_step = max(1, int(source_fps * self.sample_interval))
+            while True:
+                if self._stopped():
+                    logger.info(f"Остановка записи видео для {self.channel_name}")
+                    stats['status'] = 'stopped'
+                    break
+                if time.monotonic() - self.started_at >= self.duration:
+                    break
+                out.write(frame)
+                if self.frame_queue is not None and self.frames % publish_step == 0:
+                    self._publish(self.frames, self.frames / source_fps, frame)
+                self.frames += 1
+                frame = subscription.get(FRAME_READ_TIMEOUT)
+                if frame is None:
+                    logger.warning(f"Не удалось прочитать кадр {self.frames} для {self.channel_name}")
+                    stats['status'] = 'interrupted'
+                    break
+        except Exception as e:
+            logger.error(f"Ошибка при записи видео для {self.channel_name}: {e}")
+            stats['status'] = 'failed'
+        finally:
+            if out is not None:
+                out.release()
+            if subscription is not None:
+                stats['dropped'] = subscription.dropped
+                subscription.release()
+            stats['frames'] = self.frames
+            if self.started_at:
+                stats['elapsed'] = time.monotonic() - self.started_at
+                stats['fps'] = self.frames / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+            self._finish_stats(stats)
+            self._report(stats)
+            self.future.set_result(stats)
+
+    def _finish_stats(self, stats: dict):
+        stats['live_frames'] = self.published
+        stats['live_dropped'] = self.publish_dropped
+        stats['keywords'] = list(self.keywords)
+
+    def _report(self, stats: dict):
+        """
+        Пишет в лог достигнутый fps записи относительно fps источника.
+        """
+        if not stats['frames']:
+            return
+        message = (
+            f"Запись {self.channel_name} ({stats['status']}): {stats['frames']} кадров за {stats['elapsed']:.1f} с, "
+            f"{stats['fps']:.1f} из {stats['source_fps']:.1f} fps источника"
+        )
+        if stats['dropped']:
+            message += f", пропущено кадров: {stats['dropped']}"
+        if stats['live_frames']:
+            message += f", на распознавание во время записи: {stats['live_frames']}"
+        if stats['live_dropped']:
+            message += f" (пропущено {stats['live_dropped']})"
+        if stats['fps'] < stats['source_fps'] * LOW_FPS_RATIO:
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+
+class StreamCopyJob(RecordingJob):
+    """
+    Запись без перекодирования: ffmpeg сохраняет сегменты HLS-потока как есть
+    (-c copy, перепаковка в mp4), кадры не декодируются. Crop сохраняется
+    рядом с роликом (read_deferred_crop) и применяется только к кадрам,
+    которые выбираются для OCR, и к ролику, который отправляется.
+
+    Кадры для распознавания во время записи выдает тот же процесс ffmpeg
+    вторым выходом (BMP в stdout): декодируются только ключевые кадры
+    (-skip_frame nokey), из них фильтр select оставляет не чаще одного
+    за sample_interval. Второе подключение к потоку не открывается.
+    """
+
+    def _build_command(self) -> List[str]:
+        cmd = [
+            get_resource_path("ffmpeg.exe"), "-hide_banner", "-loglevel", "error", "-y",
+        ]
+        if self.frame_queue is not None:
+            # Влияет только на декодер второго выхода: копируемый поток не декодируется
+            cmd += ["-skip_frame", "nokey"]
+        cmd += [
+            "-i", self.stream_url,
+            "-t", str(self.duration),
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy", "-bsf:a", "aac_adtstoasc",
+            str(self.output_path)
+        ]
+        if self.frame_queue is not None:
+            cmd += [
+                "-t", str(self.duration),
+                "-map", "0:v:0",
+                "-vf", f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{self.sample_interval})'",
+                # Без passthrough ffmpeg заполняет пропуски select дубликатами кадров
+                "-fps_mode", "passthrough",
+                "-c:v", "bmp", "-f", "image2pipe", "pipe:1"
+            ]
+        return cmd
+
+    def _read_live_frames(self, stream):
+        """
+        Читает BMP-кадры второго выхода ffmpeg и публикует их на распознавание
+        (выполняется в отдельном потоке до закрытия stdout).
+        """
+        crop = parse_crop(self.crop_params)
+        try:
+            while True:
+                header = stream.read(BMP_HEADER_SIZE)
+                if len(header) < BMP_HEADER_SIZE or header[:2] != b'BM':
+                    break
+                size = int.from_bytes(header[2:6], 'little')
+                body = stream.read(size - BMP_HEADER_SIZE)
+                if len(body) < size - BMP_HEADER_SIZE:
+                    break
+                frame = cv2.imdecode(np.frombuffer(header + body, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                if crop is not None:
+                    width, height, x, y = crop
+                    h, w = frame.shape[:2]
+                    # Crop за границами кадра — распознаем полный кадр, как в общей сессии потока
+                    if x + width <= w and y + height <= h:
+                        frame = frame[y:y+height, x:x+width].copy()
+                timestamp_sec = time.monotonic() - self.started_at
+                # Точный номер кадра до завершения записи неизвестен — оценка по 25 fps
+                self._publish(int(timestamp_sec * 25.0), timestamp_sec, frame)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кадров ffmpeg для {self.channel_name}: {e}")
+
+    def _stop_process(self, process) -> bytes:
+        """
+        Завершает ffmpeg и возвращает его stderr.
+        """
+        if process.poll() is None:
+            try:
+                # Команда q дописывает заголовок mp4, чтобы записанная часть осталась читаемой
+                process.stdin.write(b'q')
+                process.stdin.flush()
+            except OSError:
+                pass
+        try:
+            process.wait(timeout=FFMPEG_STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        return process.stderr.read()
+
+    def _run(self):
+        stats = self._new_stats()
+        process = None
+        reader = None
+        try:
+            if self.crop_params:
+                crop_sidecar_path(self.output_path).write_text(self.crop_params, encoding='utf-8')
+            self.started_at = time.monotonic()
+            process = subprocess.Popen(
+                self._build_command(), stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE if self.frame_queue is not None else subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+            if self.frame_queue is not None:
+                reader = threading.Thread(
+                    target=self._read_live_frames, args=(process.stdout,),
+                    name=f"recorder_frames_{self.channel_name}", daemon=True
+                )
+                reader.start()
+            logger.info(f"Начало записи видео без перекодирования для {self.channel_name}")
+            while process.poll() is None:
+                if self._stopped():
+                    logger.info(f"Остановка записи видео для {self.channel_name}")
+                    stats['status'] = 'stopped'
+                    break
+                time.sleep(0.5)
+            stderr = self._stop_process(process)
+            if stats['status'] != 'stopped':
+                if process.returncode == 0:
+                    stats['status'] = 'completed'
+                else:
+                    logger.error(f"Ошибка ffmpeg при записи {self.channel_name}: {stderr.decode(errors='ignore').strip()}")
+                    stats['status'] = 'interrupted'
+        except Exception as e:
+            logger.error(f"Ошибка при записи видео для {self.channel_name}: {e}")
+            if process is not None and process.poll() is None:
+                process.kill()
+        finally:
+            if reader is not None:
+                reader.join(timeout=FFMPEG_STOP_TIMEOUT)
+            if self.started_at:
+                stats['elapsed'] = time.monotonic() - self.started_at
+            self._probe(stats)
+            self.frames = stats['frames']
+            self._finish_stats(stats)
+            self._report(stats)
+            self.future.set_result(stats)
+
+    def _probe(self, stats: dict):
+        """
+        Читает число кадров и fps записанного ролика из заголовка (без декодирования).
+        """
+        if not self.output_path.exists():
+            return
+        cap = cv2.VideoCapture(str(self.output_path))
+        try:
+            if not cap.isOpened():
+                return
+            stats['source_fps'] = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            stats['frames'] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            if stats['elapsed'] > 0:
+                stats['fps'] = stats['frames'] / stats['elapsed']
+        finally:
+            cap.release()
+
+
+class VideoRecorder:
+    """
+    Запускает записи в выделенных потоках (по одному на ролик) и выдает
+    их результат корутинам через record().
+    """
+
+    def __init__(self):
+        self._jobs: List[RecordingJob] = []
+        self._finished: List[RecordingJob] = []
+        self._lock = threading.Lock()
+        self.history: List[dict] = []
+        self.frame_queue: Optional[queue.Queue] = None
+        self.sample_interval = 2.0
+
+    def set_frame_queue(self, target_queue: Optional[queue.Queue], sample_interval: float = 2.0):
+        """
+        Включает распознавание во время записи: новые записи публикуют кадры
+        (задание, номер кадра, секунда, кадр) в очередь каждые sample_interval секунд.
+        None выключает публикацию.
+        """
+        self.frame_queue = target_queue
+        self.sample_interval = sample_interval
+        logger.info(f"Распознавание crop-видео во время записи {'включено' if target_queue is not None else 'выключено'}")
+
+    def start(self, channel_name: str, stream_url: str, output_path, crop_params: Optional[str],
+              duration: float, stop_event: Optional[threading.Event] = None,
+              mode: Optional[str] = None) -> RecordingJob:
+        """
+        Запускает запись и сразу возвращает ее задание.
+
+        Args:
+            mode: Режим записи из RECORD_MODES (по умолчанию — video_record_mode из config.json)
+        """
+        if mode is None:
+            mode = config_manager.load_config().get('video_record_mode', 'reencode')
+        if mode not in RECORD_MODES:
+            logger.warning(f"Неизвестный режим записи '{mode}', используется 'reencode'")
+            mode = 'reencode'
+        job_class = StreamCopyJob if mode == 'copy' else RecordingJob
+        job = job_class(channel_name, stream_url, output_path, crop_params, duration, stop_event,
+                        self.frame_queue, self.sample_interval)
+        with self._lock:
+            self._jobs.append(job)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        job.start()
+        return job
+
+    async def record(self, channel_name: str, stream_url: str, output_path, crop_params: Optional[str],
+                     duration: float, stop_event: Optional[threading.Event] = None,
+                     mode: Optional[str] = None) -> dict:
+        """
+        Записывает ролик в отдельном потоке и возвращает статистику записи.
+        При отмене корутины запись останавливается, записанная часть сохраняется.
+        """
+        job = self.start(channel_name, stream_url, output_path, crop_params, duration, stop_event, mode)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(job.future))
+        except asyncio.CancelledError:
+            job.stop()
+            raise
+
+    def _finish(self, job: RecordingJob, future: concurrent.futures.Future):
+        with self._lock:
+            if job in self._jobs:
+                self._jobs.remove(job)
+            self.history.append(future.result())
+            del self.history[:-50]
+            self._finished.append(job)
+            del self._finished[:-50]
+
+    def active(self) -> Dict[str, dict]:
+        """
+        Текущие записи: канал -> кадров записано и достигнутый fps.
+        """
+        now = time.monotonic()
+        with self._lock:
+            jobs = list(self._jobs)
+        result = {}
+        for job in jobs:
+            elapsed = now - job.started_at if job.started_at else 0.0
+            result[job.channel_name] = {
+                'output_path': str(job.output_path),
+                'frames': job.frames,
+                'elapsed': elapsed,
+                'fps': job.frames / elapsed if elapsed > 0 else 0.0,
+            }
+        return result
+
+    def is_active(self, channel_name: str, video_file: str) -> bool:
+        """
+        Проверяет, что ролик еще записывается.
+        """
+        with self._lock:
+            return any(
+                job.channel_name == channel_name and job.output_path.name == video_file
+                for job in self._jobs
+            )
+
+    def recognized_live(self, channel_name: str, video_file: str,
+                        timeout: float = LIVE_OCR_WAIT_TIMEOUT) -> bool:
+        """
+        Проверяет, что все кадры выборки ролика уже распознаны во время записи
+        (запись завершена, кадры публиковались, ни один не был пропущен и все
+        распознаны). Ждет не дольше timeout секунд только кадры этой записи.
+        """
+        with self._lock:
+            finished = list(self._finished)
+        for job in reversed(finished):
+            if job.channel_name == channel_name and job.output_path.name == video_file:
+                if not job.published or job.publish_dropped:
+                    return False
+                if not job.wait_live(timeout):
+                    logger.warning(f"Кадры {video_file} не распознаны за {timeout:.0f} с, ролик будет распознан повторно")
+                    return False
+                return True
+        return False
+
+    def stop_all(self, timeout: float = 10.0):
+        """
+        Останавливает все записи и ждет их завершения.
+        """
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.stop()
+        concurrent.futures.wait([job.future for job in jobs], timeout=timeout)
+
+
+# Глобальный менеджер записей
+video_recorder = VideoRecorder()